@@ -1,626 +1,747 @@
 import gc
+import gc_policy
+import boot_trace
 import socket
-import utime as time
+import sys
+try:
+    import utime as time
+except ImportError:
+    import time
+import ticks
+from router import routes, route
+from json_utils import json_encode, parse_simple_json
+from http_utils import send_response, send_not_modified, send_file, connection_header
+import http_parser
+import system_handlers
 
 gc.collect()
 
-# Track server start time for uptime calculation
-SERVER_START_TIME = time.time()
-
-# Manual JSON encoding
-def json_encode(obj):
-    if obj is None:
-        return 'null'
-    elif isinstance(obj, bool):
-        return 'true' if obj else 'false'
-    elif isinstance(obj, (int, float)):
-        return str(obj)
-    elif isinstance(obj, str):
-        escaped = obj.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
-        return '"{}"'.format(escaped)
-    elif isinstance(obj, dict):
-        items = []
-        for k, v in obj.items():
-            items.append('"{}": {}'.format(k, json_encode(v)))
-        return '{' + ', '.join(items) + '}'
-    elif isinstance(obj, list):
-        items = [json_encode(item) for item in obj]
-        return '[' + ', '.join(items) + ']'
-    return 'null'
-
-def parse_simple_json(s):
-    """Improved JSON parser for nested structures"""
-    s = s.strip()
-    if not s:
-        return {}
-    
-    # Try to use ujson if available (MicroPython)
+# Stream mode limits: per-request deadline and keep-alive connection budget
+try:
+    import config
+except ImportError:
+    config = None
+REQUEST_TIMEOUT_MS = getattr(config, 'HTTP_REQUEST_TIMEOUT_MS', 5000)
+KEEPALIVE = getattr(config, 'HTTP_KEEPALIVE', True)
+KEEPALIVE_IDLE_MS = getattr(config, 'HTTP_KEEPALIVE_IDLE_MS', 3000)
+MAX_REQUESTS_PER_CONN = getattr(config, 'HTTP_MAX_REQUESTS_PER_CONN', 20)
+KEEPALIVE_MAX_CONNECTIONS = getattr(config, 'HTTP_KEEPALIVE_MAX_CONNECTIONS', 4)
+# Blocking mode: stop waiting in accept() this often to flush state and sync the clock
+BLOCKING_POLL_MS = getattr(config, 'HTTP_BLOCKING_POLL_MS', 1000)
+
+def _import_asyncio():
+    """Return uasyncio on MicroPython, asyncio on CPython, or None."""
     try:
-        import ujson
-        return ujson.loads(s)
-    except:
-        pass
-    
-    # Try standard json (Python)
+        import uasyncio as asyncio
+    except ImportError:
+        try:
+            import asyncio
+        except ImportError:
+            return None
+    return asyncio
+
+def _timed_out(e):
+    """True for an accept() timeout: socket.timeout on CPython, OSError(ETIMEDOUT) on MicroPython."""
+    return bool(e.args) and e.args[0] in (110, 'timed out')
+
+# Route handlers
+# Each handler is registered in the route table and called as handler(conn, req).
+# Method checks and 405 responses are handled by the router.
+
+# Support both /api/feed and /api/feednow for compatibility
+# Feeding runs in the background feed_jobs worker; poll /api/jobs/<id> for the result
+@route('/api/feednow', '/api/feed', methods=('POST',))
+def feed_now(conn, req):
+    import feed_jobs
+    job, created = feed_jobs.submit(feed_jobs.SOURCE_MANUAL)
+    result = json_encode({'status': job.status, 'job_id': job.id, 'coalesced': not created})
+    # Blocking mode runs the job inside submit(), so it may be finished already
+    finished = job.status in (feed_jobs.DONE, feed_jobs.FAILED)
+    send_response(conn, '200 OK' if finished else '202 Accepted', 'application/json', result)
+    del result, job
+    gc_policy.maybe_collect('api.feed_now')
+
+@route('/api/jobs')
+def list_jobs(conn, req):
+    import feed_jobs
+    result = json_encode({'jobs': [job.to_dict() for job in feed_jobs.jobs()]})
+    send_response(conn, '200 OK', 'application/json', result)
+    del result
+    gc_policy.maybe_collect('api.list_jobs')
+
+@route('/api/jobs/', prefix=True)
+def get_job(conn, req):
+    import feed_jobs
+    job = None
     try:
-        import json
-        return json.loads(s)
-    except:
+        job = feed_jobs.get(int(req.path[req.path.rfind('/') + 1:]))
+    except ValueError:
         pass
-    
-    # Fallback: basic parser for simple key:value pairs only
-    if s.startswith('{') and s.endswith('}'):
-        result = {}
-        content = s[1:-1].strip()
-        if content:
-            pairs = content.split(',')
-            for pair in pairs:
-                if ':' in pair:
-                    k, v = pair.split(':', 1)
-                    k = k.strip().strip('"')
-                    v = v.strip().strip('"')
-                    try:
-                        v = int(v)
-                    except:
-                        pass
-                    result[k] = v
-        return result
-    return {}
-
-def send_response(conn, status, content_type, body):
-    gc.collect()
-    response = 'HTTP/1.1 {}\r\n'.format(status)
-    response += 'Content-Type: {}\r\n'.format(content_type)
-    response += 'Access-Control-Allow-Origin: *\r\n'
-    response += 'Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS\r\n'
-    response += 'Access-Control-Allow-Headers: Content-Type\r\n'
-    response += 'Connection: close\r\n'
-    response += 'Content-Length: {}\r\n'.format(len(body))
-    response += '\r\n'
-    conn.send(response.encode())
-    conn.send(body.encode() if isinstance(body, str) else body)
-    gc.collect()
-
-def handle_request(conn, request):
-    gc.collect()
-    method = None
-    path = None
+    if job is None:
+        send_response(conn, '404 Not Found', 'application/json', json_encode({'error': 'Unknown job'}))
+    else:
+        send_response(conn, '200 OK', 'application/json', json_encode(job.to_dict()))
+    del job
+    gc_policy.maybe_collect('api.get_job')
+
+def state_etag():
+    """ETag for responses built only from the state store."""
+    import state
+    return '"{}-{}"'.format(state.BOOT_ID, state.revision)
+
+def etag_headers(etag):
+    return 'ETag: {}\r\nCache-Control: no-cache\r\nAccess-Control-Expose-Headers: ETag\r\n'.format(etag)
+
+def check_not_modified(conn, req, etag):
+    """Send 304 if the client already has etag. Returns: True if it was sent."""
+    if etag_matches(req, etag):
+        send_not_modified(conn, etag_headers(etag))
+        return True
+    return False
+
+@route('/api/quantity')
+def get_quantity(conn, req):
+    import quantity_service
+    etag = state_etag()
+    if check_not_modified(conn, req, etag):
+        return
+    quantity = quantity_service.read_quantity()
+    result = json_encode({'quantity': quantity})
+    send_response(conn, '200 OK', 'application/json', result, etag_headers(etag))
+    del result, quantity
+    gc_policy.maybe_collect('api.get_quantity')
+
+@route('/api/quantity', methods=('POST',))
+def set_quantity(conn, req):
+    import lib.notification
+    import event_log_service
+    import quantity_service
+    value = req.data.get('quantity')
+    if value is not None:
+        quantity_service.write_quantity(value)
+        # Log quantity update
+        event_log_service.log_event(event_log_service.EVENT_QUANTITY_UPDATE, 'Updated to {}'.format(value))
+        gc_policy.maybe_collect('api.set_quantity')
+        msg = "Remaining food quantity updated to {}".format(value)
+        lib.notification.send_ntfy_notification(msg)
+        result = json_encode({'status': 'ok'})
+        send_response(conn, '200 OK', 'application/json', result)
+        del result, msg, value
+        gc_policy.maybe_collect('api.set_quantity')
+    else:
+        send_response(conn, '400 Bad Request', 'application/json', json_encode({'error': 'Missing quantity'}))
+        gc_policy.maybe_collect('api.set_quantity')
+
+@route('/api/home')
+def home(conn, req):
+    import quantity_service
+    import last_fed_service
+    import next_feed_service
+    etag = state_etag()
+    if check_not_modified(conn, req, etag):
+        return
+    quantity = quantity_service.read_quantity()
+    last_fed = last_fed_service.read_last_fed()
+    next_feed = next_feed_service.read_next_feed()
+    result = json_encode({
+        'connectionStatus': 'Online',
+        'feedRemaining': '{} more feed remaining'.format(quantity),
+        'lastFed': last_fed,
+        'batteryStatus': '40% of the Battery remaining',
+        'nextFeed': next_feed
+    })
+    send_response(conn, '200 OK', 'application/json', result, etag_headers(etag))
+    del result, quantity, last_fed, next_feed
+    gc_policy.maybe_collect('api.home')
+
+@route('/api/schedule', '/api/schedules')
+@route('/api/schedule/', prefix=True)
+def get_schedule(conn, req):
+    import services
+    etag = state_etag()
+    if check_not_modified(conn, req, etag):
+        return
+    data = services.read_schedule()
+    result = json_encode(data) if data else json_encode({'error': 'Could not read schedule'})
+    send_response(conn, '200 OK', 'application/json', result, etag_headers(etag))
+    del result, data
+    gc_policy.maybe_collect('api.get_schedule')
+
+@route('/api/schedule', '/api/schedules', methods=('DELETE',))
+@route('/api/schedule/', methods=('DELETE',), prefix=True)
+def delete_schedule(conn, req):
+    # For now, just return success - implement delete logic as needed
+    send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'message': 'Schedule deleted'}))
+    gc_policy.maybe_collect('api.delete_schedule')
+
+@route('/api/schedule', '/api/schedules', methods=('POST',))
+@route('/api/schedule/', methods=('POST',), prefix=True)
+def save_schedule(conn, req):
+    # write_schedule already calculates and saves next feed time
+    import services
+    import event_log_service
+    print('Received schedule data:', req.data)
+    result = services.write_schedule(req.data)
+    if result:
+        # Log schedule change
+        event_log_service.log_event(event_log_service.EVENT_CONFIG_CHANGE, 'Schedule updated')
+        send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok'}))
+        gc_policy.maybe_collect('api.save_schedule')
+    else:
+        print('Failed to write schedule')
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': 'Failed to save schedule'}))
+        gc_policy.maybe_collect('api.save_schedule')
+
+@route('/api/calibration', '/api/calibration/get')
+def get_calibration(conn, req):
     try:
-        # Handle empty request
-        if not request or len(request) == 0:
-            print('Empty request received, ignoring')
-            return
-            
-        lines = request.split(b'\r\n')
-        if not lines:
+        import calibration_service
+        etag = state_etag()
+        if check_not_modified(conn, req, etag):
             return
-            
-        request_line = lines[0].decode()
-        parts = request_line.split()
-        if len(parts) < 2:
-            return
-            
-        method, path = parts[0], parts[1]
-        
-        # Extract path without query parameters
-        if '?' in path:
-            path = path.split('?')[0]
-        
-        print('Request: {} {}'.format(method, path))
-        
-        # Parse body if POST
-        body_data = {}
-        if method == 'POST':
-            body_start = request.find(b'\r\n\r\n')
-            if body_start != -1:
-                body = request[body_start+4:].decode()
-                if body:
-                    print('Raw body:', body)
-                    body_data = parse_simple_json(body)
-                    print('Parsed body_data:', body_data)
-                    print('Type of body_data:', type(body_data))
-        
-        # OPTIONS handling
-        if method == 'OPTIONS':
-            send_response(conn, '200 OK', 'text/plain', '')
-            return
-        
-        # Route handling
-        # Support both /api/feed and /api/feednow for compatibility
-        if path == '/api/feednow' or path == '/api/feed':
-            import utime as time
-            import lib.notification
-            import calibration_service
-            import event_log_service
-            import quantity_service
-            import last_fed_service
-
-            # Log manual feed event
-            event_log_service.log_event(event_log_service.EVENT_FEED_MANUAL, 'Manual feed via web interface')
-
-            # Disburse food using calibrated servo settings
-            food_dispensed = calibration_service.disburseFood()
-
-            if food_dispensed:
-                # Update quantity and last fed timestamp
-                quantity = quantity_service.read_quantity()
-                if quantity > 0:
-                    quantity -= 1
-                quantity_service.write_quantity(quantity)
-                last_fed_service.write_last_fed_now()
-
-                # Free memory before sending notification
-                gc.collect()
-
-                # Send notification
-                now = time.localtime()
-                msg = "Food disbursed at {:02d}:{:02d}:{:02d}. Feed remaining: {}".format(now[3], now[4], now[5], quantity)
-                lib.notification.send_ntfy_notification(msg)
-
-                result = json_encode({'status': 'ok', 'quantity': quantity})
-                send_response(conn, '200 OK', 'application/json', result)
-                # Memory optimization: delete large objects and collect
-                del result, msg, now, quantity, food_dispensed
-                gc.collect()
-            else:
-                # Food dispensing failed
-                result = json_encode({'status': 'error', 'message': 'Failed to dispense food'})
-                send_response(conn, '500 Internal Server Error', 'application/json', result)
-                del result, food_dispensed
-                gc.collect()
-            
-        elif path == '/api/quantity':
-            if method == 'GET':
-                import quantity_service
-                quantity = quantity_service.read_quantity()
-                result = json_encode({'quantity': quantity})
-                send_response(conn, '200 OK', 'application/json', result)
-                del result, quantity
-                gc.collect()
+        data = calibration_service.get_current_calibration()
+        send_response(conn, '200 OK', 'application/json', json_encode(data), etag_headers(etag))
+        del data
+        gc_policy.maybe_collect('api.get_calibration')
+    except Exception as e:
+        print('Error reading calibration:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+        gc_policy.maybe_collect('api.get_calibration')
+
+@route('/api/calibration/save', methods=('POST',))
+def save_calibration(conn, req):
+    try:
+        import calibration_service
+        duty_cycle = req.data.get('duty_cycle')
+        pulse_duration = req.data.get('pulse_duration')
+        if duty_cycle is not None and pulse_duration is not None:
+            success = calibration_service.save_calibration(duty_cycle, pulse_duration)
+            if success:
+                send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'duty_cycle': duty_cycle, 'pulse_duration': pulse_duration}))
+                gc_policy.maybe_collect('api.save_calibration')
             else:
-                import lib.notification
-                import event_log_service
-                import quantity_service
-                value = body_data.get('quantity')
-                if value is not None:
-                    quantity_service.write_quantity(value)
-                    # Log quantity update
-                    event_log_service.log_event(event_log_service.EVENT_QUANTITY_UPDATE, 'Updated to {}'.format(value))
-                    gc.collect()
-                    msg = "Remaining food quantity updated to {}".format(value)
-                    lib.notification.send_ntfy_notification(msg)
-                    result = json_encode({'status': 'ok'})
-                    send_response(conn, '200 OK', 'application/json', result)
-                    del result, msg, value
-                    gc.collect()
-                else:
-                    send_response(conn, '400 Bad Request', 'application/json', json_encode({'error': 'Missing quantity'}))
-                    gc.collect()
-                    
-        elif path == '/api/home':
-            import quantity_service
-            import last_fed_service
-            import next_feed_service
-            quantity = quantity_service.read_quantity()
-            last_fed = last_fed_service.read_last_fed()
-            next_feed = next_feed_service.read_next_feed()
+                send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': 'Failed to save'}))
+                gc_policy.maybe_collect('api.save_calibration')
+        else:
+            send_response(conn, '400 Bad Request', 'application/json', json_encode({'error': 'Missing parameters'}))
+            gc_policy.maybe_collect('api.save_calibration')
+    except Exception as e:
+        print('Error saving calibration:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+        gc_policy.maybe_collect('api.save_calibration')
+
+@route('/api/calibration/adjust_duty', methods=('POST',))
+def adjust_duty(conn, req):
+    try:
+        import calibration_service
+        increment = req.data.get('increment', 1)
+        duty_cycle, pulse_duration = calibration_service.adjust_duty_cycle(increment)
+        send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'duty_cycle': duty_cycle, 'pulse_duration': pulse_duration}))
+        gc_policy.maybe_collect('api.adjust_duty')
+    except Exception as e:
+        print('Error adjusting duty cycle:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+        gc_policy.maybe_collect('api.adjust_duty')
+
+@route('/api/calibration/adjust_duration', methods=('POST',))
+def adjust_duration(conn, req):
+    try:
+        import calibration_service
+        increment = req.data.get('increment', 5)
+        duty_cycle, pulse_duration = calibration_service.adjust_pulse_duration(increment)
+        send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'duty_cycle': duty_cycle, 'pulse_duration': pulse_duration}))
+        gc_policy.maybe_collect('api.adjust_duration')
+    except Exception as e:
+        print('Error adjusting pulse duration:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+        gc_policy.maybe_collect('api.adjust_duration')
+
+@route('/api/calibration/test', methods=('POST',))
+def test_calibration(conn, req):
+    try:
+        import calibration_service
+        result = calibration_service.test_calibration()
+        send_response(conn, '200 OK', 'application/json', json_encode(result))
+        gc_policy.maybe_collect('api.test_calibration')
+    except Exception as e:
+        print('Error testing calibration:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+        gc_policy.maybe_collect('api.test_calibration')
+
+@route('/api/calibrate/left', '/api/calibrate/right', methods=('POST',))
+def calibrate_motor(conn, req):
+    try:
+        # Check if running on actual hardware (ESP8266/ESP32)
+        try:
+            from machine import Pin
+            on_hardware = True
+        except ImportError:
+            on_hardware = False
+            print('Warning: Not running on ESP hardware, motor control disabled')
+        # The actual motor movement logic should be here, but is omitted for brevity
+        # You may want to add direction handling logic if needed
+        # For now, just return a success message
+        result = json_encode({'status': 'ok', 'message': 'Motor calibration endpoint called'})
+        send_response(conn, '200 OK', 'application/json', result)
+        del result
+        gc_policy.maybe_collect('api.calibrate_motor')
+    except Exception as e:
+        print('Error in calibration:', e)
+        error_msg = 'Calibration error: {}'.format(str(e))
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'status': 'error', 'message': error_msg}))
+        gc_policy.maybe_collect('api.calibrate_motor')
+
+@route('/api/ota/check')
+def ota_check(conn, req):
+    try:
+        from ota.ota_updater import OTAUpdater
+        updater = OTAUpdater()
+        remote_data = updater.check_for_updates()
+        
+        if remote_data:
             result = json_encode({
-                'connectionStatus': 'Online',
-                'feedRemaining': '{} more feed remaining'.format(quantity),
-                'lastFed': last_fed,
-                'batteryStatus': '40% of the Battery remaining',
-                'nextFeed': next_feed
+                'update_available': True,
+                'version': remote_data['version'],
+                'date': remote_data.get('date', ''),
+                'notes': remote_data.get('notes', ''),
+                'files_count': len(remote_data.get('files', []))
             })
-            send_response(conn, '200 OK', 'application/json', result)
-            del result, quantity, last_fed, next_feed
-            gc.collect()
-            
-        elif path == '/api/ping' or path == '/api/status':
-            send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'message': 'Server is running'}))
-            gc.collect()
-            
-        elif path == '/api/schedule' or path == '/api/schedules' or path.startswith('/api/schedule/'):
-            import services
-            if method == 'GET':
-                data = services.read_schedule()
-                result = json_encode(data) if data else json_encode({'error': 'Could not read schedule'})
-                send_response(conn, '200 OK', 'application/json', result)
-                del result, data
-                gc.collect()
-            elif method == 'DELETE':
-                # For now, just return success - implement delete logic as needed
-                send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'message': 'Schedule deleted'}))
-                gc.collect()
-            else:
-                # write_schedule already calculates and saves next feed time
-                import event_log_service
-                print('Received schedule data:', body_data)
-                result = services.write_schedule(body_data)
-                if result:
-                    # Log schedule change
-                    event_log_service.log_event(event_log_service.EVENT_CONFIG_CHANGE, 'Schedule updated')
-                    send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok'}))
-                    gc.collect()
-                else:
-                    print('Failed to write schedule')
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': 'Failed to save schedule'}))
-                    gc.collect()
+        else:
+            result = json_encode({'update_available': False})
         
-        elif path == '/api/calibration/get':
-            if method == 'GET':
-                try:
-                    import calibration_service
-                    data = calibration_service.get_current_calibration()
-                    send_response(conn, '200 OK', 'application/json', json_encode(data))
-                    del data
-                    gc.collect()
-                except Exception as e:
-                    print('Error reading calibration:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
-                gc.collect()
+        send_response(conn, '200 OK', 'application/json', result)
+        del result, updater, remote_data
+        gc_policy.maybe_collect('api.ota_check')
+    except Exception as e:
+        print('OTA check error:', e)
+        error_msg = json_encode({'error': str(e)})
+        send_response(conn, '500 Internal Server Error', 'application/json', error_msg)
+        gc_policy.maybe_collect('api.ota_check')
+
+@route('/api/ota/update', methods=('POST',))
+def ota_update(conn, req):
+    try:
+        from ota.ota_updater import check_and_update
+        success = check_and_update()
+        if success:
+            # The new files take effect on the next reset; don't lose state to it
+            import state
+            state.flush()
+        result = json_encode({'success': success})
+        send_response(conn, '200 OK', 'application/json', result)
+        del result, success
+        gc_policy.maybe_collect('api.ota_update')
+    except Exception as e:
+        print('OTA update error:', e)
+        error_msg = json_encode({'success': False, 'error': str(e)})
+        send_response(conn, '500 Internal Server Error', 'application/json', error_msg)
+        gc_policy.maybe_collect('api.ota_update')
+
+# Content hashes written by build.js, loaded on first static request
+ETAG_MANIFEST = 'UI/etags.txt'
+_etags = None
+
+def get_etag(path, encoding=None):
+    """Quoted ETag for a UI file (path relative to UI/), or None if unknown."""
+    global _etags
+    if _etags is None:
+        _etags = {}
+        try:
+            with open(ETAG_MANIFEST, 'r') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        _etags[parts[0]] = parts[1]
+        except OSError:
+            print('No ETag manifest, conditional GET disabled')
+    digest = _etags.get(path)
+    if digest is None:
+        return None
+    # The gzip variant is a different representation, so it gets its own tag
+    return '"{}-gz"'.format(digest) if encoding == 'gzip' else '"{}"'.format(digest)
+
+def etag_matches(req, etag):
+    """True if the request's If-None-Match covers etag."""
+    if_none_match = req.header('if-none-match')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def accepts_gzip(req):
+    """True if the client's Accept-Encoding allows gzip (and doesn't set q=0)."""
+    for coding in req.header('accept-encoding', '').split(','):
+        params = coding.split(';')
+        if params[0].strip() == 'gzip':
+            try:
+                return len(params) < 2 or float(params[1].strip()[2:]) > 0
+            except ValueError:
+                return True
+    return False
+
+def serve_static(conn, req):
+    """Stream a file from the UI directory, or 404.
+    If the build emitted a precompressed <file>.gz and the client accepts gzip,
+    that is sent instead with Content-Encoding: gzip.
+    """
+    path = req.path
+    if path == '/':
+        path = '/index.html'
+    file_path = 'UI' + path
+    try:
+        content_type = 'text/html'
+        if path.endswith('.css'):
+            content_type = 'text/css'
+        elif path.endswith('.js'):
+            content_type = 'application/javascript'
+        elif path.endswith('.png'):
+            content_type = 'image/png'
+        elif path.endswith('.jpg') or path.endswith('.jpeg'):
+            content_type = 'image/jpeg'
         
-        elif path == '/api/events':
-            if method == 'GET':
-                try:
-                    import event_log_service
-                    limit = 100  # Default to all events
-                    events = event_log_service.read_events(limit)
-                    send_response(conn, '200 OK', 'application/json', json_encode({'events': events}))
-                    del events
-                    gc.collect()
-                except Exception as e:
-                    print('Error reading events:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
-                gc.collect()
+        import os
+        encoding = None
+        if not content_type.startswith('image/') and accepts_gzip(req):
+            try:
+                file_size = os.stat(file_path + '.gz')[6]
+                file_path += '.gz'
+                encoding = 'gzip'
+            except OSError:
+                pass
+        if encoding is None:
+            file_size = os.stat(file_path)[6]
         
-        elif path == '/api/system/memory':
-            if method == 'GET':
-                try:
-                    gc.collect()
-                    free_mem = gc.mem_free()
-                    send_response(conn, '200 OK', 'application/json', json_encode({'free_memory': free_mem}))
-                    del free_mem
-                    gc.collect()
-                except Exception as e:
-                    print('Error reading memory:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
-                gc.collect()
+        etag = get_etag(path[1:], encoding)
+        if content_type.startswith('image/'):
+            cache_control = 'public, max-age=604800'  # 7 days
+        elif etag:
+            # Let the browser keep a copy but revalidate it with If-None-Match
+            cache_control = 'no-cache'
+        else:
+            cache_control = None
         
-        elif path == '/api/system/uptime':
-            if method == 'GET':
-                try:
-                    uptime_seconds = int(time.time() - SERVER_START_TIME)
-                    send_response(conn, '200 OK', 'application/json', json_encode({'uptime': uptime_seconds}))
-                    del uptime_seconds
-                    gc.collect()
-                except Exception as e:
-                    print('Error reading uptime:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
-                gc.collect()
+        if etag and etag_matches(req, etag):
+            # Unchanged since the client cached it: headers only
+            response = 'HTTP/1.1 304 Not Modified\r\n'
+            response += 'ETag: {}\r\n'.format(etag)
+            response += 'Cache-Control: {}\r\n'.format(cache_control)
+            if not content_type.startswith('image/'):
+                response += 'Vary: Accept-Encoding\r\n'
+            response += connection_header(conn)
+            response += '\r\n'
+            conn.send(response.encode())
+            return
         
-        elif path == '/api/config':
-            if method == 'GET':
-                try:
-                    import config
-                    result = {
-                        'ntfy_topic': config.NTFY_TOPIC if hasattr(config, 'NTFY_TOPIC') else 'N/A',
-                        'ntfy_server': config.NTFY_SERVER if hasattr(config, 'NTFY_SERVER') else 'N/A'
-                    }
-                    send_response(conn, '200 OK', 'application/json', json_encode(result))
-                    del result
-                    gc.collect()
-                except Exception as e:
-                    print('Error reading config:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
-                gc.collect()
+        print('Serving file:', file_path)
         
-        elif path == '/api/calibration':
-            if method == 'GET':
-                try:
-                    import calibration_service
-                    data = calibration_service.get_current_calibration()
-                    send_response(conn, '200 OK', 'application/json', json_encode(data))
-                    del data
-                    gc.collect()
-                except Exception as e:
-                    print('Error reading calibration:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
-                gc.collect()
+        # Send headers
+        response = 'HTTP/1.1 200 OK\r\n'
+        response += 'Content-Type: {}\r\n'.format(content_type)
+        if encoding:
+            response += 'Content-Encoding: {}\r\n'.format(encoding)
+        if not content_type.startswith('image/'):
+            response += 'Vary: Accept-Encoding\r\n'
+        response += 'Access-Control-Allow-Origin: *\r\n'
+        response += connection_header(conn)
+        response += 'Content-Length: {}\r\n'.format(file_size)
         
-        elif path == '/api/calibration/save':
-            if method == 'POST':
-                try:
-                    import calibration_service
-                    duty_cycle = body_data.get('duty_cycle')
-                    pulse_duration = body_data.get('pulse_duration')
-                    if duty_cycle is not None and pulse_duration is not None:
-                        success = calibration_service.save_calibration(duty_cycle, pulse_duration)
-                        if success:
-                            send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'duty_cycle': duty_cycle, 'pulse_duration': pulse_duration}))
-                            gc.collect()
-                        else:
-                            send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': 'Failed to save'}))
-                            gc.collect()
-                    else:
-                        send_response(conn, '400 Bad Request', 'application/json', json_encode({'error': 'Missing parameters'}))
-                        gc.collect()
-                except Exception as e:
-                    print('Error saving calibration:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only POST allowed'}))
-                gc.collect()
+        if etag:
+            response += 'ETag: {}\r\n'.format(etag)
+        if cache_control:
+            response += 'Cache-Control: {}\r\n'.format(cache_control)
+        else:
+            # No manifest: don't cache HTML, CSS, JS files
+            response += 'Cache-Control: no-cache, no-store, must-revalidate\r\n'
+            response += 'Pragma: no-cache\r\n'
+            response += 'Expires: 0\r\n'
         
-        elif path == '/api/calibration/adjust_duty':
-            if method == 'POST':
-                try:
-                    import calibration_service
-                    increment = body_data.get('increment', 1)
-                    duty_cycle, pulse_duration = calibration_service.adjust_duty_cycle(increment)
-                    send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'duty_cycle': duty_cycle, 'pulse_duration': pulse_duration}))
-                    gc.collect()
-                except Exception as e:
-                    print('Error adjusting duty cycle:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only POST allowed'}))
-                gc.collect()
+        response += '\r\n'
+        conn.send(response.encode())
         
-        elif path == '/api/calibration/adjust_duration':
-            if method == 'POST':
-                try:
-                    import calibration_service
-                    increment = body_data.get('increment', 5)
-                    duty_cycle, pulse_duration = calibration_service.adjust_pulse_duration(increment)
-                    send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'duty_cycle': duty_cycle, 'pulse_duration': pulse_duration}))
-                    gc.collect()
-                except Exception as e:
-                    print('Error adjusting pulse duration:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only POST allowed'}))
-                gc.collect()
+        send_file(conn, file_path)
+                
+    except Exception as e:
+        print('Error serving file {}: {}'.format(file_path, e))
+        send_response(conn, '404 Not Found', 'text/plain', 'Not Found')
 
-        elif path == '/api/calibration/test':
-            if method == 'POST':
-                try:
-                    import calibration_service
-                    result = calibration_service.test_calibration()
-                    send_response(conn, '200 OK', 'application/json', json_encode(result))
-                    gc.collect()
-                except Exception as e:
-                    print('Error testing calibration:', e)
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only POST allowed'}))
-                gc.collect()
+def handle_request(conn, req):
+    gc_policy.begin_request()
+    gc_policy.maybe_collect('api.handle_request')
+    try:
+        print('Request: {} {}'.format(req.method, req.path))
         
-        elif path == '/api/calibrate/left' or path == '/api/calibrate/right':
-            if method == 'POST':
-                try:
-                    # Check if running on actual hardware (ESP8266/ESP32)
-                    try:
-                        from machine import Pin
-                        on_hardware = True
-                    except ImportError:
-                        on_hardware = False
-                        print('Warning: Not running on ESP hardware, motor control disabled')
-                    # The actual motor movement logic should be here, but is omitted for brevity
-                    # You may want to add direction handling logic if needed
-                    # For now, just return a success message
-                    result = json_encode({'status': 'ok', 'message': 'Motor calibration endpoint called'})
-                    send_response(conn, '200 OK', 'application/json', result)
-                    del result
-                    gc.collect()
-                except Exception as e:
-                    print('Error in calibration:', e)
-                    error_msg = 'Calibration error: {}'.format(str(e))
-                    send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'status': 'error', 'message': error_msg}))
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only POST allowed'}))
-                gc.collect()
-
-        elif path == '/api/ota/check':
-            if method == 'GET':
-                try:
-                    from ota.ota_updater import OTAUpdater
-                    updater = OTAUpdater()
-                    remote_data = updater.check_for_updates()
-                    
-                    if remote_data:
-                        result = json_encode({
-                            'update_available': True,
-                            'version': remote_data['version'],
-                            'date': remote_data.get('date', ''),
-                            'notes': remote_data.get('notes', ''),
-                            'files_count': len(remote_data.get('files', []))
-                        })
-                    else:
-                        result = json_encode({'update_available': False})
-                    
-                    send_response(conn, '200 OK', 'application/json', result)
-                    del result, updater, remote_data
-                    gc.collect()
-                except Exception as e:
-                    print('OTA check error:', e)
-                    error_msg = json_encode({'error': str(e)})
-                    send_response(conn, '500 Internal Server Error', 'application/json', error_msg)
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
-                gc.collect()
-
-        elif path == '/api/ota/update':
-            if method == 'POST':
-                try:
-                    from ota.ota_updater import check_and_update
-                    success = check_and_update()
-                    result = json_encode({'success': success})
-                    send_response(conn, '200 OK', 'application/json', result)
-                    del result, success
-                    gc.collect()
-                except Exception as e:
-                    print('OTA update error:', e)
-                    error_msg = json_encode({'success': False, 'error': str(e)})
-                    send_response(conn, '500 Internal Server Error', 'application/json', error_msg)
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only POST allowed'}))
-                gc.collect()
-
-        elif path == '/api/system/reboot':
-            if method == 'POST':
-                try:
-                    result = json_encode({'success': True, 'message': 'Rebooting...'})
-                    send_response(conn, '200 OK', 'application/json', result)
-                    del result
-                    gc.collect()
-                    # Reboot after sending response
-                    import machine
-                    import utime as time
-                    time.sleep(1)
-                    machine.reset()
-                except Exception as e:
-                    print('Reboot error:', e)
-                    error_msg = json_encode({'success': False, 'error': str(e)})
-                    send_response(conn, '500 Internal Server Error', 'application/json', error_msg)
-                    gc.collect()
-            else:
-                send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only POST allowed'}))
-                gc.collect()
-
-        elif path == '/' or path == '/index.html':
-            try:
-                # Stream file in chunks to avoid memory issues
-                with open('UI/index.html', 'rb') as f:
-                    # Get file size
-                    import os
-                    file_size = os.stat('UI/index.html')[6]
-                    
-                    # Send headers
-                    response = 'HTTP/1.1 200 OK\r\n'
-                    response += 'Content-Type: text/html\r\n'
-                    response += 'Access-Control-Allow-Origin: *\r\n'
-                    response += 'Connection: close\r\n'
-                    response += 'Content-Length: {}\r\n'.format(file_size)
-                    # Prevent caching of HTML pages
-                    response += 'Cache-Control: no-cache, no-store, must-revalidate\r\n'
-                    response += 'Pragma: no-cache\r\n'
-                    response += 'Expires: 0\r\n'
-                    response += '\r\n'
-                    conn.send(response.encode())
-                    
-                    # Stream file in 512 byte chunks
-                    while True:
-                        chunk = f.read(512)
-                        if not chunk:
-                            break
-                        conn.send(chunk)
-                        gc.collect()
-            except Exception as e:
-                print('Error serving index.html:', e)
-                error_msg = 'Error: {}'.format(str(e))
-                send_response(conn, '500 Internal Server Error', 'text/html', '<html><body><h1>Error</h1><p>{}</p></body></html>'.format(error_msg))
-                
+        # OPTIONS handling
+        if req.method == 'OPTIONS':
+            send_response(conn, '200 OK', 'text/plain', '')
+            return
+        
+        # Parse JSON body for POST
+        if req.method == 'POST' and len(req.body):
+            body = bytes(req.body).decode()
+            print('Raw body:', body)
+            req.data = parse_simple_json(body)
+            print('Parsed body_data:', req.data)
+            del body
+        
+        handler, allowed = routes.match(req.method, req.path)
+        if handler is not None:
+            handler(conn, req)
+        elif allowed:
+            send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only {} allowed'.format(', '.join(allowed))}))
+        elif req.method == 'GET':
+            serve_static(conn, req)
         else:
-            # Try to serve static file
-            file_path = 'UI' + path
-            try:
-                content_type = 'text/html'
-                if path.endswith('.css'):
-                    content_type = 'text/css'
-                elif path.endswith('.js'):
-                    content_type = 'application/javascript'
-                elif path.endswith('.png'):
-                    content_type = 'image/png'
-                elif path.endswith('.jpg') or path.endswith('.jpeg'):
-                    content_type = 'image/jpeg'
-                
-                print('Serving file:', file_path)
-                
-                # Stream file in chunks to avoid memory issues
-                import os
-                file_size = os.stat(file_path)[6]
-                
-                # Send headers
-                response = 'HTTP/1.1 200 OK\r\n'
-                response += 'Content-Type: {}\r\n'.format(content_type)
-                response += 'Access-Control-Allow-Origin: *\r\n'
-                response += 'Connection: close\r\n'
-                response += 'Content-Length: {}\r\n'.format(file_size)
-                
-                # Add caching headers for images (cache for 1 week)
-                if content_type.startswith('image/'):
-                    response += 'Cache-Control: public, max-age=604800\r\n'  # 7 days
-                    response += 'Expires: Thu, 31 Dec 2026 23:59:59 GMT\r\n'
-                else:
-                    # No cache for HTML, CSS, JS files
-                    response += 'Cache-Control: no-cache, no-store, must-revalidate\r\n'
-                    response += 'Pragma: no-cache\r\n'
-                    response += 'Expires: 0\r\n'
-                
-                response += '\r\n'
-                conn.send(response.encode())
-                
-                # Stream file in 512 byte chunks
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(512)
-                        if not chunk:
-                            break
-                        conn.send(chunk)
-                        gc.collect()
-                        
-            except Exception as e:
-                print('Error serving file {}: {}'.format(file_path, e))
-                send_response(conn, '404 Not Found', 'text/plain', 'Not Found')
+            send_response(conn, '404 Not Found', 'text/plain', 'Not Found')
         
-        gc.collect()
+        gc_policy.maybe_collect('api.handle_request')
     except Exception as e:
         print('Error handling request:', e)
         try:
             send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
         except:
             pass
+    finally:
+        gc_policy.end_request()
+
+def respond(conn, parser, state):
+    """Send the response for a parser state returned by one of the readers."""
+    if state == http_parser.COMPLETE:
+        handle_request(conn, parser.request)
+    elif state == http_parser.TOO_LARGE:
+        send_response(conn, '413 Payload Too Large', 'application/json', json_encode({'error': 'Request too large'}))
+    elif state == http_parser.BAD_REQUEST:
+        send_response(conn, '400 Bad Request', 'application/json', json_encode({'error': 'Malformed request'}))
+
+def recv_request(conn, parser):
+    """Blocking read of one request into the parser's buffer.
+    Returns: parser state, or None if the client closed or timed out.
+    """
+    recv_into = conn.recv_into if hasattr(conn, 'recv_into') else conn.readinto
+    state = parser.pending()
+    while state == http_parser.NEED_DATA:
+        try:
+            nbytes = recv_into(parser.space())
+        except OSError:
+            return None
+        if not nbytes:
+            return None
+        state = parser.feed(nbytes)
+    return state
+
+def send_busy(conn):
+    """Reply 503 when every receive buffer is in use."""
+    send_response(conn, '503 Service Unavailable', 'application/json', json_encode({'error': 'Server busy'}))
+
+class StreamConnection:
+    """Socket-like adapter so handle_request can write to an asyncio StreamWriter.
+    Small writes from send() are queued by the writer and drained after the
+    handler returns. A large body (http_utils.send_chunks) is kept in body and
+    written by write_body() one chunk at a time, draining after each, so at
+    most one chunk of it is ever queued.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.keep_alive = False
+        self.body = None
+        transport = getattr(writer, 'transport', None)
+        if transport is not None:
+            # CPython: make drain() wait until everything is sent. Its transport
+            # may queue a chunk's memoryview as is, and the buffer behind it is
+            # refilled as soon as drain() returns.
+            transport.set_write_buffer_limits(high=0)
+
+    def send(self, data):
+        self.writer.write(data)
+        return len(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def write_body(self):
+        """Write the pending body, if any, waiting for each chunk to go out."""
+        body = self.body
+        if body is None:
+            return
+        self.body = None
+        try:
+            for chunk in body:
+                self.writer.write(chunk)
+                await self.writer.drain()
+        finally:
+            body.close()
+
+    async def close(self):
+        if self.body is not None:
+            self.body.close()
+            self.body = None
+        try:
+            self.writer.close()
+            await self.writer.wait_closed()
+        except Exception:
+            pass
 
 class SimpleServer:
     def __init__(self):
         self.socket = None
         self.use_asyncio = False
+        self.mode = None
+        # Stream mode bookkeeping for the keep-alive budget
+        self.open_connections = 0
+        self.connections_accepted = 0
+        self.requests_served = 0
         
-    def run(self, host='0.0.0.0', port=5000):
-        # Try to use asyncio if available
-        try:
-            import uasyncio as asyncio
-            self.use_asyncio = True
-            print('Using asyncio mode')
-            asyncio.run(self._run_async(host, port))
-        except ImportError:
+    def run(self, host='0.0.0.0', port=5000, mode='stream'):
+        """Start the server.
+        Args:
+            mode: 'stream' (asyncio.start_server), 'poll' (legacy accept loop)
+                  or 'blocking'. Falls back to blocking if asyncio is unavailable.
+        """
+        asyncio = _import_asyncio()
+        if asyncio is None or mode == 'blocking':
             print('Asyncio not available, using blocking mode')
+            self.mode = 'blocking'
             self._run_blocking(host, port)
+            return
+        
+        self.use_asyncio = True
+        if mode == 'stream' and hasattr(asyncio, 'start_server'):
+            print('Using asyncio stream mode')
+            self.mode = 'stream'
+            asyncio.run(self._run_stream(host, port))
+        else:
+            print('Using asyncio mode')
+            self.mode = 'poll'
+            asyncio.run(self._run_async(host, port))
+    
+    async def _run_stream(self, host, port):
+        """Stream server: the event loop wakes us only when a client connects."""
+        asyncio = _import_asyncio()
+        
+        actual_ip = self._get_ip(host)
+        server = await asyncio.start_server(self._serve_client, host, port, backlog=5)
+        self.socket = server
+        print('Server running on {}:{}'.format(actual_ip, port))
+        boot_trace.finish()
+        
+        self._send_startup_notification(actual_ip, port)
+        self._start_time_sync()
+        
+        if hasattr(server, 'serve_forever'):
+            # CPython
+            await server.serve_forever()
+        else:
+            await server.wait_closed()
+    
+    async def _serve_client(self, reader, writer):
+        """Handle one client connection, serving requests until it is closed.
+        The connection stays open (HTTP/1.1 keep-alive) until the client asks to
+        close, it has been idle for KEEPALIVE_IDLE_MS, it has served
+        MAX_REQUESTS_PER_CONN requests, or more than KEEPALIVE_MAX_CONNECTIONS
+        are open. This is not a limit on open connections: extra ones are still
+        accepted and served, but get Connection: close after one response.
+        Idle connections don't hold a receive buffer.
+        """
+        asyncio = _import_asyncio()
+        conn = StreamConnection(writer)
+        self.open_connections += 1
+        self.connections_accepted += 1
+        buf = None
+        parser = None
+        served = 0
+        try:
+            while True:
+                if parser is None:
+                    # Wait for the first byte of the next request without holding a buffer
+                    wait_ms = REQUEST_TIMEOUT_MS if served == 0 else KEEPALIVE_IDLE_MS
+                    first = await asyncio.wait_for(reader.read(1), wait_ms / 1000)
+                    if not first:
+                        break
+                    deadline = ticks.ticks_add(ticks.ticks_ms(), REQUEST_TIMEOUT_MS)
+                    buf = await self._acquire_buffer(deadline)
+                    if buf is None:
+                        send_busy(conn)
+                        await conn.drain()
+                        break
+                    parser = http_parser.RequestParser(buf)
+                    parser.space()[0] = first[0]
+                    parser.feed(1)
+                else:
+                    deadline = ticks.ticks_add(ticks.ticks_ms(), REQUEST_TIMEOUT_MS)
+                
+                state = await self._read_request(reader, parser, deadline)
+                if state is None:
+                    break
+                
+                served += 1
+                self.requests_served += 1
+                conn.keep_alive = (KEEPALIVE and state == http_parser.COMPLETE
+                                   and served < MAX_REQUESTS_PER_CONN
+                                   and self.open_connections <= KEEPALIVE_MAX_CONNECTIONS
+                                   and parser.request.wants_keep_alive())
+                respond(conn, parser, state)
+                await conn.drain()
+                await conn.write_body()
+                if not conn.keep_alive:
+                    break
+                
+                parser.reset()
+                if parser.length == 0:
+                    # Nothing pipelined: return the buffer while the connection idles
+                    http_parser.pool.release(buf)
+                    buf = None
+                    parser = None
+        except asyncio.TimeoutError:
+            if served == 0:
+                print('Client timed out, closing connection')
+        except Exception as e:
+            print('Connection error:', e)
+        finally:
+            if buf is not None:
+                http_parser.pool.release(buf)
+            self.open_connections -= 1
+            await conn.close()
+            gc_policy.maybe_collect('api._serve_client')
+    
+    async def _acquire_buffer(self, deadline):
+        """Take a receive buffer, waiting for one to free up until the deadline."""
+        asyncio = _import_asyncio()
+        while True:
+            buf = http_parser.pool.acquire()
+            if buf is not None or ticks.ticks_diff(deadline, ticks.ticks_ms()) <= 0:
+                return buf
+            await asyncio.sleep(0.01)
+    
+    async def _read_request(self, reader, parser, deadline):
+        """Read into the parser's buffer until a request is parsed or the deadline passes.
+        Each read yields to the event loop, so a slow client cannot stall other tasks.
+        Returns: parser state, or None if the client closed the connection.
+        """
+        asyncio = _import_asyncio()
+        state = parser.pending()
+        while state == http_parser.NEED_DATA:
+            remaining = ticks.ticks_diff(deadline, ticks.ticks_ms())
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            space = parser.space()
+            if hasattr(reader, 'readinto'):
+                nbytes = await asyncio.wait_for(reader.readinto(space), remaining / 1000)
+            else:
+                # CPython StreamReader has no readinto
+                data = await asyncio.wait_for(reader.read(len(space)), remaining / 1000)
+                nbytes = len(data)
+                space[:nbytes] = data
+            if not nbytes:
+                return None
+            state = parser.feed(nbytes)
+        return state
     
     async def _run_async(self, host, port):
         """Async server implementation that allows concurrent tasks."""
@@ -637,9 +758,11 @@ class SimpleServer:
         self.socket.listen(5)
         self.socket.setblocking(False)  # Non-blocking for asyncio
         print('Server running on {}:{}'.format(actual_ip, port))
+        boot_trace.finish()
         
         # Send startup notification
         self._send_startup_notification(actual_ip, port)
+        self._start_time_sync()
         
         while True:
             try:
@@ -659,7 +782,7 @@ class SimpleServer:
             except Exception as e:
                 print('Server error:', e)
                 await asyncio.sleep(0.1)
-                gc.collect()
+                gc_policy.maybe_collect('api._run_async')
     
     async def _accept_connection(self):
         """Async wrapper for socket.accept()."""
@@ -676,33 +799,17 @@ class SimpleServer:
         try:
             conn.settimeout(5.0)
             
-            # Read request
-            request = b''
-            while True:
+            buf = http_parser.pool.acquire()
+            if buf is None:
+                send_busy(conn)
+            else:
                 try:
-                    chunk = conn.recv(1024)
-                    if not chunk:
-                        break
-                    request += chunk
-                    # Check if we have full request
-                    if b'\r\n\r\n' in request:
-                        # Check if there's a body
-                        if b'Content-Length:' in request:
-                            header_end = request.find(b'\r\n\r\n')
-                            headers = request[:header_end].decode()
-                            for line in headers.split('\r\n'):
-                                if line.startswith('Content-Length:'):
-                                    content_length = int(line.split(':')[1].strip())
-                                    body_received = len(request) - header_end - 4
-                                    if body_received >= content_length:
-                                        break
-                        else:
-                            break
-                except:
-                    break
-            
-            if request:
-                handle_request(conn, request)
+                    parser = http_parser.RequestParser(buf)
+                    state = recv_request(conn, parser)
+                    if state is not None:
+                        respond(conn, parser, state)
+                finally:
+                    http_parser.pool.release(buf)
             
             conn.close()
         except Exception as e:
@@ -718,7 +825,7 @@ class SimpleServer:
                 conn.close()
             except:
                 pass
-            gc.collect()
+            gc_policy.maybe_collect('api._handle_connection')
     
     def _run_blocking(self, host, port):
         """Blocking server implementation (fallback if asyncio unavailable)."""
@@ -730,43 +837,45 @@ class SimpleServer:
         self.socket.bind(addr)
         self.socket.listen(5)
         print('Server running on {}:{}'.format(actual_ip, port))
+        boot_trace.finish()
         
+        # No event loop will run the notification outbox or the feed worker
+        try:
+            import lib.notification
+            lib.notification.set_blocking()
+        except ImportError:
+            pass
+        import feed_jobs
+        feed_jobs.set_blocking()
         self._send_startup_notification(actual_ip, port)
+        self._sync_time_blocking()
         
+        # Blocking mode serves one client at a time, so one buffer is enough
+        buf = http_parser.pool.acquire()
+        self.socket.settimeout(BLOCKING_POLL_MS / 1000)
         while True:
             conn = None
             try:
-                conn, addr = self.socket.accept()
+                try:
+                    conn, addr = self.socket.accept()
+                except OSError as e:
+                    if not _timed_out(e):
+                        raise
+                    # No client: still flush state and sync the clock when due
+                    self._flush_state_blocking()
+                    self._sync_time_blocking()
+                    continue
                 conn.settimeout(5.0)
                 
-                # Read request
-                request = b''
-                while True:
-                    try:
-                        chunk = conn.recv(1024)
-                        if not chunk:
-                            break
-                        request += chunk
-                        if b'\r\n\r\n' in request:
-                            if b'Content-Length:' in request:
-                                header_end = request.find(b'\r\n\r\n')
-                                headers = request[:header_end].decode()
-                                for line in headers.split('\r\n'):
-                                    if line.startswith('Content-Length:'):
-                                        content_length = int(line.split(':')[1].strip())
-                                        body_received = len(request) - header_end - 4
-                                        if body_received >= content_length:
-                                            break
-                            else:
-                                break
-                    except:
-                        break
-                
-                if request:
-                    handle_request(conn, request)
+                parser = http_parser.RequestParser(buf)
+                state = recv_request(conn, parser)
+                if state is not None:
+                    respond(conn, parser, state)
                 
                 conn.close()
-                gc.collect()
+                self._flush_state_blocking()
+                self._sync_time_blocking()
+                gc_policy.maybe_collect('api._run_blocking')
             except Exception as e:
                 print('Server error:', e)
                 if conn:
@@ -774,7 +883,7 @@ class SimpleServer:
                         conn.close()
                     except:
                         pass
-                gc.collect()
+                gc_policy.maybe_collect('api._run_blocking')
     
     def _get_ip(self, host):
         """Get actual IP address."""
@@ -788,6 +897,37 @@ class SimpleServer:
                 pass
         return host
     
+    def _start_time_sync(self):
+        """Sync the clock over SNTP in the background now that requests can be served."""
+        try:
+            import lib.sntp
+            lib.sntp.start()
+        except Exception as e:
+            print('Could not start time sync:', e)
+    
+    def _flush_state_blocking(self):
+        """Blocking mode has no event loop for the state flush task: write
+        dirty state between requests once FLUSH_SECONDS have passed.
+        """
+        try:
+            import state
+            state.flush_if_due()
+        except Exception as e:
+            print('Could not flush state:', e)
+    
+    def _sync_time_blocking(self):
+        """Blocking mode has no event loop for the SNTP task: sync between
+        requests whenever a sync is due.
+        """
+        try:
+            import lib.sntp
+            lib.sntp.sync_if_due()
+        except ImportError:
+            # No asyncio on this port: the clock stays as boot.py set it
+            pass
+        except Exception as e:
+            print('Could not sync time:', e)
+    
     def _send_startup_notification(self, ip, port):
         """Send startup notification."""
         try:
@@ -798,7 +938,7 @@ class SimpleServer:
             time_str = "{:02d}:{:02d}:{:02d}".format(now[3], now[4], now[5])
             msg = 'Feeder started at {} and can be accessed at {}'.format(time_str, url)
             lib.notification.send_ntfy_notification(msg)
-            print('Startup notification sent:', msg)
+            print('Startup notification queued:', msg)
         except Exception as e:
             print('Could not send startup notification:', e)
 
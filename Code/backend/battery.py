@@ -0,0 +1,119 @@
+# Battery runtime (the `battery` build runs this as main.py)
+# Every boot is a wake from deep sleep: set the clock from the DS3231, feed if
+# a feed is due, work out the next feed from the compiled schedule, program
+# DS3231 alarm 1 for it and go back to machine.deepsleep(). No WiFi, web
+# server or asyncio is loaded.
+#
+# Wiring: DS3231 INT/SQW must pulse the ESP8266 RST pin (through a capacitor
+# or transistor, since INT stays low until the alarm flag is cleared). For the
+# DEEP_SLEEP_MINUTES timer fallback GPIO16 (D0) must be wired to RST as well.
+
+try:
+    import utime as time
+except ImportError:
+    import time
+import state
+import schedule_compiler
+
+try:
+    import config
+    MAX_SLEEP_MINUTES = config.DEEP_SLEEP_MINUTES if hasattr(config, 'DEEP_SLEEP_MINUTES') else 30
+    NOTIFY = config.BATTERY_NOTIFY if hasattr(config, 'BATTERY_NOTIFY') else False
+    SDA_PIN = config.RTC_SDA_PIN if hasattr(config, 'RTC_SDA_PIN') else 4
+    SCL_PIN = config.RTC_SCL_PIN if hasattr(config, 'RTC_SCL_PIN') else 5
+except ImportError:
+    MAX_SLEEP_MINUTES = 30
+    NOTIFY = False
+    SDA_PIN = 4
+    SCL_PIN = 5
+
+# A wake this close to the feed time counts as on time
+EARLY_SECONDS = 5
+
+def parse_iso(iso):
+    """'YYYY-MM-DDTHH:MM:SS' -> epoch seconds, or None."""
+    try:
+        date_part, time_part = iso.split('T')
+        y, mo, d = date_part.split('-')
+        h, mi, s = time_part.split(':')
+        return time.mktime((int(y), int(mo), int(d), int(h), int(mi), int(s), 0, 0, -1))
+    except (ValueError, AttributeError):
+        return None
+
+def format_iso(secs):
+    t = time.localtime(secs)
+    return "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(t[0], t[1], t[2], t[3], t[4], t[5])
+
+def plan(table, now_secs, next_feed):
+    """Decide what this wake does.
+    Args:
+        table: compiled schedule (schedule_compiler.compile)
+        now_secs: current time
+        next_feed: stored next feed time in epoch seconds, or None
+    Returns: (feed_now, next_feed_secs or None, sleep_ms or None for no limit)
+    """
+    feed_now = next_feed is not None and next_feed - now_secs <= EARLY_SECONDS
+    if feed_now or next_feed is None:
+        next_feed = schedule_compiler.next_feed_secs(table, now_secs)
+    if next_feed is None:
+        sleep_ms = None
+    else:
+        sleep_ms = max(0, next_feed - now_secs) * 1000
+    if MAX_SLEEP_MINUTES and (sleep_ms is None or sleep_ms > MAX_SLEEP_MINUTES * 60000):
+        sleep_ms = MAX_SLEEP_MINUTES * 60000
+    return feed_now, next_feed, sleep_ms
+
+def _feed():
+    import calibration_service
+    import event_log_service
+    event_log_service.log_event(event_log_service.EVENT_FEED_SCHEDULED, 'Scheduled feeding (battery)')
+    if not calibration_service.disburseFood():
+        event_log_service.log_event(event_log_service.EVENT_ERROR, 'Failed to dispense food')
+        return
+    quantity = max(0, state.get('quantity') - 1)
+    state.set('quantity', quantity)
+    state.set('last_fed', format_iso(int(time.time())))
+    if NOTIFY:
+        _notify("Food disbursed at {}. Feed remaining: {}".format(state.get('last_fed')[11:], quantity))
+
+def _notify(message):
+    """Optional push; costs a WiFi connection, so it is off by default."""
+    try:
+        from wifi_manager import WifiManager
+        wifi = WifiManager()
+        wifi.connect(retries=1)
+        if wifi.is_connected():
+            # No event loop here: send before deep sleep, keep failures on flash for the next wake
+            import lib.notification
+            lib.notification.set_blocking()
+            lib.notification.send_ntfy_notification(message)
+    except Exception as e:
+        print('Notification failed:', e)
+
+def run():
+    import machine
+    from lib.rtc_handler import DS3231
+
+    rtc = DS3231(SDA_PIN, SCL_PIN)
+    rtc.clear_alarm()
+    if not rtc.to_system_clock():
+        print('DS3231 lost power, time is not valid')
+    state.load()
+
+    now = int(time.time())
+    feed_now, next_feed, sleep_ms = plan(schedule_compiler.table(), now, parse_iso(state.get('next_feed')))
+    if feed_now:
+        _feed()
+    state.set('next_feed', format_iso(next_feed) if next_feed is not None else 'Not scheduled')
+    state.flush()
+
+    if next_feed is not None:
+        t = time.localtime(next_feed)
+        rtc.set_alarm(t[3], t[4], t[2])
+        print('Next feed {}, sleeping'.format(format_iso(next_feed)))
+    else:
+        print('No feed scheduled, sleeping')
+    if sleep_ms is None:
+        machine.deepsleep()
+    else:
+        machine.deepsleep(sleep_ms)
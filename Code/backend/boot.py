@@ -2,6 +2,25 @@
 # Initiates WiFi connection using WifiManager
 
 import gc
+import boot_trace
+
+# Set the clock from the DS3231 first, so the schedule (and the boot event
+# below) has the right time without waiting for WiFi. SNTP corrects both the
+# system clock and the DS3231 once the network is up.
+try:
+    import config
+    from lib.rtc_handler import DS3231
+    rtc = DS3231(config.RTC_SDA_PIN if hasattr(config, 'RTC_SDA_PIN') else 4,
+                 config.RTC_SCL_PIN if hasattr(config, 'RTC_SCL_PIN') else 5)
+    if rtc.to_system_clock():
+        print('Clock set from DS3231')
+    else:
+        print('DS3231 lost power, waiting for NTP')
+    del rtc
+except Exception as e:
+    print('DS3231 not available:', e)
+boot_trace.mark('rtc')
+
 from wifi_manager import WifiManager
 
 # Collect garbage at startup
@@ -13,6 +32,7 @@ try:
     event_log_service.log_event(event_log_service.EVENT_RESTART, 'System boot')
 except:
     pass  # Don't fail boot if logging fails
+boot_trace.mark('event_log')
 
 # You can customize SSID and password below if needed
 
@@ -34,6 +54,7 @@ def file_exists(path):
 wifi_dat_exists = file_exists('wifi.dat')
 max_retries = 3 if wifi_dat_exists else 1
 wifi.connect(retries=max_retries)
+boot_trace.mark('wifi')
 
 # Collect garbage after WiFi connection
 gc.collect()
@@ -76,65 +97,10 @@ if wifi.is_connected():
         print('mDNS setup failed:', e)
         print('Access via IP: http://{}:5000'.format(wifi.get_address()[0]))
     
-    # Set timezone to India/Kolkata (UTC+5:30)
-    try:
-        import ntptime
-        import machine
-        import utime as time
-        
-        # Wait a moment for network to be fully ready
-        time.sleep(2)
-        
-        print('Syncing time with NTP server...')
-        
-        # Try multiple NTP servers with timeout
-        ntp_servers = ['pool.ntp.org', 'time.google.com', 'time.cloudflare.com']
-        sync_success = False
-        
-        for ntp_server in ntp_servers:
-            try:
-                print('Trying NTP server: {}'.format(ntp_server))
-                ntptime.host = ntp_server
-                ntptime.timeout = 5  # 5 second timeout
-                ntptime.settime()  # Sync with NTP server (gets UTC time)
-                sync_success = True
-                print('Successfully synced with {}'.format(ntp_server))
-                break
-            except Exception as e:
-                print('Failed to sync with {}: {}'.format(ntp_server, e))
-                if ntp_server == ntp_servers[-1]:
-                    # Last server also failed
-                    raise Exception('All NTP servers failed')
-                # Try next server
-                continue
-        
-        if sync_success:
-            # India/Kolkata is UTC+5:30 (19800 seconds offset)
-            # ESP32/ESP8266 stores time in UTC, so we need to add the offset
-            IST_OFFSET = 19800  # 5 hours 30 minutes in seconds
-            
-            # Get current UTC time
-            current_time = time.time()
-            
-            # Add IST offset
-            ist_time = current_time + IST_OFFSET
-            
-            # Convert to struct_time
-            tm = time.localtime(ist_time)
-            
-            # Set RTC with IST time
-            rtc = machine.RTC()
-            rtc.datetime((tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0))
-            
-            print('Time synced to India/Kolkata timezone')
-            print('Current time:', time.localtime())
-        
-    except Exception as e:
-        print('Failed to sync time:', e)
-        print('Continuing without time sync...')
-        print('Note: Scheduled feeding may not work correctly without time sync')
+    # The clock is synced over SNTP in the background once the server is up (lib/sntp.py)
 else:
     print('WiFi not connected. Configuration portal may be active.')
+boot_trace.mark('mdns')
 
 # Final garbage collection before main.py loads
 gc.collect()
@@ -0,0 +1,100 @@
+# Boot phase tracer
+# boot.py, main.py and the API server call mark('phase') at each phase
+# boundary. ticks_ms and free heap go into arrays allocated when this module
+# is imported, so a mark costs no allocation. finish() runs once the server is
+# listening and writes the profile to flash, keeping the previous boot's
+# profile next to it; /api/system/boot serves both.
+
+import gc
+from array import array
+import ticks
+
+MAX_PHASES = 16
+PROFILE_FILE = 'data/boot_profile.json'
+PREVIOUS_FILE = 'data/boot_profile.prev.json'
+
+_names = [None] * MAX_PHASES
+_ticks = array('L', [0] * MAX_PHASES)
+_free = array('L', [0] * MAX_PHASES)
+_count = 0
+_finished = False
+
+def _mem_free():
+    return gc.mem_free() if hasattr(gc, 'mem_free') else 0
+
+def mark(name):
+    """Record the end of a boot phase. Marks past MAX_PHASES are dropped."""
+    global _count
+    if _count < MAX_PHASES:
+        _ticks[_count] = ticks.ticks_ms()
+        _free[_count] = _mem_free()
+        _names[_count] = name
+        _count += 1
+
+def profile():
+    """This boot's phases as a dict.
+    Each phase has the ms it took (since the previous mark), the ms since
+    reset when it ended and the free heap at that point. The first mark is
+    the import of this module, so its ms is the time from reset to boot.py.
+    """
+    phases = []
+    prev = 0
+    for i in range(_count):
+        phases.append({'phase': _names[i], 'ms': ticks.ticks_diff(_ticks[i], prev) if i else _ticks[0],
+                       'at_ms': _ticks[i], 'mem_free': _free[i]})
+        prev = _ticks[i]
+    return {
+        'firmware': _firmware(),
+        'reset_cause': _reset_cause(),
+        'total_ms': _ticks[_count - 1] if _count else 0,
+        'phases': phases
+    }
+
+def _firmware():
+    try:
+        from json_utils import parse_simple_json
+        with open('ota/version.json', 'r') as f:
+            return parse_simple_json(f.read()).get('version')
+    except Exception:
+        return None
+
+def _reset_cause():
+    try:
+        import machine
+        return machine.reset_cause()
+    except (ImportError, AttributeError):
+        return None
+
+def finish():
+    """Mark the server as up and persist the profile (once per boot)."""
+    global _finished
+    if _finished:
+        return
+    _finished = True
+    mark('listening')
+    from json_utils import json_encode
+    import os
+    try:
+        try:
+            os.remove(PREVIOUS_FILE)
+        except OSError:
+            pass
+        try:
+            os.rename(PROFILE_FILE, PREVIOUS_FILE)
+        except OSError:
+            pass
+        with open(PROFILE_FILE, 'w') as f:
+            f.write(json_encode(profile()))
+    except OSError as e:
+        print('Could not save boot profile:', e)
+
+def previous():
+    """The previous boot's profile as JSON text, or None."""
+    try:
+        with open(PREVIOUS_FILE, 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+# The import is the first phase boundary
+mark('reset')
@@ -10,6 +10,8 @@
 const fs = require('fs');
 const path = require('path');
 const { execSync } = require('child_process');
+const zlib = require('zlib');
+const crypto = require('crypto');
 
 // Determine build mode from command line argument
 const mode = process.argv[2] || 'api'; // 'battery' or 'api' (default)
@@ -19,7 +21,7 @@ const frontendDir = path.join(__dirname, '..', 'frontend');
 const frontendDistDir = path.join(frontendDir, 'dist');
 
 
-// Data files (empty templates for API mode)
+// Data files (empty templates when backend/data doesn't exist)
 const dataFiles = [
   { name: 'data/schedule.txt', content: 'times=\ndays=' },
   { name: 'data/last_fed.txt', content: '' },
@@ -30,6 +32,12 @@ const dataFiles = [
 // UI directory (copy as is for API mode)
 const uiDir = 'UI';
 
+// Text assets that get a precompressed .gz sibling (images are already compressed)
+const gzipExtensions = ['.html', '.css', '.js', '.json', '.svg', '.txt'];
+
+// ETag manifest loaded once by api.py: one "<path> <hash>" line per UI file
+const etagManifest = 'etags.txt';
+
 function createDirectory(dir) {
   if (!fs.existsSync(dir)) {
     fs.mkdirSync(dir, { recursive: true });
@@ -49,23 +57,86 @@ function copyFile(src, dest) {
   }
 }
 
-function copyDirectory(src, dest) {
+function copyDirectory(src, dest, exclude = []) {
   createDirectory(dest);
   
   const entries = fs.readdirSync(src, { withFileTypes: true });
   
   for (const entry of entries) {
+    if (exclude.includes(entry.name)) {
+      continue;
+    }
     const srcPath = path.join(src, entry.name);
     const destPath = path.join(dest, entry.name);
     
     if (entry.isDirectory()) {
-      copyDirectory(srcPath, destPath);
+      copyDirectory(srcPath, destPath, exclude);
     } else {
       copyFile(srcPath, destPath);
     }
   }
 }
 
+// Write <file>.gz next to every compressible file under dir.
+// Returns a map of relative path -> { raw, gz } byte counts.
+function gzipAssets(dir, relPath = '', sizes = {}) {
+  const entries = fs.readdirSync(path.join(dir, relPath), { withFileTypes: true });
+
+  for (const entry of entries) {
+    const rel = path.join(relPath, entry.name);
+    const full = path.join(dir, rel);
+
+    if (entry.isDirectory()) {
+      gzipAssets(dir, rel, sizes);
+      continue;
+    }
+    const raw = fs.readFileSync(full);
+    let gz = raw.length;
+    if (gzipExtensions.includes(path.extname(entry.name))) {
+      const compressed = zlib.gzipSync(raw, { level: 9 });
+      // Only keep the .gz when it actually saves bytes
+      if (compressed.length < raw.length) {
+        fs.writeFileSync(full + '.gz', compressed);
+        gz = compressed.length;
+      }
+    }
+    sizes[rel.split(path.sep).join('/')] = { raw: raw.length, gz };
+  }
+  return sizes;
+}
+
+// Hash every UI file (except .gz siblings) into the ETag manifest
+function writeEtagManifest(dir, sizes) {
+  const lines = [];
+  for (const rel of Object.keys(sizes).sort()) {
+    if (rel.endsWith('.gz') || rel === etagManifest) {
+      continue;
+    }
+    const hash = crypto.createHash('sha1').update(fs.readFileSync(path.join(dir, rel))).digest('hex').slice(0, 16);
+    lines.push(`${rel} ${hash}`);
+  }
+  fs.writeFileSync(path.join(dir, etagManifest), lines.join('\n') + '\n');
+  console.log(`Created: ${uiDir}/${etagManifest} (${lines.length} entries)`);
+}
+
+// Bytes sent for each HTML page plus the stylesheet and header image it loads
+function reportPageSizes(sizes) {
+  const shared = ['css/styles.css', 'assets/images/Header.png'].filter(f => sizes[f]);
+  let totalRaw = 0;
+  let totalGz = 0;
+
+  console.log('Page                    raw bytes   gzip bytes   saved');
+  for (const page of Object.keys(sizes).filter(f => f.endsWith('.html')).sort()) {
+    const files = [page, ...shared];
+    const raw = files.reduce((sum, f) => sum + sizes[f].raw, 0);
+    const gz = files.reduce((sum, f) => sum + sizes[f].gz, 0);
+    totalRaw += raw;
+    totalGz += gz;
+    console.log(`${page.padEnd(22)} ${String(raw).padStart(10)} ${String(gz).padStart(12)} ${(100 - gz * 100 / raw).toFixed(0).padStart(6)}%`);
+  }
+  console.log(`${'Total'.padEnd(22)} ${String(totalRaw).padStart(10)} ${String(totalGz).padStart(12)} ${(100 - totalGz * 100 / totalRaw).toFixed(0).padStart(6)}%`);
+}
+
 function createDataFile(filePath, content) {
   const fullPath = path.join(distDir, filePath);
   const dir = path.dirname(fullPath);
@@ -143,7 +214,7 @@ function build() {
 
   // Copy all .py files from backend and subfolders to dist, preserving structure
   // Exclude microdot files and dist folder itself
-  const excludeFiles = ['api_old.py', 'test_gpio.py', 'test_servo.py', 'test_scheduler.py'];
+  const excludeFiles = ['api_old.py', 'test_gpio.py', 'test_servo.py', 'test_scheduler.py', 'test_router.py', 'test_keepalive.py', 'test_file_sender.py', 'test_gc_policy.py', 'test_json_stream.py', 'test_notification_outbox.py', 'test_state_record.py', 'test_event_log.py', 'test_schedule_compiler.py', 'test_battery_sim.py', 'test_sntp.py', 'test_wifi_fast.py', 'test_http_parser.py', 'test_boot_trace.py', 'test_feed_jobs.py'];
   const excludeDirs = ['dist', 'node_modules', '__pycache__'];
 
   function copyAllPyFiles(srcDir, destDir, relPath = '') {
@@ -185,30 +256,44 @@ function build() {
     copyFile(wifiDatSrc, wifiDatDest);
   }
 
-  // For API mode, copy UI directory and create/copy data files into dist
+  // For API mode, copy UI directory into dist
   if (mode === 'api') {
     console.log('\n📁 Copying UI directory...\n');
     const uiSrc = path.join(__dirname, uiDir);
     const uiDest = path.join(distDir, uiDir);
     if (fs.existsSync(uiSrc)) {
       copyDirectory(uiSrc, uiDest);
+
+      console.log('\n🗜️  Precompressing UI assets...\n');
+      const sizes = gzipAssets(uiDest);
+      reportPageSizes(sizes);
+      writeEtagManifest(uiDest, sizes);
     } else {
       console.warn(`⚠️  Warning: ${uiDir} directory not found`);
     }
+  }
 
-    console.log('\n📝 Copying/Creating data files...\n');
-    const dataDir = path.join(__dirname, 'data');
-    const dataDestDir = path.join(distDir, 'data');
-    // Copy data directory if it exists, otherwise create defaults
-    if (fs.existsSync(dataDir)) {
-      console.log('Found existing data directory, copying...');
-      copyDirectory(dataDir, dataDestDir);
-    } else {
-      console.log('No existing data directory, creating defaults...');
-      dataFiles.forEach(file => {
-        createDataFile(file.name, file.content);
-      });
-    }
+  // Battery build: main.py runs one wake cycle and deep-sleeps; boot.py skips WiFi and NTP
+  if (mode === 'battery') {
+    fs.writeFileSync(path.join(distDir, 'boot.py'), '# boot.py - battery build: WiFi and NTP stay off\nimport gc\ngc.collect()\n');
+    fs.writeFileSync(path.join(distDir, 'main.py'), '# main.py - battery build: one wake cycle, then deep sleep\nimport battery\nbattery.run()\n');
+    console.log('Wrote battery boot.py and main.py');
+  }
+
+  // Both builds need the schedule and state files
+  console.log('\n📝 Copying/Creating data files...\n');
+  const dataDir = path.join(__dirname, 'data');
+  const dataDestDir = path.join(distDir, 'data');
+  // Copy data directory if it exists, otherwise create defaults
+  if (fs.existsSync(dataDir)) {
+    console.log('Found existing data directory, copying...');
+    // Boot profiles are written by the device (and by host test runs); never ship them
+    copyDirectory(dataDir, dataDestDir, ['boot_profile.json', 'boot_profile.prev.json']);
+  } else {
+    console.log('No existing data directory, creating defaults...');
+    dataFiles.forEach(file => {
+      createDataFile(file.name, file.content);
+    });
   }
   
   // Create README in dist
@@ -239,24 +324,61 @@ The main.py will run on boot and handle scheduled feedings.
 $PORT = "COM3"
 
 ${mode === 'battery' ? `
-# Upload main files
+# Upload main files (the build also copies the web server modules; battery.py doesn't import them)
+ampy --port $PORT put boot.py
 ampy --port $PORT put main.py
 ampy --port $PORT put config.py
+ampy --port $PORT put battery.py
+ampy --port $PORT put wifi_manager.py
+ampy --port $PORT put ticks.py
+ampy --port $PORT put state.py
+ampy --port $PORT put state_record.py
+ampy --port $PORT put schedule_compiler.py
+ampy --port $PORT put calibration_service.py
+ampy --port $PORT put event_log_service.py
+ampy --port $PORT put gc_policy.py
 
 # Create lib directory and upload drivers
 ampy --port $PORT mkdir lib
 ampy --port $PORT put lib/stepper.py lib/stepper.py
 ampy --port $PORT put lib/rtc_handler.py lib/rtc_handler.py
 ampy --port $PORT put lib/notification.py lib/notification.py
+ampy --port $PORT put lib/http_client.py lib/http_client.py
+
+# Create data directory and upload state files
+ampy --port $PORT mkdir data
+ampy --port $PORT put data/schedule.txt data/schedule.txt
+ampy --port $PORT put data/last_fed.txt data/last_fed.txt
+ampy --port $PORT put data/next_feed.txt data/next_feed.txt
+ampy --port $PORT put data/quantity.txt data/quantity.txt
+ampy --port $PORT put data/calibration.txt data/calibration.txt
 ` : `
 # Upload main files
-ampy --port $PORT put api.py
+ampy --port $PORT put boot.py
+ampy --port $PORT put main.py
 ampy --port $PORT put config.py
+ampy --port $PORT put wifi_manager.py
+ampy --port $PORT put ticks.py
+ampy --port $PORT put boot_trace.py
+ampy --port $PORT put gc_policy.py
+ampy --port $PORT put api.py
+ampy --port $PORT put router.py
+ampy --port $PORT put http_parser.py
+ampy --port $PORT put http_utils.py
+ampy --port $PORT put json_utils.py
+ampy --port $PORT put system_handlers.py
+ampy --port $PORT put state.py
+ampy --port $PORT put state_record.py
 ampy --port $PORT put services.py
 ampy --port $PORT put last_fed_service.py
 ampy --port $PORT put next_feed_service.py
 ampy --port $PORT put quantity_service.py
-ampy --port $PORT put microdot.py
+ampy --port $PORT put calibration_service.py
+ampy --port $PORT put event_log_service.py
+ampy --port $PORT put feed_jobs.py
+ampy --port $PORT put schedule_compiler.py
+ampy --port $PORT put scheduler_service.py
+ampy --port $PORT put battery.py
 ampy --port $PORT put urequests.py
 
 # Create lib directory and upload drivers
@@ -264,25 +386,36 @@ ampy --port $PORT mkdir lib
 ampy --port $PORT put lib/stepper.py lib/stepper.py
 ampy --port $PORT put lib/rtc_handler.py lib/rtc_handler.py
 ampy --port $PORT put lib/notification.py lib/notification.py
+ampy --port $PORT put lib/http_client.py lib/http_client.py
+ampy --port $PORT put lib/sntp.py lib/sntp.py
+
+# Create ota directory and upload the updater
+ampy --port $PORT mkdir ota
+ampy --port $PORT put ota/ota_updater.py ota/ota_updater.py
+ampy --port $PORT put ota/version.json ota/version.json
 
-# Create data directory and upload data files
+# Create data directory and upload state files
 ampy --port $PORT mkdir data
-ampy --port $PORT put data/schedule.json data/schedule.json
-ampy --port $PORT put data/last_fed.json data/last_fed.json
-ampy --port $PORT put data/next_feed.json data/next_feed.json
-ampy --port $PORT put data/quantity.json data/quantity.json
+ampy --port $PORT put data/schedule.txt data/schedule.txt
+ampy --port $PORT put data/last_fed.txt data/last_fed.txt
+ampy --port $PORT put data/next_feed.txt data/next_feed.txt
+ampy --port $PORT put data/quantity.txt data/quantity.txt
+ampy --port $PORT put data/calibration.txt data/calibration.txt
 
 # Upload UI directory (you may need to upload each file individually)
+# Upload each file's .gz copy and UI/etags.txt the same way when the build wrote them
 ampy --port $PORT mkdir UI
 ampy --port $PORT put UI/index.html UI/index.html
 ampy --port $PORT put UI/feednow.html UI/feednow.html
 ampy --port $PORT put UI/setquantity.html UI/setquantity.html
 ampy --port $PORT put UI/setschedule.html UI/setschedule.html
+ampy --port $PORT put UI/calibration.html UI/calibration.html
+ampy --port $PORT put UI/troubleshooting.html UI/troubleshooting.html
 ampy --port $PORT mkdir UI/css
 ampy --port $PORT put UI/css/styles.css UI/css/styles.css
 ampy --port $PORT mkdir UI/assets
 ampy --port $PORT mkdir UI/assets/images
-# Add image files as needed
+ampy --port $PORT put UI/assets/images/Header.png UI/assets/images/Header.png
 `}
 \`\`\`
 
@@ -4,8 +4,8 @@
 from machine import Pin, PWM
 import utime as time
 
-# Data file path
-CALIBRATION_FILE = 'data/calibration.txt'
+import state
+
 SERVO_PIN = 18  # GPIO pin for servo
 
 # Default calibration values
@@ -13,29 +13,23 @@ DEFAULT_DUTY_CYCLE = 80
 DEFAULT_PULSE_DURATION = 10  # milliseconds
 
 def read_calibration():
-    """Read duty cycle and pulse duration from file.
+    """Current duty cycle and pulse duration from the state store.
     Returns: tuple (duty_cycle, pulse_duration_ms)
     """
-    try:
-        with open(CALIBRATION_FILE, 'r') as f:
-            data = f.read().strip()
-            parts = data.split(',')
-            duty_cycle = int(parts[0])
-            pulse_duration = int(parts[1])
-            return duty_cycle, pulse_duration
-    except:
-        # Return defaults if file doesn't exist or is corrupt
+    calibration = state.get('calibration')
+    if calibration is None:
+        # No file or a corrupt one
         return DEFAULT_DUTY_CYCLE, DEFAULT_PULSE_DURATION
+    return calibration
 
 def save_calibration(duty_cycle, pulse_duration):
-    """Save duty cycle and pulse duration to file.
+    """Save duty cycle and pulse duration.
     Args:
         duty_cycle: PWM duty cycle value
         pulse_duration: pulse duration in milliseconds
     """
     try:
-        with open(CALIBRATION_FILE, 'w') as f:
-            f.write(f"{duty_cycle},{pulse_duration}")
+        state.set('calibration', (int(duty_cycle), int(pulse_duration)))
         return True
     except Exception as e:
         print(f"Error saving calibration: {e}")
@@ -79,10 +73,10 @@ def disburseFood():
     """Disburse food using calibrated servo settings.
     Reads duty cycle and pulse duration from file, runs servo, then deinits.
     """
-    import gc
+    import gc_policy
     
     # Free memory before servo operation
-    gc.collect()
+    gc_policy.maybe_collect('calibration.disburseFood')
     
     duty_cycle, pulse_duration = read_calibration()
     
@@ -100,24 +94,55 @@ def disburseFood():
         print("Food dispensed, servo deinitialized")
         
         # Clean up after servo operation
-        gc.collect()
+        gc_policy.maybe_collect('calibration.disburseFood')
         
         return True
         
     except Exception as e:
         print(f"Error dispensing food: {e}")
         # Clean up on error too
-        gc.collect()
+        gc_policy.maybe_collect('calibration.disburseFood')
+        return False
+
+async def disburseFoodAsync():
+    """Same as disburseFood, but yields to the event loop while the servo runs
+    instead of blocking it for the whole pulse.
+    """
+    import uasyncio as asyncio
+    import gc_policy
+    
+    duty_cycle, pulse_duration = read_calibration()
+    
+    servo = None
+    try:
+        servo = PWM(Pin(SERVO_PIN), freq=50)
+        servo.duty(duty_cycle)
+        print(f"Dispensing food: duty={duty_cycle}, duration={pulse_duration}ms")
+        await asyncio.sleep_ms(pulse_duration)
+        servo.deinit()
+        print("Food dispensed, servo deinitialized")
+        gc_policy.maybe_collect('calibration.disburseFoodAsync')
+        return True
+        
+    except Exception as e:
+        print(f"Error dispensing food: {e}")
+        if servo is not None:
+            # Never leave the motor running
+            try:
+                servo.deinit()
+            except:
+                pass
+        gc_policy.maybe_collect('calibration.disburseFoodAsync')
         return False
 
 def test_calibration():
     """Test current calibration by running servo with current settings.
     Returns current calibration values after test.
     """
-    import gc
+    import gc_policy
     
     # Free memory before test
-    gc.collect()
+    gc_policy.maybe_collect('calibration.test_calibration')
     
     duty_cycle, pulse_duration = read_calibration()
     
@@ -135,7 +160,7 @@ def test_calibration():
         print("Test complete, servo deinitialized")
         
         # Clean up after test
-        gc.collect()
+        gc_policy.maybe_collect('calibration.test_calibration')
         
         return {
             'success': True,
@@ -145,7 +170,7 @@ def test_calibration():
         
     except Exception as e:
         print(f"Error testing calibration: {e}")
-        gc.collect()
+        gc_policy.maybe_collect('calibration.test_calibration')
         return {
             'success': False,
             'error': str(e)
@@ -4,6 +4,9 @@
 # WiFi Configuration
 WIFI_SSID = "your_wifi_ssid"
 WIFI_PASSWORD = "your_wifi_password"
+WIFI_FAST_CONNECT = True      # Reconnect to the cached access point (BSSID + channel) without scanning
+WIFI_FAST_TIMEOUT_MS = 5000   # Give up on the cached access point and scan after this
+WIFI_CACHE_IP = False         # Also reuse the last DHCP lease as a static IP (skips DHCP)
 
 # mDNS/Hostname Configuration
 MDNS_HOSTNAME = "feeder"  # Access via http://feeder.local:5000
@@ -15,6 +18,14 @@ FEEDING_TIMES = [
     (20, 0),  # 8:00 PM
 ]
 
+# Device State
+STATE_FLUSH_SECONDS = 60    # Write changed state (quantity, schedule, ...) to flash this often
+STATE_FORMAT = 'text'       # 'binary': one CRC-checked record in data/state.bin (migrates the .txt files)
+
+# Feed Jobs
+FEED_COALESCE_SECONDS = 10  # Repeat feed requests within this window join the same job
+FEED_JOB_HISTORY = 5        # Finished jobs kept for /api/jobs/<id>
+
 # Motor Configuration
 MOTOR_STEPS_PER_FEEDING = 512  # Full rotation for 28BYJ-48
 MOTOR_SPEED_MS = 2  # Delay between steps in milliseconds
@@ -32,6 +43,22 @@ MOTOR_PIN_4 = 17  # TX2 → IN4 (ESP32)
 # MOTOR_PIN_3 = 14  # D5
 # MOTOR_PIN_4 = 15  # D8
 
+# Web Server Configuration
+HTTP_REQUEST_TIMEOUT_MS = 5000  # Drop clients that don't send a full request in time
+HTTP_BUFFER_COUNT = 2           # Preallocated receive buffers (max concurrent requests)
+HTTP_BUFFER_SIZE = 1536         # Bytes per buffer; larger requests get 413
+HTTP_KEEPALIVE = True           # Reuse TCP connections for UI page loads
+HTTP_KEEPALIVE_IDLE_MS = 3000   # Close idle persistent connections after this
+HTTP_MAX_REQUESTS_PER_CONN = 20 # Close a connection after this many requests
+HTTP_KEEPALIVE_MAX_CONNECTIONS = 4  # Above this many open connections, responses use Connection: close (not a cap)
+HTTP_SEND_CHUNK = 1460          # Static file chunk size (one TCP segment)
+HTTP_BLOCKING_POLL_MS = 1000    # Blocking mode: flush state and sync the clock this often while idle
+
+# Garbage Collection Policy
+GC_THRESHOLD_PERCENT = 25       # Auto-collect after this share of the heap is allocated
+GC_LOW_WATER_PERCENT = 20       # maybe_collect() only collects below this share of free heap
+GC_ALWAYS_COLLECT = False       # True restores a collection at every call site (for comparison)
+
 # Servo Configuration (for continuous rotation servo)
 SERVO_PIN = 18  # GPIO18 (D18) - Servo signal pin
 
@@ -40,12 +67,31 @@ RTC_SDA_PIN = 4   # D2
 RTC_SCL_PIN = 5   # D1
 
 # Power Management
-DEEP_SLEEP_MINUTES = 30  # Wake up every 30 minutes to check schedule
+DEEP_SLEEP_MINUTES = 30  # Battery build: longest deep sleep between wakes (0 = wake only on the DS3231 alarm)
+BATTERY_NOTIFY = False   # Battery build: connect to WiFi after each feed to send a notification
+
+# Time Sync (SNTP, runs in the background once the web server is up)
+NTP_SERVERS = ['pool.ntp.org', 'time.google.com', 'time.cloudflare.com']  # Queried in parallel; 'host:port' allowed
+NTP_TIMEOUT_MS = 3000           # Give up on a sync round after this long
+NTP_RESYNC_MINUTES = 360        # Resync (and measure drift) this often
+TZ_OFFSET_SECONDS = 19800       # Local time zone (India/Kolkata, UTC+5:30)
 
 # Notification Configuration (ntfy)
 NTFY_TOPIC = "FF0x98854"
 NTFY_SERVER = "http://ntfy.sh"
 SEND_NOTIFICATIONS = True
+NOTIFY_BATCH_MS = 2000          # Messages queued within this window share one push
+NOTIFY_RETRY_MIN_MS = 5000      # First retry delay after a failed push, doubled each time
+NOTIFY_RETRY_MAX_MS = 300000    # Longest retry delay
+NOTIFY_QUEUE_SIZE = 10          # Messages kept in RAM; older ones wait in data/outbox.txt
+NOTIFY_TIMEOUT_MS = 10000       # Wait this long for the ntfy server's reply
+NOTIFY_MAX_RETRIES = 8          # Drop a push after this many failed attempts (4xx replies are dropped at once)
+NOTIFY_SPILL_MAX = 50           # Messages kept in data/outbox.txt; the oldest are dropped beyond this
+NTFY_IDLE_MS = 30000            # Close the ntfy keep-alive connection after this idle time
+NTFY_DNS_TTL_S = 3600           # Re-resolve the ntfy host after this long
+
+# Event Log
+EVENT_INDEX_PER_TYPE = 16       # Newest events of each type indexed for /api/events?type=
 
 # Debug Mode
 DEBUG = True
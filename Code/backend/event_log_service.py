@@ -1,11 +1,34 @@
 # Event logging service for fish feeder
-# Stores critical events in a rotating log file (max 100 entries)
+# Stores critical events in a fixed-size ring log (max 100 entries).
+# The file is a 12-byte header (magic, head index, count, next sequence number)
+# followed by MAX_ENTRIES fixed-width text records, so appending an event is one record
+# write plus a header update, and reads seek straight to the records they need.
+# Small in-RAM indexes (slots per event type, first slot per hour) are built
+# with one pass over the log on first access and kept up to date on append,
+# so filtered queries only read the records they return.
+# Every event gets a sequence number that keeps increasing across wrap-around
+# and clear_events(); records are stored oldest to newest, so the number of a
+# record follows from its position and is not written per record.
 
-import utime as time
+import struct
+try:
+    import utime as time
+except ImportError:
+    import time
 
-LOG_FILE = 'data/events.log'
+LOG_FILE = 'data/events.ring'
+LEGACY_LOG_FILE = 'data/events.log'
 MAX_ENTRIES = 100
 
+HEADER = '<4sHHI'
+HEADER_SIZE = struct.calcsize(HEADER)
+MAGIC = b'EVL2'
+# Previous layout without sequence numbers, converted on first open
+V1_HEADER = '<4sHH'
+V1_MAGIC = b'EVL1'
+# "timestamp,type,details" padded with spaces to RECORD_SIZE - 1, then '\n'
+RECORD_SIZE = 96
+
 # Event types
 EVENT_FEED_SCHEDULED = 'FEED_SCHEDULED'
 EVENT_FEED_MANUAL = 'FEED_MANUAL'
@@ -15,6 +38,152 @@ EVENT_RESTART = 'RESTART'
 EVENT_CONFIG_CHANGE = 'CONFIG_CHANGE'
 EVENT_QUANTITY_UPDATE = 'QUANTITY_UPDATE'
 
+try:
+    import config
+    INDEX_PER_TYPE = config.EVENT_INDEX_PER_TYPE if hasattr(config, 'EVENT_INDEX_PER_TYPE') else 16
+except ImportError:
+    INDEX_PER_TYPE = 16
+
+# Header cached in RAM after the first access
+_head = None
+_count = 0
+_next_seq = 1
+
+# Indexes
+_type_codes = {}                    # event type -> code stored in _slot_type
+_slot_type = bytearray(MAX_ENTRIES) # type code of the record in each slot
+_by_type = {}                       # event type -> newest INDEX_PER_TYPE slots, oldest first
+_buckets = []                       # [hour 'YYYY-MM-DDTHH', first slot, records], oldest first
+
+def _encode(entry):
+    """Fixed-width record for entry, truncated on a character boundary."""
+    entry = entry.replace('\n', ' ')[:RECORD_SIZE - 1]
+    data = entry.encode()
+    while len(data) > RECORD_SIZE - 1:
+        entry = entry[:-1]
+        data = entry.encode()
+    return data + b' ' * (RECORD_SIZE - 1 - len(data)) + b'\n'
+
+def _write_header(f):
+    f.seek(0)
+    f.write(struct.pack(HEADER, MAGIC, _head, _count, _next_seq))
+
+def _open():
+    """Open the ring log for update, creating (and migrating into) it if needed."""
+    global _head, _count, _next_seq
+    try:
+        f = open(LOG_FILE, 'r+b')
+    except OSError:
+        f = None
+    entries = None
+    if f is not None:
+        if _head is not None:
+            return f
+        data = f.read(HEADER_SIZE)
+        if len(data) == HEADER_SIZE and data[:4] == MAGIC:
+            _, _head, _count, _next_seq = struct.unpack(HEADER, data)
+            _build_index(f)
+            return f
+        if data[:4] == V1_MAGIC:
+            entries = _read_v1(f)
+        f.close()
+
+    _head, _count, _next_seq = 0, 0, 1
+    _reset_index()
+    f = open(LOG_FILE, 'w+b')
+    _write_header(f)
+    if entries is None:
+        _migrate(f)
+    else:
+        for entry in entries:
+            _append(f, entry)
+    return f
+
+def _read_v1(f):
+    """Entries of an EVL1 ring (no sequence numbers), oldest first."""
+    size = struct.calcsize(V1_HEADER)
+    f.seek(0)
+    _, head, count = struct.unpack(V1_HEADER, f.read(size))
+    entries = []
+    for i in range(count):
+        f.seek(size + ((head - count + i) % MAX_ENTRIES) * RECORD_SIZE)
+        entries.append(f.read(RECORD_SIZE).decode().strip())
+    return entries
+
+def _reset_index():
+    _by_type.clear()
+    del _buckets[:]
+
+def _oldest():
+    return (_head - _count) % MAX_ENTRIES
+
+def _build_index(f):
+    """One pass over the log to rebuild the indexes after boot."""
+    _reset_index()
+    oldest = _oldest()
+    for i in range(_count):
+        slot = (oldest + i) % MAX_ENTRIES
+        f.seek(HEADER_SIZE + slot * RECORD_SIZE)
+        fields = f.read(RECORD_SIZE).decode().split(',', 2)
+        _index_add(slot, fields[1] if len(fields) > 1 else '', fields[0])
+
+def _index_add(slot, event_type, timestamp):
+    code = _type_codes.get(event_type)
+    if code is None:
+        code = _type_codes[event_type] = len(_type_codes) & 0xff
+    _slot_type[slot] = code
+    slots = _by_type.get(event_type)
+    if slots is None:
+        slots = _by_type[event_type] = []
+    slots.append(slot)
+    if len(slots) > INDEX_PER_TYPE:
+        slots.pop(0)
+    hour = timestamp[:13]
+    if _buckets and _buckets[-1][0] == hour:
+        _buckets[-1][2] += 1
+    else:
+        _buckets.append([hour, slot, 1])
+
+def _index_evict(slot):
+    """Drop the oldest record (in slot) from the indexes before it is overwritten."""
+    for event_type, slots in _by_type.items():
+        if slots and slots[0] == slot:
+            slots.pop(0)
+            break
+    if _buckets:
+        bucket = _buckets[0]
+        bucket[1] = (bucket[1] + 1) % MAX_ENTRIES
+        bucket[2] -= 1
+        if bucket[2] == 0:
+            _buckets.pop(0)
+
+def _migrate(f):
+    """Copy the newest entries of the old line-based events.log into the ring."""
+    import os
+    try:
+        with open(LEGACY_LOG_FILE, 'r') as old:
+            lines = [line.strip() for line in old.readlines() if line.strip()]
+        os.remove(LEGACY_LOG_FILE)
+    except OSError:
+        return
+    for line in lines[-MAX_ENTRIES:]:
+        _append(f, line)
+    print("Migrated {} events from {}".format(min(len(lines), MAX_ENTRIES), LEGACY_LOG_FILE))
+
+def _append(f, entry):
+    global _head, _count, _next_seq
+    if _count == MAX_ENTRIES:
+        _index_evict(_head)
+    f.seek(HEADER_SIZE + _head * RECORD_SIZE)
+    f.write(_encode(entry))
+    fields = entry.split(',', 2)
+    _index_add(_head, fields[1] if len(fields) > 1 else '', fields[0])
+    _head = (_head + 1) % MAX_ENTRIES
+    if _count < MAX_ENTRIES:
+        _count += 1
+    _next_seq += 1
+    _write_header(f)
+
 def log_event(event_type, details=''):
     """Log an event with timestamp.
     Args:
@@ -22,86 +191,138 @@ def log_event(event_type, details=''):
         details: Additional details about the event
     """
     try:
-        import gc
-        gc.collect()
-        
         # Get current timestamp
         now = time.localtime()
         timestamp = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(
             now[0], now[1], now[2], now[3], now[4], now[5]
         )
-        
+
         # Create log entry
         entry = "{},{},{}".format(timestamp, event_type, details)
-        
-        # Read existing entries
-        entries = []
+
+        f = _open()
         try:
-            with open(LOG_FILE, 'r') as f:
-                entries = [line.strip() for line in f.readlines() if line.strip()]
-        except:
-            # File doesn't exist yet, start fresh
-            pass
-        
-        # Add new entry
-        entries.append(entry)
-        
-        # Keep only last MAX_ENTRIES
-        if len(entries) > MAX_ENTRIES:
-            entries = entries[-MAX_ENTRIES:]
-        
-        # Write back to file
-        with open(LOG_FILE, 'w') as f:
-            for e in entries:
-                f.write(e + '\n')
-        
+            _append(f, entry)
+        finally:
+            f.close()
+
         print("Event logged: {}".format(entry))
-        gc.collect()
-        
+
         return True
-        
+
     except Exception as e:
         print("Failed to log event: {}".format(e))
         return False
 
+def _parse(record):
+    line = record.decode().strip()
+    parts = line.split(',', 2)  # Split on first 2 commas only
+    if len(parts) < 2:
+        return None
+    return {
+        'timestamp': parts[0],
+        'event_type': parts[1],
+        'details': parts[2] if len(parts) > 2 else ''
+    }
+
 def read_events(limit=50):
     """Read recent events from log.
     Args:
         limit: Maximum number of events to return (default 50)
-    Returns: List of event dictionaries
+    Returns: List of event dictionaries, oldest first
+    """
+    return query(limit=limit)
+
+def query(event_type=None, since=None, limit=50, after=None):
+    """Events matching event_type and/or timestamp >= since.
+    The indexes pick the candidate slots, so only returned records are read.
+    Args:
+        event_type: one of the EVENT_* constants, or None for all
+        since: ISO timestamp or prefix (e.g. '2025-11-10'), or None
+        limit: Maximum number of events to return
+        after: sequence number; only newer events are returned, oldest
+            first, so the last one's seq is the cursor for the next call
+    Returns: List of event dictionaries (with 'seq'), oldest first
     """
     try:
-        entries = []
-        with open(LOG_FILE, 'r') as f:
-            lines = f.readlines()
-        
-        # Get last 'limit' entries
-        lines = lines[-limit:] if len(lines) > limit else lines
-        
-        # Parse entries
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            parts = line.split(',', 2)  # Split on first 2 commas only
-            if len(parts) >= 2:
-                entries.append({
-                    'timestamp': parts[0],
-                    'event_type': parts[1],
-                    'details': parts[2] if len(parts) > 2 else ''
-                })
-        
+        f = _open()
+        try:
+            oldest = _oldest()
+            first_seq = _next_seq - _count
+            if event_type is None:
+                slots = None
+            elif limit <= INDEX_PER_TYPE and after is None:
+                slots = _by_type.get(event_type, [])
+            else:
+                # Older than the index reaches: use the per-slot type codes
+                code = _type_codes.get(event_type)
+                slots = [(oldest + i) % MAX_ENTRIES for i in range(_count)
+                         if _slot_type[(oldest + i) % MAX_ENTRIES] == code] if code is not None else []
+
+            # Position (0 = oldest) of the first record that can match
+            start = 0
+            if since:
+                hour = since[:13]
+                start = _count
+                for bucket in _buckets:
+                    if bucket[0] >= hour:
+                        start = (bucket[1] - oldest) % MAX_ENTRIES
+                        break
+            # A cursor from before the log was recreated matches everything
+            if after is not None and after < _next_seq:
+                start = max(start, after + 1 - first_seq)
+
+            if slots is None:
+                if after is None:
+                    n = max(0, min(limit, _count - start))
+                    first = _head - n
+                else:
+                    n = max(0, _count - start)
+                    first = oldest + start
+                slots = [(first + i) % MAX_ENTRIES for i in range(n)]
+            else:
+                slots = [slot for slot in slots if (slot - oldest) % MAX_ENTRIES >= start]
+                if after is None:
+                    slots = slots[-limit:] if limit > 0 else []
+
+            entries = []
+            for slot in slots:
+                # With a cursor, stop at limit so no newer event is skipped
+                if len(entries) >= limit:
+                    break
+                f.seek(HEADER_SIZE + slot * RECORD_SIZE)
+                event = _parse(f.read(RECORD_SIZE))
+                if event is None or (since and event['timestamp'] < since):
+                    continue
+                event['seq'] = first_seq + (slot - oldest) % MAX_ENTRIES
+                entries.append(event)
+        finally:
+            f.close()
         return entries
-        
-    except:
+
+    except Exception as e:
+        print("Failed to read events: {}".format(e))
         return []
 
+def latest_seq():
+    """Sequence number of the newest event (0 if none were ever logged)."""
+    try:
+        _open().close()
+        return _next_seq - 1
+    except:
+        return 0
+
 def clear_events():
     """Clear all events from log file."""
+    global _head, _count
     try:
-        with open(LOG_FILE, 'w') as f:
-            f.write('')
+        f = _open()
+        try:
+            _head, _count = 0, 0
+            _write_header(f)
+            _reset_index()
+        finally:
+            f.close()
         return True
     except:
         return False
@@ -109,8 +330,8 @@ def clear_events():
 def get_event_count():
     """Get total number of events in log."""
     try:
-        with open(LOG_FILE, 'r') as f:
-            return len([line for line in f.readlines() if line.strip()])
+        _open().close()
+        return _count
     except:
         return 0
 
@@ -120,6 +341,4 @@ def get_recent_errors(limit=10):
         limit: Maximum number of errors to return
     Returns: List of error event dictionaries
     """
-    all_events = read_events(limit=MAX_ENTRIES)
-    errors = [e for e in all_events if e['event_type'] == EVENT_ERROR]
-    return errors[-limit:] if len(errors) > limit else errors
+    return query(EVENT_ERROR, limit=limit)
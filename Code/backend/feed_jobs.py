@@ -0,0 +1,211 @@
+# Feed job queue
+# Manual and scheduled feeds are queued here and run one at a time by a single
+# background task that owns the servo, so HTTP handlers return immediately and
+# two feeds can never drive the actuator at once. Without an event loop
+# (blocking server mode, or no asyncio) a job runs before submit() returns.
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    try:
+        import asyncio
+    except ImportError:
+        asyncio = None
+try:
+    import utime as time
+except ImportError:
+    import time
+import ticks
+
+try:
+    import config
+    COALESCE_MS = (config.FEED_COALESCE_SECONDS if hasattr(config, 'FEED_COALESCE_SECONDS') else 10) * 1000
+    MAX_JOBS = config.FEED_JOB_HISTORY if hasattr(config, 'FEED_JOB_HISTORY') else 5
+except ImportError:
+    COALESCE_MS = 10000
+    MAX_JOBS = 5
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Job sources
+SOURCE_MANUAL = 'manual'
+SOURCE_SCHEDULED = 'scheduled'
+SOURCE_UNSCHEDULED = 'unscheduled'
+
+class FeedJob:
+    def __init__(self, job_id, source):
+        self.id = job_id
+        self.source = source
+        self.status = QUEUED
+        self.created = ticks.ticks_ms()
+        self.quantity = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'source': self.source,
+            'status': self.status,
+            'quantity': self.quantity,
+            'error': self.error,
+            'age_ms': ticks.ticks_diff(ticks.ticks_ms(), self.created)
+        }
+
+_jobs = []          # Recent jobs, oldest first, at most MAX_JOBS
+_queue = []         # Jobs waiting for the actuator
+_next_id = 1
+_wake = None
+_worker = None
+_blocking = False
+
+def submit(source):
+    """Queue a feed from source.
+    A request from the same source within COALESCE_MS of a job that is still
+    pending or succeeded is folded into that job instead of feeding twice.
+    Returns: (job, created) where created is False for a coalesced request.
+    """
+    global _next_id
+    now = ticks.ticks_ms()
+    for job in _jobs:
+        if (job.source == source and job.status != FAILED
+                and ticks.ticks_diff(now, job.created) < COALESCE_MS):
+            return job, False
+
+    job = FeedJob(_next_id, source)
+    _next_id += 1
+    if not _start_worker():
+        _record(job)
+        _run_job(job)
+        return job, True
+    _record(job)
+    _queue.append(job)
+    _wake.set()
+    return job, True
+
+def set_blocking(blocking=True):
+    """Run every job inside submit() (blocking server mode, where no event
+    loop ever runs the worker task).
+    """
+    global _blocking
+    _blocking = blocking
+
+def _record(job):
+    _jobs.append(job)
+    # Drop the oldest finished job once the history is full
+    if len(_jobs) > MAX_JOBS:
+        for old in _jobs:
+            if old.status in (DONE, FAILED):
+                _jobs.remove(old)
+                break
+
+def get(job_id):
+    for job in _jobs:
+        if job.id == job_id:
+            return job
+    return None
+
+def jobs():
+    return _jobs
+
+def _start_worker():
+    """Create the worker task on first use, from inside the running event loop.
+    Returns: False if there is no event loop to run it.
+    """
+    global _wake, _worker
+    if _worker is not None:
+        return True
+    if _blocking or asyncio is None:
+        return False
+    coro = _run_worker()
+    try:
+        _wake = asyncio.Event()
+        _worker = asyncio.create_task(coro)
+    except RuntimeError:
+        coro.close()
+        _wake = None
+        return False
+    return True
+
+def _job_failed(job, e):
+    print('Feed job {} error: {}'.format(job.id, e))
+    job.status = FAILED
+    job.error = str(e)
+    try:
+        import event_log_service
+        event_log_service.log_event(event_log_service.EVENT_ERROR, 'Feed job: {}'.format(job.error))
+    except:
+        pass
+
+def _run_job(job):
+    """Run job to completion without the worker, blocking the caller."""
+    import calibration_service
+    job.status = RUNNING
+    try:
+        _log_feed(job)
+        _complete(job, calibration_service.disburseFood())
+    except Exception as e:
+        _job_failed(job, e)
+
+async def _run_worker():
+    while True:
+        if not _queue:
+            _wake.clear()
+            await _wake.wait()
+            continue
+        job = _queue.pop(0)
+        job.status = RUNNING
+        try:
+            await _feed(job)
+        except Exception as e:
+            _job_failed(job, e)
+
+async def _feed(job):
+    """Dispense once and update quantity, last fed time and notification."""
+    import calibration_service
+    _log_feed(job)
+    _complete(job, await calibration_service.disburseFoodAsync())
+
+def _log_feed(job):
+    import event_log_service
+    if job.source == SOURCE_MANUAL:
+        event_log_service.log_event(event_log_service.EVENT_FEED_MANUAL, 'Manual feed via web interface')
+    elif job.source == SOURCE_SCHEDULED:
+        event_log_service.log_event(event_log_service.EVENT_FEED_SCHEDULED, 'Scheduled feeding')
+    else:
+        event_log_service.log_event(event_log_service.EVENT_FEED_IMMEDIATE, 'No schedule found')
+
+def _complete(job, dispensed):
+    """Update quantity, last fed time and the job after the servo ran."""
+    import quantity_service
+    import last_fed_service
+    import lib.notification
+    import gc_policy
+
+    if not dispensed:
+        job.status = FAILED
+        job.error = 'Failed to dispense food'
+        return
+
+    quantity = quantity_service.read_quantity()
+    if quantity > 0:
+        quantity -= 1
+    quantity_service.write_quantity(quantity)
+    last_fed_service.write_last_fed_now()
+    job.quantity = quantity
+    job.status = DONE
+    if job.source == SOURCE_MANUAL:
+        # Let the scheduler re-check its deadline after an out-of-schedule feed
+        import scheduler_service
+        scheduler_service.wake()
+    gc_policy.maybe_collect('feed_jobs._feed')
+
+    now = time.localtime()
+    msg = "Food disbursed at {:02d}:{:02d}:{:02d}. Feed remaining: {}".format(now[3], now[4], now[5], quantity)
+    try:
+        lib.notification.send_ntfy_notification(msg)
+    except Exception as e:
+        print('Could not send notification: {}'.format(e))
@@ -0,0 +1,111 @@
+# Central garbage collection policy
+# Call sites ask maybe_collect('reason') instead of running gc.collect()
+# directly; a full collection only happens when free heap has dropped below
+# a low watermark. gc.threshold() lets the allocator collect on its own after
+# a fixed amount of allocation, and MicroPython always collects before
+# raising MemoryError, so skipped collections never cause an out-of-memory.
+
+import gc
+import ticks
+
+try:
+    import config
+    THRESHOLD_PERCENT = config.GC_THRESHOLD_PERCENT if hasattr(config, 'GC_THRESHOLD_PERCENT') else 25
+    LOW_WATER_PERCENT = config.GC_LOW_WATER_PERCENT if hasattr(config, 'GC_LOW_WATER_PERCENT') else 20
+    ALWAYS_COLLECT = config.GC_ALWAYS_COLLECT if hasattr(config, 'GC_ALWAYS_COLLECT') else False
+except ImportError:
+    THRESHOLD_PERCENT = 25
+    LOW_WATER_PERCENT = 20
+    ALWAYS_COLLECT = False
+
+# gc.mem_free/mem_alloc/threshold are MicroPython-only
+_has_mem = hasattr(gc, 'mem_free')
+
+heap_size = 0
+low_water = 0
+
+# Statistics
+calls = 0
+collections = 0
+collect_ms = 0
+sites = {}            # reason -> [calls, collections]
+requests = 0
+request_ms = 0
+request_collections = 0
+_request_start = 0
+_request_mark = 0
+
+def mem_free():
+    return gc.mem_free() if _has_mem else 0
+
+def init():
+    """Measure the heap and set the allocation threshold and low watermark."""
+    global heap_size, low_water
+    if not _has_mem:
+        return
+    heap_size = gc.mem_free() + gc.mem_alloc()
+    low_water = heap_size * LOW_WATER_PERCENT // 100
+    if hasattr(gc, 'threshold'):
+        gc.threshold(heap_size * THRESHOLD_PERCENT // 100)
+
+def collect(reason):
+    """Run a full collection now and account it to reason."""
+    global collections, collect_ms
+    start = ticks.ticks_ms()
+    gc.collect()
+    collect_ms += ticks.ticks_diff(ticks.ticks_ms(), start)
+    collections += 1
+    site = sites.get(reason)
+    if site is None:
+        site = sites[reason] = [0, 0]
+    site[1] += 1
+
+def maybe_collect(reason):
+    """Collect only if free heap is below the low watermark.
+    Returns: True if a collection ran.
+    """
+    global calls
+    calls += 1
+    site = sites.get(reason)
+    if site is None:
+        site = sites[reason] = [0, 0]
+    site[0] += 1
+    if ALWAYS_COLLECT or (_has_mem and gc.mem_free() < low_water):
+        collect(reason)
+        return True
+    return False
+
+def begin_request():
+    global _request_start, _request_mark
+    _request_start = ticks.ticks_ms()
+    _request_mark = collections
+
+def end_request():
+    global requests, request_ms, request_collections
+    requests += 1
+    request_ms += ticks.ticks_diff(ticks.ticks_ms(), _request_start)
+    request_collections += collections - _request_mark
+
+def stats():
+    """Counters for /api/system/gc."""
+    return {
+        'mode': 'always' if ALWAYS_COLLECT else 'watermark',
+        'heap': heap_size,
+        'free': mem_free(),
+        'low_water': low_water,
+        'calls': calls,
+        'collections': collections,
+        'collect_ms': collect_ms,
+        'requests': requests,
+        'collections_per_request': request_collections / requests if requests else 0,
+        'ms_per_request': request_ms / requests if requests else 0,
+        'sites': dict((reason, {'calls': s[0], 'collections': s[1]}) for reason, s in sites.items())
+    }
+
+def reset_stats():
+    global calls, collections, collect_ms, requests, request_ms, request_collections
+    calls = collections = collect_ms = 0
+    requests = request_ms = request_collections = 0
+    sites.clear()
+
+init()
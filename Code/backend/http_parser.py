@@ -0,0 +1,136 @@
+# Incremental HTTP request parser over pooled, preallocated receive buffers
+# The socket reads straight into a bytearray through memoryview slices, the
+# request line and headers are decoded once, and the body is handed to the
+# handler as a memoryview slice of the same buffer.
+
+from http_utils import Request, parse_query
+
+try:
+    import config
+    BUFFER_COUNT = config.HTTP_BUFFER_COUNT if hasattr(config, 'HTTP_BUFFER_COUNT') else 2
+    BUFFER_SIZE = config.HTTP_BUFFER_SIZE if hasattr(config, 'HTTP_BUFFER_SIZE') else 1536
+except ImportError:
+    BUFFER_COUNT = 2
+    BUFFER_SIZE = 1536
+
+# Parser states
+NEED_DATA = 0
+COMPLETE = 1
+TOO_LARGE = 2
+BAD_REQUEST = 3
+
+class BufferPool:
+    """Fixed set of receive buffers allocated once at import time."""
+
+    def __init__(self, count=BUFFER_COUNT, size=BUFFER_SIZE):
+        self.size = size
+        self.free = [bytearray(size) for _ in range(count)]
+
+    def acquire(self):
+        """Return a free buffer, or None when every buffer is in use."""
+        if self.free:
+            return self.free.pop()
+        return None
+
+    def release(self, buf):
+        self.free.append(buf)
+
+pool = BufferPool()
+
+class RequestParser:
+    """Parse one request at a time from a reusable buffer.
+
+    Usage:
+        space = parser.space()          # memoryview to readinto()
+        state = parser.feed(nbytes)     # NEED_DATA / COMPLETE / TOO_LARGE / BAD_REQUEST
+        req = parser.request            # once COMPLETE
+        parser.reset()                  # keep pipelined bytes, start next request
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.mv = memoryview(buf)
+        self.length = 0
+        self.reset()
+
+    def reset(self):
+        """Prepare for the next request, moving any bytes past the current one to the front."""
+        end = getattr(self, 'body_end', 0)
+        if 0 < end < self.length:
+            rest = self.length - end
+            # Copy out first: source and destination may overlap
+            self.mv[:rest] = bytes(self.mv[end:self.length])
+            self.length = rest
+        else:
+            self.length = 0
+        self.header_end = -1
+        self.body_end = 0
+        self.request = None
+
+    def space(self):
+        """Free part of the buffer, for sock.readinto()."""
+        return self.mv[self.length:]
+
+    def feed(self, nbytes):
+        """Account for nbytes just written into space() and advance the parse."""
+        scan_from = max(0, self.length - 3)
+        self.length += nbytes
+        return self._parse(scan_from)
+
+    def pending(self):
+        """Parse bytes already in the buffer (pipelined requests) without reading."""
+        if self.length == 0:
+            return NEED_DATA
+        return self._parse(0)
+
+    def _parse(self, scan_from):
+        if self.header_end == -1:
+            # Only the newly received bytes (plus 3 for a split CRLFCRLF) are searched
+            found = bytes(self.mv[scan_from:self.length]).find(b'\r\n\r\n')
+            if found == -1:
+                return TOO_LARGE if self.length >= len(self.buf) else NEED_DATA
+            self.header_end = scan_from + found
+            if not self._parse_head():
+                return BAD_REQUEST
+            if self.body_end > len(self.buf):
+                return TOO_LARGE
+        if self.length < self.body_end:
+            return NEED_DATA
+        self.request.body = self.mv[self.header_end + 4:self.body_end]
+        return COMPLETE
+
+    def _parse_head(self):
+        """Decode the request line and headers exactly once."""
+        try:
+            lines = bytes(self.mv[:self.header_end]).decode().split('\r\n')
+        except UnicodeError:
+            return False
+        parts = lines[0].split()
+        if len(parts) < 2 or len(parts) > 3:
+            return False
+
+        method, target = parts[0], parts[1]
+        query = None
+        if '?' in target:
+            target, query_str = target.split('?', 1)
+            query = parse_query(query_str)
+
+        headers = {}
+        for line in lines[1:]:
+            colon = line.find(':')
+            if colon > 0:
+                headers[line[:colon].strip().lower()] = line[colon + 1:].strip()
+
+        content_length = 0
+        if 'content-length' in headers:
+            try:
+                content_length = int(headers['content-length'])
+            except ValueError:
+                return False
+            if content_length < 0:
+                return False
+
+        self.body_end = self.header_end + 4 + content_length
+        version = parts[2] if len(parts) > 2 else 'HTTP/1.0'
+        self.request = Request(method, target, query, headers=headers, version=version)
+        return True
@@ -0,0 +1,261 @@
+# HTTP helpers shared by the API server and endpoint handlers
+try:
+    import uselect as select
+except ImportError:
+    import select
+import gc_policy
+from json_utils import iter_json
+
+try:
+    import config
+    SEND_CHUNK = config.HTTP_SEND_CHUNK if hasattr(config, 'HTTP_SEND_CHUNK') else 1460
+    SEND_BUFFERS = config.HTTP_BUFFER_COUNT if hasattr(config, 'HTTP_BUFFER_COUNT') else 2
+except ImportError:
+    SEND_CHUNK = 1460
+    SEND_BUFFERS = 2
+
+# Longest wait for a full socket send buffer to drain (the client socket timeout)
+SEND_TIMEOUT_MS = 5000
+
+# Send buffers allocated once, one per concurrent request (like the receive
+# buffers in http_parser). In stream mode a response body is written after
+# its handler returns, one chunk per drain, so bodies of different
+# connections can be in flight at the same time and each needs its own buffer.
+_send_pool = [bytearray(SEND_CHUNK) for _ in range(SEND_BUFFERS)]
+
+def _acquire_send_buf():
+    if _send_pool:
+        return _send_pool.pop()
+    # More bodies in flight than expected: a temporary buffer, collected afterwards
+    return bytearray(SEND_CHUNK)
+
+def _release_send_buf(buf):
+    if len(_send_pool) < SEND_BUFFERS:
+        _send_pool.append(buf)
+
+def connection_header(conn):
+    """Connection header line; only stream-mode connections may stay open."""
+    if getattr(conn, 'keep_alive', False):
+        return 'Connection: keep-alive\r\n'
+    return 'Connection: close\r\n'
+
+def send_response(conn, status, content_type, body, headers=''):
+    """Send a complete response; headers holds extra CRLF-terminated header lines."""
+    gc_policy.maybe_collect('http_utils.send_response')
+    if isinstance(body, str):
+        body = body.encode()
+    response = 'HTTP/1.1 {}\r\n'.format(status)
+    response += 'Content-Type: {}\r\n'.format(content_type)
+    response += 'Access-Control-Allow-Origin: *\r\n'
+    response += 'Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS\r\n'
+    response += 'Access-Control-Allow-Headers: Content-Type, If-None-Match\r\n'
+    response += headers
+    response += connection_header(conn)
+    response += 'Content-Length: {}\r\n'.format(len(body))
+    response += '\r\n'
+    conn.send(response.encode())
+    conn.send(body)
+    gc_policy.maybe_collect('http_utils.send_response')
+
+def send_not_modified(conn, headers=''):
+    """304 with no body; headers should repeat the ETag."""
+    response = 'HTTP/1.1 304 Not Modified\r\n'
+    response += 'Access-Control-Allow-Origin: *\r\n'
+    response += headers
+    response += connection_header(conn)
+    response += '\r\n'
+    conn.send(response.encode())
+
+def _wait_writable(conn):
+    """Sleep in poll() until conn can take more data, rather than spinning on send().
+    Raises OSError if it stays full for SEND_TIMEOUT_MS.
+    """
+    poller = select.poll()
+    poller.register(conn, select.POLLOUT)
+    if not poller.poll(SEND_TIMEOUT_MS):
+        raise OSError('send timed out')
+
+def send_all(conn, data):
+    """Write all of data, retrying short writes."""
+    sent = 0
+    total = len(data)
+    while sent < total:
+        n = conn.send(data[sent:])
+        if n is None:
+            # Non-blocking socket with a full send buffer
+            _wait_writable(conn)
+            continue
+        sent += n
+    return sent
+
+def send_chunks(conn, chunks):
+    """Send the rest of a response from a generator of chunks.
+    Each chunk may be a view of a reused buffer, so it must be sent before the
+    next one is produced. Stream-mode connections (api.StreamConnection) keep
+    the generator as the response body and write it after the handler
+    returns, draining after every chunk; sockets get it sent right away.
+    Returns: bytes sent, or None when the body was handed to the connection.
+    """
+    if hasattr(conn, 'write_body'):
+        conn.body = chunks
+        return None
+    total = 0
+    try:
+        for chunk in chunks:
+            total += send_all(conn, chunk)
+    finally:
+        chunks.close()
+    return total
+
+def file_chunks(path):
+    """Read a file through a pooled send buffer, one buffer-full per chunk.
+    readinto() fills the same bytearray every time, so the loop allocates
+    nothing and never needs a garbage collection. The file is opened on the
+    first chunk and closed, and the buffer returned, when the generator ends
+    or is closed.
+    """
+    buf = _acquire_send_buf()
+    try:
+        mv = memoryview(buf)
+        with open(path, 'rb') as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                yield mv[:n]
+    finally:
+        _release_send_buf(buf)
+
+def send_file(conn, path):
+    """Send a file as the response body (see send_chunks)."""
+    return send_chunks(conn, file_chunks(path))
+
+def chunk_pieces(pieces, chunked=True):
+    """Pack str/bytes pieces into a pooled send buffer, one full buffer per chunk.
+    With chunked=True each chunk is framed for HTTP/1.1 chunked transfer
+    encoding, the size line written into space reserved at the front of the
+    buffer and the CRLF after the data, and the terminating chunk follows the
+    last one. With chunked=False the bytes are unframed (HTTP/1.0, where
+    closing the connection ends the body).
+    """
+    buf = _acquire_send_buf()
+    try:
+        mv = memoryview(buf)
+        if chunked:
+            digits = len('%x' % len(buf))
+            size_format = '%0' + str(digits) + 'x\r\n'
+            start = digits + 2
+            end = len(buf) - 2
+        else:
+            start = 0
+            end = len(buf)
+        pos = start
+        for data in pieces:
+            if isinstance(data, str):
+                data = data.encode()
+            n = len(data)
+            if n <= end - pos:
+                mv[pos:pos + n] = data
+                pos += n
+                continue
+            data = memoryview(data)
+            off = 0
+            while off < n:
+                if pos == end:
+                    yield _frame(mv, pos, start, size_format if chunked else None)
+                    pos = start
+                take = min(end - pos, n - off)
+                mv[pos:pos + take] = data[off:off + take]
+                pos += take
+                off += take
+        if pos > start:
+            yield _frame(mv, pos, start, size_format if chunked else None)
+        if chunked:
+            yield b'0\r\n\r\n'
+    finally:
+        _release_send_buf(buf)
+
+def _frame(mv, pos, start, size_format):
+    """The filled part of the buffer, with chunk framing when size_format is set."""
+    if size_format is None:
+        return mv[:pos]
+    mv[:start] = (size_format % (pos - start)).encode()
+    mv[pos:pos + 2] = b'\r\n'
+    return mv[:pos + 2]
+
+def send_json(conn, req, status, obj):
+    """Stream obj as JSON straight into the connection.
+    Nothing is encoded up front: HTTP/1.1 clients get chunked transfer
+    encoding, HTTP/1.0 clients get a body delimited by closing the connection.
+    The body is sent through send_chunks, so in stream mode it is encoded
+    and written one buffer at a time after the handler returns.
+    """
+    chunked = req.version == 'HTTP/1.1'
+    if not chunked:
+        conn.keep_alive = False
+    response = 'HTTP/1.1 {}\r\n'.format(status)
+    response += 'Content-Type: application/json\r\n'
+    response += 'Access-Control-Allow-Origin: *\r\n'
+    response += 'Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS\r\n'
+    response += 'Access-Control-Allow-Headers: Content-Type, If-None-Match\r\n'
+    response += connection_header(conn)
+    if chunked:
+        response += 'Transfer-Encoding: chunked\r\n'
+    response += '\r\n'
+    conn.send(response.encode())
+    del response
+    send_chunks(conn, chunk_pieces(iter_json(obj), chunked))
+
+def unquote(s):
+    """Decode %XX escapes and '+' in a query string component."""
+    s = s.replace('+', ' ')
+    if '%' not in s:
+        return s
+    parts = s.split('%')
+    out = [parts[0]]
+    for part in parts[1:]:
+        try:
+            out.append(chr(int(part[:2], 16)) + part[2:])
+        except ValueError:
+            out.append('%' + part)
+    return ''.join(out)
+
+def parse_query(query):
+    """Parse 'a=1&b=2' into a dict of decoded strings."""
+    params = {}
+    if not query:
+        return params
+    for pair in query.split('&'):
+        if not pair:
+            continue
+        if '=' in pair:
+            k, v = pair.split('=', 1)
+        else:
+            k, v = pair, ''
+        params[unquote(k)] = unquote(v)
+    return params
+
+class Request:
+    """Parsed HTTP request passed to route handlers.
+    headers has lower-case keys; body is a memoryview into the receive buffer
+    and is only valid until the handler returns.
+    """
+
+    def __init__(self, method, path, query=None, headers=None, body=b'', version='HTTP/1.0'):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.query = query or {}
+        self.headers = headers or {}
+        self.body = body
+        self.data = {}
+
+    def header(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def wants_keep_alive(self):
+        """HTTP/1.1 defaults to persistent connections, HTTP/1.0 must ask."""
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
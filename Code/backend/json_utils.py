@@ -0,0 +1,101 @@
+# JSON helpers shared by the API server and endpoint handlers
+
+try:
+    import ujson as _json
+except ImportError:
+    try:
+        import json as _json
+    except ImportError:
+        _json = None
+
+# Manual JSON encoding
+def json_encode(obj):
+    if obj is None:
+        return 'null'
+    elif isinstance(obj, bool):
+        return 'true' if obj else 'false'
+    elif isinstance(obj, (int, float)):
+        return str(obj)
+    elif isinstance(obj, str):
+        escaped = obj.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+        return '"{}"'.format(escaped)
+    elif isinstance(obj, dict):
+        items = []
+        for k, v in obj.items():
+            items.append('"{}": {}'.format(k, json_encode(v)))
+        return '{' + ', '.join(items) + '}'
+    elif isinstance(obj, list):
+        items = [json_encode(item) for item in obj]
+        return '[' + ', '.join(items) + ']'
+    return 'null'
+
+# Encoder for the pieces iter_json yields: ujson/json in C when available
+_encode = _json.dumps if _json is not None and hasattr(_json, 'dumps') else json_encode
+
+def iter_json(obj):
+    """Yield obj as JSON text in pieces, for streaming a response.
+    Dicts are walked key by key and lists element by element; each list
+    element is encoded in one go, so no piece is bigger than one element
+    (one event, say) and the whole document never exists as a single string.
+    """
+    if isinstance(obj, dict):
+        yield '{'
+        first = True
+        for k, v in obj.items():
+            yield ('' if first else ', ') + json_encode(str(k)) + ': '
+            first = False
+            if isinstance(v, (dict, list, tuple)):
+                yield from iter_json(v)
+            else:
+                yield _encode(v)
+        yield '}'
+    elif isinstance(obj, (list, tuple)):
+        yield '['
+        first = True
+        for item in obj:
+            if not first:
+                yield ', '
+            first = False
+            yield _encode(item)
+        yield ']'
+    else:
+        yield _encode(obj)
+
+def parse_simple_json(s):
+    """Improved JSON parser for nested structures"""
+    s = s.strip()
+    if not s:
+        return {}
+    
+    # Try to use ujson if available (MicroPython)
+    try:
+        import ujson
+        return ujson.loads(s)
+    except:
+        pass
+    
+    # Try standard json (Python)
+    try:
+        import json
+        return json.loads(s)
+    except:
+        pass
+    
+    # Fallback: basic parser for simple key:value pairs only
+    if s.startswith('{') and s.endswith('}'):
+        result = {}
+        content = s[1:-1].strip()
+        if content:
+            pairs = content.split(',')
+            for pair in pairs:
+                if ':' in pair:
+                    k, v = pair.split(':', 1)
+                    k = k.strip().strip('"')
+                    v = v.strip().strip('"')
+                    try:
+                        v = int(v)
+                    except:
+                        pass
+                    result[k] = v
+        return result
+    return {}
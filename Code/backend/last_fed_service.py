@@ -1,13 +1,9 @@
+# Last fed time, served from the in-memory state store
 import utime as time
-
-data_file = 'data/last_fed.txt'
+import state
 
 def read_last_fed():
-    try:
-        with open(data_file, 'r') as f:
-            return f.read().strip()
-    except:
-        return None
+    return state.get('last_fed')
 
 def write_last_fed_now():
     try:
@@ -15,8 +11,7 @@ def write_last_fed_now():
         iso_str = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(
             now[0], now[1], now[2], now[3], now[4], now[5]
         )
-        with open(data_file, 'w') as f:
-            f.write(iso_str)
+        state.set('last_fed', iso_str)
         return True
     except:
         return False
@@ -27,9 +22,5 @@ def write_last_fed(iso_time):
         iso_time: ISO format timestamp string (YYYY-MM-DDTHH:MM:SS)
     Returns: True if successful, False otherwise
     """
-    try:
-        with open(data_file, 'w') as f:
-            f.write(iso_time)
-        return True
-    except:
-        return False
+    state.set('last_fed', iso_time)
+    return True
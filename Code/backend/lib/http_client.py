@@ -0,0 +1,281 @@
+# Minimal HTTP/1.1 client for ntfy pushes
+# Keeps one keep-alive connection per client, closes it after an idle
+# timeout, and caches DNS lookups so a push on a warm connection costs one
+# write and one response read. post() runs in the event loop; callers without
+# one (blocking server mode, the battery build) use post_blocking(), which
+# keeps its own blocking socket open the same way.
+
+import socket
+try:
+    import uasyncio as asyncio
+except ImportError:
+    try:
+        import asyncio
+    except ImportError:
+        asyncio = None
+import ticks
+
+try:
+    import config
+    DNS_TTL_MS = (config.NTFY_DNS_TTL_S if hasattr(config, 'NTFY_DNS_TTL_S') else 3600) * 1000
+    IDLE_MS = config.NTFY_IDLE_MS if hasattr(config, 'NTFY_IDLE_MS') else 30000
+    TIMEOUT_MS = config.NOTIFY_TIMEOUT_MS if hasattr(config, 'NOTIFY_TIMEOUT_MS') else 10000
+except ImportError:
+    DNS_TTL_MS = 3600000
+    IDLE_MS = 30000
+    TIMEOUT_MS = 10000
+
+# host -> (ip, expiry ticks)
+_dns = {}
+
+def resolve(host, port):
+    """Return the IP address for host, looking it up at most once per DNS_TTL_MS."""
+    entry = _dns.get(host)
+    now = ticks.ticks_ms()
+    if entry is not None and ticks.ticks_diff(entry[1], now) > 0:
+        return entry[0]
+    addr = socket.getaddrinfo(host, port)[0][-1]
+    ip = addr[0] if isinstance(addr, tuple) else host
+    _dns[host] = (ip, ticks.ticks_add(now, DNS_TTL_MS))
+    return ip
+
+def split_url(url):
+    """Return (host, port, path, use_ssl) for an http(s) URL."""
+    use_ssl = url.startswith('https://')
+    rest = url.split('://', 1)[1]
+    slash = rest.find('/')
+    host, path = (rest, '/') if slash == -1 else (rest[:slash], rest[slash:])
+    port = 443 if use_ssl else 80
+    if ':' in host:
+        host, port = host.split(':', 1)
+        port = int(port)
+    return host, port, path, use_ssl
+
+def _fold_header(line, info):
+    """Apply one response header line to info = [length, chunked, keep]."""
+    name, _, value = line.decode().partition(':')
+    name = name.strip().lower()
+    value = value.strip().lower()
+    if name == 'content-length':
+        info[0] = int(value)
+    elif name == 'transfer-encoding':
+        info[1] = value == 'chunked'
+    elif name == 'connection':
+        info[2] = value == 'keep-alive' or (info[2] and value != 'close')
+
+class KeepAliveClient:
+    """POST to one URL over a reused connection.
+
+    headers are encoded once into the request head; each post() only adds
+    Content-Length and the body.
+    """
+
+    def __init__(self, url, headers=None):
+        self.host, self.port, self.path, self.use_ssl = split_url(url)
+        head = 'POST {} HTTP/1.1\r\nHost: {}\r\n'.format(self.path, self.host)
+        for name, value in (headers or {}).items():
+            head += '{}: {}\r\n'.format(name, value)
+        self.head = (head + 'Content-Length: ').encode()
+        self.reader = None
+        self.writer = None
+        # Blocking socket and its read stream (post_blocking)
+        self.sock = None
+        self.stream = None
+        self.last_used = 0
+        self.connects = 0
+
+    async def _connect(self):
+        if self.use_ssl:
+            # TLS needs the hostname for SNI, so the DNS cache can't be used
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=True)
+        else:
+            ip = resolve(self.host, self.port)
+            self.reader, self.writer = await asyncio.open_connection(ip, self.port)
+        self.connects += 1
+
+    async def close(self):
+        if self.writer is not None:
+            writer = self.writer
+            self.reader = self.writer = None
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def idle_ms(self):
+        """Milliseconds until an open connection counts as idle."""
+        return max(0, IDLE_MS - ticks.ticks_diff(ticks.ticks_ms(), self.last_used))
+
+    def idle(self):
+        """True if a connection is open but has not been used for IDLE_MS."""
+        is_open = self.writer is not None or self.sock is not None
+        return is_open and ticks.ticks_diff(ticks.ticks_ms(), self.last_used) >= IDLE_MS
+
+    async def post(self, body):
+        """Send body and read the whole response.
+        A request on a reused connection that the server has already closed is
+        retried once on a fresh connection.
+        Returns: HTTP status code.
+        """
+        if isinstance(body, str):
+            body = body.encode()
+        if self.idle():
+            await self.close()
+        for attempt in (0, 1):
+            reused = self.writer is not None
+            if not reused:
+                await self._connect()
+            try:
+                self.writer.write(self.head + str(len(body)).encode() + b'\r\n\r\n')
+                self.writer.write(body)
+                await self.writer.drain()
+                status = await asyncio.wait_for(self._read_response(), TIMEOUT_MS / 1000)
+                self.last_used = ticks.ticks_ms()
+                return status
+            except Exception:
+                await self.close()
+                if not reused or attempt:
+                    raise
+        return 0
+
+    async def _read_response(self):
+        line = await self.reader.readline()
+        if not line:
+            raise OSError('connection closed')
+        status = int(line.split()[1])
+        # HTTP/1.0 servers close unless they say otherwise
+        info = [None, False, line.startswith(b'HTTP/1.1')]
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise OSError('connection closed')
+            if line == b'\r\n':
+                break
+            _fold_header(line, info)
+        length, chunked, keep = info
+
+        # Discard the body so the next response starts at a clean boundary
+        if chunked:
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self._skip(size + 2)
+                if size == 0:
+                    break
+        elif length is not None:
+            await self._skip(length)
+        else:
+            keep = False
+        if not keep:
+            await self.close()
+        return status
+
+    async def _skip(self, n):
+        while n > 0:
+            data = await self.reader.read(min(n, 256))
+            if not data:
+                raise OSError('connection closed')
+            n -= len(data)
+
+    def _connect_blocking(self):
+        # The hostname still goes to TLS for SNI, so the DNS cache works here
+        addr = socket.getaddrinfo(resolve(self.host, self.port), self.port)[0][-1]
+        sock = socket.socket()
+        try:
+            sock.settimeout(TIMEOUT_MS / 1000)
+            sock.connect(addr)
+            if self.use_ssl:
+                try:
+                    import ssl
+                except ImportError:
+                    import ussl as ssl
+                if hasattr(ssl, 'create_default_context'):
+                    sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+                else:
+                    sock = ssl.wrap_socket(sock, server_hostname=self.host)
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+        # MicroPython sockets read lines themselves; CPython needs a file object
+        self.stream = sock.makefile('rb') if hasattr(sock, 'makefile') else sock
+        self.connects += 1
+
+    def close_blocking(self):
+        if self.sock is not None:
+            sock, stream = self.sock, self.stream
+            self.sock = self.stream = None
+            try:
+                if stream is not sock:
+                    stream.close()
+                sock.close()
+            except Exception:
+                pass
+
+    def post_blocking(self, body):
+        """post() without an event loop, over a blocking socket that stays
+        open for the next call until it has been idle for IDLE_MS.
+        Returns: HTTP status code.
+        """
+        if isinstance(body, str):
+            body = body.encode()
+        if self.idle():
+            self.close_blocking()
+        for attempt in (0, 1):
+            reused = self.sock is not None
+            if not reused:
+                self._connect_blocking()
+            try:
+                self._write_blocking(self.head + str(len(body)).encode() + b'\r\n\r\n')
+                self._write_blocking(body)
+                status = self._read_response_blocking()
+                self.last_used = ticks.ticks_ms()
+                return status
+            except Exception:
+                self.close_blocking()
+                if not reused or attempt:
+                    raise
+        return 0
+
+    def _write_blocking(self, data):
+        if hasattr(self.sock, 'sendall'):
+            self.sock.sendall(data)
+        else:
+            self.sock.write(data)
+
+    def _readline_blocking(self):
+        line = self.stream.readline()
+        if not line:
+            raise OSError('connection closed')
+        return line
+
+    def _read_response_blocking(self):
+        line = self._readline_blocking()
+        status = int(line.split()[1])
+        info = [None, False, line.startswith(b'HTTP/1.1')]
+        while True:
+            line = self._readline_blocking()
+            if line == b'\r\n':
+                break
+            _fold_header(line, info)
+        length, chunked, keep = info
+        if chunked:
+            while True:
+                size = int(self._readline_blocking().split(b';')[0], 16)
+                self._skip_blocking(size + 2)
+                if size == 0:
+                    break
+        elif length is not None:
+            self._skip_blocking(length)
+        else:
+            keep = False
+        if not keep:
+            self.close_blocking()
+        return status
+
+    def _skip_blocking(self, n):
+        while n > 0:
+            data = self.stream.read(min(n, 256))
+            if not data:
+                raise OSError('connection closed')
+            n -= len(data)
@@ -1,111 +1,339 @@
 # Notification handler using ntfy
+# send_ntfy_notification() queues messages in an outbox that a background task
+# drains: pushes are batched, retried with exponential backoff and saved to
+# flash while WiFi is down. Without a running event loop (blocking server
+# mode) messages are sent right away instead.
 
 # Default topic (will be overridden by config if available)
 ntfy_topic = 'FF0x98854'
 
-# MicroPython-compatible notification sender
-# Try urequests (MicroPython) first, fall back to requests (standard Python)
 try:
-    import urequests
+    import uasyncio as asyncio
 except ImportError:
     try:
-        import requests as urequests
+        import asyncio
     except ImportError:
-        urequests = None
+        asyncio = None
+try:
+    import config
+    BATCH_MS = config.NOTIFY_BATCH_MS if hasattr(config, 'NOTIFY_BATCH_MS') else 2000
+    RETRY_MIN_MS = config.NOTIFY_RETRY_MIN_MS if hasattr(config, 'NOTIFY_RETRY_MIN_MS') else 5000
+    RETRY_MAX_MS = config.NOTIFY_RETRY_MAX_MS if hasattr(config, 'NOTIFY_RETRY_MAX_MS') else 300000
+    QUEUE_SIZE = config.NOTIFY_QUEUE_SIZE if hasattr(config, 'NOTIFY_QUEUE_SIZE') else 10
+    TIMEOUT_MS = config.NOTIFY_TIMEOUT_MS if hasattr(config, 'NOTIFY_TIMEOUT_MS') else 10000
+    MAX_RETRIES = config.NOTIFY_MAX_RETRIES if hasattr(config, 'NOTIFY_MAX_RETRIES') else 8
+    SPILL_MAX = config.NOTIFY_SPILL_MAX if hasattr(config, 'NOTIFY_SPILL_MAX') else 50
+except ImportError:
+    BATCH_MS = 2000
+    RETRY_MIN_MS = 5000
+    RETRY_MAX_MS = 300000
+    QUEUE_SIZE = 10
+    TIMEOUT_MS = 10000
+    MAX_RETRIES = 8
+    SPILL_MAX = 50
+
+# Headers of every push, encoded once into the keep-alive client's request head
+HEADERS = {'Title': 'Auto Feeder', 'Priority': '3', 'Tags': 'fish,food'}
+
+# Messages that could not be sent while WiFi was down, one per line
+OUTBOX_FILE = 'data/outbox.txt'
+OFFLINE_POLL_MS = 30000
+
+# Outbox: send_ntfy_notification() only queues the message. A uasyncio task
+# posts it over a keep-alive connection (lib/http_client.py), so callers never
+# wait on DNS, connect or the server's reply.
+_queue = []
+_wake = None
+_worker = None
+_blocking = False
+stats = {'queued': 0, 'pushes': 0, 'failures': 0, 'spilled': 0, 'dropped': 0}
 
 def send_ntfy_notification(message):
-    if urequests is None:
-        print('urequests not available, skipping notification')
+    """Queue message for the ntfy topic and return immediately.
+    Messages posted within BATCH_MS of each other go out as one push.
+    Without an event loop to run the outbox the message is sent before
+    returning.
+    """
+    _queue.append(message.replace('\n', ' '))
+    stats['queued'] += 1
+    if len(_queue) > QUEUE_SIZE:
+        # Keep RAM bounded: older messages wait on flash
+        _spill(len(_queue) - QUEUE_SIZE)
+    if _blocking or not _start_outbox():
+        _flush_blocking()
         return
-    
-    # Free up memory before HTTPS request
+    _wake.set()
+
+def set_blocking(blocking=True):
+    """Send every message synchronously (blocking server mode, where no
+    event loop ever runs the outbox task).
+    """
+    global _blocking
+    _blocking = blocking
+
+def pending():
+    """Number of messages waiting in RAM."""
+    return len(_queue)
+
+def _start_outbox():
+    """Create the outbox task on first use.
+    Returns: False if there is no running event loop to create it on.
+    """
+    global _wake, _worker
+    if _worker is not None:
+        return True
+    if asyncio is None:
+        return False
+    coro = _run_outbox()
     try:
-        import gc
-        gc.collect()
-    except:
-        pass
-    
-    # Get topic from config at runtime (avoids circular import at module load)
+        _wake = asyncio.Event()
+        _worker = asyncio.create_task(coro)
+    except RuntimeError:
+        coro.close()
+        _wake = None
+        return False
+    return True
+
+def _url():
+    """Topic URL from config, defaulting to https://ntfy.sh."""
     topic = ntfy_topic
+    server_url = 'https://ntfy.sh'
     try:
         import config
-        if hasattr(config, 'NTFY_TOPIC'):
-            topic = config.NTFY_TOPIC
-    except:
-        pass  # Use default if config unavailable
-    
-    # Use HTTP if configured, else fallback to HTTPS
+        topic = getattr(config, 'NTFY_TOPIC', topic)
+        server_url = getattr(config, 'NTFY_SERVER', server_url)
+    except ImportError:
+        pass
+    if not (server_url.startswith('http://') or server_url.startswith('https://')):
+        server_url = 'https://ntfy.sh'
+    return server_url.rstrip('/') + '/' + topic
+
+def _online():
     try:
-        import config
-        server_url = getattr(config, 'NTFY_SERVER', 'https://ntfy.sh')
-        if server_url.startswith('http://') or server_url.startswith('https://'):
-            url = server_url.rstrip('/') + '/' + topic
+        import network
+        return network.WLAN(network.STA_IF).isconnected()
+    except ImportError:
+        return True
+
+def _read_spilled(limit=None):
+    """The oldest limit (default: all) messages in the outbox file."""
+    saved = []
+    try:
+        with open(OUTBOX_FILE, 'r') as f:
+            while limit is None or len(saved) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    saved.append(line.strip())
+    except OSError:
+        pass
+    return saved
+
+# Lines in the outbox file, counted on first use (None: not counted yet)
+_spilled = None
+
+def _spill_count():
+    global _spilled
+    if _spilled is None:
+        _spilled = len(_read_spilled())
+    return _spilled
+
+def _drop_spilled(count):
+    """Remove the oldest count messages from the outbox file."""
+    global _spilled
+    import os
+    kept = 0
+    tmp = OUTBOX_FILE + '.tmp'
+    try:
+        with open(OUTBOX_FILE, 'r') as src, open(tmp, 'w') as dst:
+            skipped = 0
+            while True:
+                line = src.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                if skipped < count:
+                    skipped += 1
+                    continue
+                dst.write(line)
+                kept += 1
+        os.remove(OUTBOX_FILE)
+        if kept:
+            os.rename(tmp, OUTBOX_FILE)
         else:
-            url = 'https://ntfy.sh/' + topic
-    except:
-        url = 'https://ntfy.sh/' + topic
-    headers = {'Title': 'Auto Feeder'}
+            os.remove(tmp)
+    except OSError as e:
+        print('Could not trim notification outbox:', e)
+        _spilled = None
+        return
+    _spilled = kept
+
+def _spill(count=None):
+    """Append the oldest count queued messages (default: all) to flash.
+    The file keeps the newest SPILL_MAX messages; it is only rewritten to
+    drop older ones once it is full.
+    """
+    global _spilled
+    if count is None:
+        count = len(_queue)
+    total = _spill_count() + count
+    try:
+        with open(OUTBOX_FILE, 'a') as f:
+            for message in _queue[:count]:
+                f.write(message + '\n')
+        stats['spilled'] += count
+        _spilled = total
+    except OSError as e:
+        print('Could not spill notifications, dropped {}: {}'.format(count, e))
+        stats['dropped'] += count
+        _spilled = None
+    del _queue[:count]
+    if _spilled is not None and _spilled > SPILL_MAX:
+        dropped = _spilled - SPILL_MAX
+        _drop_spilled(dropped)
+        stats['dropped'] += dropped
+        print('Outbox full, dropped {} notification(s)'.format(dropped))
+
+def _load_spilled():
+    """Move the oldest saved messages in front of the RAM queue, as many as
+    fit in QUEUE_SIZE; the rest stay on flash for the next batch.
+    """
+    room = QUEUE_SIZE - len(_queue)
+    if room <= 0 or not _has_spilled():
+        return False
+    saved = _read_spilled(room)
+    _drop_spilled(len(saved))
+    _queue[:0] = saved
+    return True
+
+def _has_spilled():
+    import os
     try:
-        import gc
-        gc.collect()
-        r = urequests.post(url, data=message, headers=headers)
-        r.close()
-        print('Notification sent:', message)
-    except Exception as e:
-        print('ntfy notification error:', e)
-        # Don't fail if notification fails
-    finally:
-        # Clean up after notification
+        os.stat(OUTBOX_FILE)
+        return True
+    except OSError:
+        return False
+
+_client = None
+
+def _get_client():
+    global _client
+    if _client is None:
+        from lib.http_client import KeepAliveClient
+        _client = KeepAliveClient(_url(), HEADERS)
+    return _client
+
+async def _post(body):
+    """POST body to the topic over the shared keep-alive connection.
+    Returns: HTTP status code.
+    """
+    return await _get_client().post(body)
+
+def _settle(count, status):
+    """Account for a push of the first count queued messages.
+    Returns: True if they are done with (sent, or rejected by the server).
+    """
+    if 200 <= status < 300:
+        print('Notification sent: {} message(s)'.format(count))
+        del _queue[:count]
+        stats['pushes'] += 1
+        return True
+    if 400 <= status < 500:
+        # The server refuses this request; sending it again won't change that
+        print('Notification rejected ({}), dropping {} message(s)'.format(status, count))
+        del _queue[:count]
+        stats['dropped'] += count
+        return True
+    stats['failures'] += 1
+    return False
+
+def _flush_blocking():
+    """Send the queue, and anything saved on flash, before returning.
+    Messages that can't be sent now are saved for the next call.
+    """
+    if not _online():
+        _spill()
+        return
+    # Saved messages come back QUEUE_SIZE at a time, one push each
+    while True:
+        _load_spilled()
+        if not _queue:
+            return
+        count = len(_queue)
         try:
-            import gc
-            gc.collect()
-        except:
-            pass
+            status = _get_client().post_blocking('\n'.join(_queue[:count]))
+        except Exception as e:
+            print('ntfy notification error:', e)
+            status = 0
+        if not _settle(count, status):
+            print('Notification failed, saving {} message(s) for the next send'.format(count))
+            _spill()
+            return
+
+async def _wait_for_work(timeout_ms):
+    """Wait until something is queued or timeout_ms (None: forever) passes."""
+    _wake.clear()
+    if timeout_ms is None:
+        await _wake.wait()
+        return
+    try:
+        await asyncio.wait_for(_wake.wait(), timeout_ms / 1000)
+    except asyncio.TimeoutError:
+        pass
 
-class NotificationService:
-    """Send push notifications via ntfy.sh"""
-    
-    def __init__(self, server, topic=ntfy_topic):
-        """
-        Initialize notification service
-        server: ntfy server URL (e.g., "https://ntfy.sh")
-        topic: unique topic name for your device
-        """
-        self.server = server.rstrip('/')
-        self.topic = topic
-        self.url = f"{self.server}/{self.topic}"
-    
-    def send(self, message, title="Fish Feeder", priority=3):
-        """
-        Send notification
-        priority: 1=min, 3=default, 5=max
-        """
+async def _run_outbox():
+    backoff_ms = 0
+    attempts = 0
+    while True:
+        if _has_spilled() and _online():
+            # Saved messages go out first, ahead of anything queued since
+            _load_spilled()
+        if not _queue:
+            if _has_spilled():
+                # Offline with saved messages: check the link again later
+                await _wait_for_work(OFFLINE_POLL_MS)
+            elif _client is not None and _client.writer is not None:
+                # Keep the connection for follow-up pushes, then let it go
+                await _wait_for_work(_client.idle_ms())
+                if not _queue and _client.idle():
+                    await _client.close()
+            else:
+                await _wait_for_work(None)
+            continue
+
+        # Give messages posted close together time to join this push
+        await asyncio.sleep(BATCH_MS / 1000)
+        if not _online():
+            print('WiFi down, saving {} notification(s)'.format(len(_queue)))
+            _spill()
+            continue
+
+        count = min(len(_queue), QUEUE_SIZE)
+        body = '\n'.join(_queue[:count])
         try:
-            import gc
-            gc.collect()
-            headers = {
-                'Title': title,
-                'Priority': str(priority),
-                'Tags': 'fish,food'
-            }
-            response = urequests.post(
-                self.url,
-                data=message.encode('utf-8'),
-                headers=headers
-            )
-            success = response.status_code == 200
-            response.close()
-            return success
+            status = await _post(body)
         except Exception as e:
-            print(f"Notification failed: {e}")
-            return False
-    
-    def send_feeding_notification(self, time_str):
-        """Send notification after successful feeding"""
-        message = f"Fish fed successfully at {time_str}"
-        return self.send(message, title="🐟 Feeding Complete")
-    
-    def send_error_notification(self, error):
-        """Send notification on error"""
-        message = f"Feeding error: {error}"
-        return self.send(message, title="⚠️ Feeder Error", priority=4)
+            print('ntfy notification error:', e)
+            status = 0
+        del body
+        if _settle(count, status):
+            attempts = 0
+            backoff_ms = 0
+        elif attempts + 1 >= MAX_RETRIES:
+            print('Notification failed {} times, dropping {} message(s)'.format(MAX_RETRIES, count))
+            del _queue[:count]
+            stats['dropped'] += count
+            attempts = 0
+            backoff_ms = 0
+        else:
+            attempts += 1
+            backoff_ms = min(RETRY_MAX_MS, backoff_ms * 2 if backoff_ms else RETRY_MIN_MS)
+            print('Notification failed, retrying in {} s'.format(backoff_ms // 1000))
+            await asyncio.sleep(backoff_ms / 1000)
+        try:
+            import gc_policy
+            gc_policy.maybe_collect('notification._run_outbox')
+        except ImportError:
+            pass
@@ -2,6 +2,10 @@
 # Manages real-time clock for scheduled feedings
 from machine import I2C, Pin
 import struct
+try:
+    import utime as time
+except ImportError:
+    import time
 
 class DS3231:
     """Driver for DS3231 Real-Time Clock module"""
@@ -50,19 +54,57 @@ class DS3231:
         data[6] = self._dec_to_bcd(year - 2000)
         
         self.i2c.writeto_mem(self.ADDRESS, 0x00, data)
+        
+        # Time is valid again: clear the oscillator stop flag
+        status = self.i2c.readfrom_mem(self.ADDRESS, 0x0F, 1)[0]
+        self.i2c.writeto_mem(self.ADDRESS, 0x0F, bytes([status & 0x7F]))
+    
+    def set_epoch(self, secs):
+        """Set RTC time from epoch seconds (local time)
+        Writing the seconds register restarts the DS3231's one-second
+        countdown, so call this on a whole second.
+        """
+        t = time.localtime(secs)
+        self.set_time(t[0], t[1], t[2], t[3], t[4], t[5], t[6] + 1)
+    
+    def to_system_clock(self):
+        """Set machine.RTC from the DS3231
+        One burst read covers the time registers and the status register.
+        Returns: False (clock left alone) if the oscillator stopped since the
+        time was last set, i.e. the DS3231 lost power and its time is invalid
+        """
+        import machine
+        data = self.i2c.readfrom_mem(self.ADDRESS, 0x00, 16)
+        if data[15] & 0x80:
+            return False
+        year = self._bcd_to_dec(data[6]) + 2000
+        month = self._bcd_to_dec(data[5] & 0x1F)
+        day = self._bcd_to_dec(data[4])
+        # The weekday register is whatever set_time() was given; derive it from the date
+        weekday = time.localtime(time.mktime((year, month, day, 0, 0, 0, 0, 0)))[6]
+        machine.RTC().datetime((year, month, day, weekday,
+                                self._bcd_to_dec(data[2] & 0x3F), self._bcd_to_dec(data[1]),
+                                self._bcd_to_dec(data[0] & 0x7F), 0))
+        return True
     
     def get_temperature(self):
         """Get temperature from DS3231's built-in sensor"""
         data = self.i2c.readfrom_mem(self.ADDRESS, 0x11, 2)
         return data[0] + (data[1] >> 6) * 0.25
     
-    def set_alarm(self, hour, minute):
-        """Set alarm for specific time (Alarm 1)"""
+    def set_alarm(self, hour, minute, day=None):
+        """Set alarm for specific time (Alarm 1)
+        With day (date of the month) the alarm fires only on that date,
+        otherwise every day at hour:minute.
+        """
         data = bytearray(4)
         data[0] = self._dec_to_bcd(0)  # Seconds
         data[1] = self._dec_to_bcd(minute)
         data[2] = self._dec_to_bcd(hour)
-        data[3] = 0x80  # Alarm when hours, minutes, and seconds match
+        if day is None:
+            data[3] = 0x80  # Alarm when hours, minutes, and seconds match
+        else:
+            data[3] = self._dec_to_bcd(day)  # Date, hours, minutes and seconds match
         
         self.i2c.writeto_mem(self.ADDRESS, 0x07, data)
         
@@ -0,0 +1,250 @@
+# SNTP time sync as a background task
+# Queries every NTP server at once over one UDP socket and takes the first
+# valid reply, so a slow or unreachable server costs nothing. Runs after the
+# HTTP server is up, resyncs every NTP_RESYNC_MINUTES and records how far the
+# clock drifted between syncs. Each sync is written back to the DS3231, which
+# boot.py reads before WiFi comes up.
+
+import socket
+import struct
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    import utime as time
+except ImportError:
+    import time
+import ticks
+
+try:
+    import config
+    SERVERS = config.NTP_SERVERS if hasattr(config, 'NTP_SERVERS') else ['pool.ntp.org', 'time.google.com', 'time.cloudflare.com']
+    TIMEOUT_MS = config.NTP_TIMEOUT_MS if hasattr(config, 'NTP_TIMEOUT_MS') else 3000
+    RESYNC_MS = (config.NTP_RESYNC_MINUTES if hasattr(config, 'NTP_RESYNC_MINUTES') else 360) * 60000
+    TZ_OFFSET = config.TZ_OFFSET_SECONDS if hasattr(config, 'TZ_OFFSET_SECONDS') else 19800
+    SDA_PIN = config.RTC_SDA_PIN if hasattr(config, 'RTC_SDA_PIN') else 4
+    SCL_PIN = config.RTC_SCL_PIN if hasattr(config, 'RTC_SCL_PIN') else 5
+except ImportError:
+    SERVERS = ['pool.ntp.org', 'time.google.com', 'time.cloudflare.com']
+    TIMEOUT_MS = 3000
+    RESYNC_MS = 360 * 60000
+    TZ_OFFSET = 19800
+    SDA_PIN = 4
+    SCL_PIN = 5
+
+RETRY_MIN_MS = 30000
+POLL_MS = 20
+
+# Seconds from the NTP epoch (1900) to this port's epoch (2000 on MicroPython)
+NTP_DELTA = 3155673600 if time.gmtime(0)[0] == 2000 else 2208988800
+
+# Last sync results, served by /api/system/time
+stats = {
+    'syncs': 0,
+    'failures': 0,
+    'server': None,
+    'rtt_ms': None,
+    'offset_ms': None,      # local clock minus NTP time, before correcting
+    'drift_ppm': None,      # offset change per elapsed time between syncs
+    'last_sync': None
+}
+_last_sync_ticks = None
+_task = None
+# (SERVERS, [(server, address), ...]) from the last lookup
+_resolved = None
+# Blocking server mode: ticks when sync_if_due() syncs next (None: now)
+_next_sync = None
+
+def now_ms():
+    """Local wall clock in milliseconds (local time zone)."""
+    if hasattr(time, 'time_ns'):
+        return time.time_ns() // 1000000
+    return int(time.time() * 1000)
+
+async def _sleep_ms(ms):
+    if hasattr(asyncio, 'sleep_ms'):
+        await asyncio.sleep_ms(ms)
+    else:
+        await asyncio.sleep(ms / 1000)
+
+def set_clock(secs):
+    """Set the system clock to secs (local time)."""
+    import machine
+    t = time.localtime(secs)
+    machine.RTC().datetime((t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0))
+
+def save_rtc(secs):
+    """Write the corrected time to the DS3231 so the next boot starts with it."""
+    try:
+        from lib.rtc_handler import DS3231
+        DS3231(SDA_PIN, SCL_PIN).set_epoch(secs)
+    except Exception as e:
+        print('NTP: DS3231 not updated:', e)
+
+def _addresses():
+    """Resolve SERVERS ('host' or 'host:port'); unresolvable ones are skipped.
+    The lookup is reused until a sync gets no reply, so a resync costs no
+    blocking DNS queries.
+    """
+    global _resolved
+    if _resolved is not None and _resolved[0] is SERVERS:
+        return _resolved[1]
+    addrs = []
+    for server in SERVERS:
+        host, port = server, 123
+        if ':' in server:
+            host, port = server.split(':', 1)
+            port = int(port)
+        try:
+            addrs.append((server, socket.getaddrinfo(host, port)[0][-1]))
+        except OSError as e:
+            print('NTP: cannot resolve {}: {}'.format(server, e))
+    if addrs:
+        _resolved = (SERVERS, addrs)
+    return addrs
+
+def _request(tag):
+    """48-byte client request; tag is echoed back in the originate timestamp."""
+    packet = bytearray(48)
+    packet[0] = 0x1B  # LI 0, version 3, mode 3 (client)
+    packet[40:48] = tag
+    return packet
+
+def _parse(data, tag):
+    """Server transmit time in ms since the NTP epoch, or None if invalid."""
+    if len(data) < 48 or data[0] & 0x07 != 4 or data[1] == 0 or data[24:32] != tag:
+        return None
+    secs, frac = struct.unpack('!II', data[40:48])
+    if secs == 0:
+        return None
+    return secs * 1000 + (frac * 1000 >> 32)
+
+async def query():
+    """Ask all servers at once.
+    Returns: (server, NTP time in ms since 1900 at the moment of return, rtt_ms) or None.
+    """
+    addrs = _addresses()
+    if not addrs:
+        return None
+    tag = struct.pack('!II', ticks.ticks_ms() & 0xffffffff, len(addrs))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        request = _request(tag)
+        sent = ticks.ticks_ms()
+        for _, addr in addrs:
+            try:
+                sock.sendto(request, addr)
+            except OSError as e:
+                print('NTP: send failed:', e)
+        while ticks.ticks_diff(ticks.ticks_ms(), sent) < TIMEOUT_MS:
+            try:
+                data, addr = sock.recvfrom(64)
+            except OSError:
+                await _sleep_ms(POLL_MS)
+                continue
+            received = ticks.ticks_ms()
+            server_ms = _parse(data, tag)
+            if server_ms is None:
+                continue
+            name = addr
+            for server, server_addr in addrs:
+                if server_addr == addr:
+                    name = server
+            rtt = ticks.ticks_diff(received, sent)
+            # The reply left the server about half the round trip ago
+            return name, server_ms + rtt // 2, rtt
+        return None
+    finally:
+        sock.close()
+
+async def sync():
+    """Query the servers and set the clock. Returns: True on success."""
+    global _last_sync_ticks, _resolved
+    result = await query()
+    if result is None:
+        # The addresses may be stale (pool DNS rotates); look them up again next time
+        _resolved = None
+        stats['failures'] += 1
+        print('NTP: no reply from {}'.format(', '.join(SERVERS)))
+        return False
+    server, ntp_ms, rtt = result
+    true_ms = ntp_ms - NTP_DELTA * 1000 + TZ_OFFSET * 1000
+    offset = now_ms() - true_ms
+    now_ticks = ticks.ticks_ms()
+    if _last_sync_ticks is not None and stats['offset_ms'] is not None:
+        # The previous sync zeroed the offset, so all of it is drift since then
+        elapsed = ticks.ticks_diff(now_ticks, _last_sync_ticks)
+        if elapsed > 0:
+            stats['drift_ppm'] = round(offset * 1000000 / elapsed, 1)
+    # Set the clock on the next whole second so the sub-second part is right
+    wait = 1000 - true_ms % 1000
+    await _sleep_ms(wait)
+    set_clock((true_ms + wait) // 1000)
+    save_rtc((true_ms + wait) // 1000)
+    _last_sync_ticks = ticks.ticks_ms()
+    stats['syncs'] += 1
+    stats['server'] = server
+    stats['rtt_ms'] = rtt
+    stats['offset_ms'] = offset
+    t = time.localtime((true_ms + wait) // 1000)
+    stats['last_sync'] = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(t[0], t[1], t[2], t[3], t[4], t[5])
+    print('NTP: synced from {} (rtt {} ms, offset {} ms)'.format(server, rtt, offset))
+    _clock_changed()
+    return True
+
+def _clock_changed():
+    """Let the scheduler recompute its deadline against the corrected clock."""
+    try:
+        import scheduler_service
+        scheduler_service.wake()
+    except ImportError:
+        pass
+
+def _online():
+    try:
+        import network
+        return network.WLAN(network.STA_IF).isconnected()
+    except ImportError:
+        return True
+
+async def _run():
+    retry = RETRY_MIN_MS
+    while True:
+        ok = False
+        if _online():
+            try:
+                ok = await sync()
+            except Exception as e:
+                print('NTP: sync error:', e)
+        if ok:
+            retry = RETRY_MIN_MS
+            delay = RESYNC_MS
+        else:
+            delay = retry
+            retry = min(retry * 2, RESYNC_MS)
+        await _sleep_ms(delay)
+
+def sync_if_due():
+    """Sync before returning if a sync is due. For blocking server mode, where
+    no event loop runs the background task; call it between requests.
+    Returns: True if the clock was synced.
+    """
+    global _next_sync
+    if _next_sync is not None and ticks.ticks_diff(_next_sync, ticks.ticks_ms()) > 0:
+        return False
+    ok = False
+    if _online():
+        try:
+            ok = asyncio.run(sync())
+        except Exception as e:
+            print('NTP: sync error:', e)
+    _next_sync = ticks.ticks_add(ticks.ticks_ms(), RESYNC_MS if ok else RETRY_MIN_MS)
+    return ok
+
+def start():
+    """Start the sync task from inside the running event loop."""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run())
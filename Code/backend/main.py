@@ -1,17 +1,18 @@
 import gc
-import utime as time
-import uasyncio as asyncio
+import boot_trace
 
 # Collect garbage before starting
 gc.collect()
 
-# Add a small delay to ensure WiFi is fully ready
-time.sleep(2)
-
 print('Starting Fish Feeder System...')
 print('Free memory:', gc.mem_free())
 
 try:
+    # Load device state from flash once; reads are served from RAM after this
+    import state
+    state.load()
+    boot_trace.mark('state')
+    
     # Import scheduler service first
     import scheduler_service
     print('Scheduler service imported')
@@ -20,13 +21,18 @@ try:
     # Start the feeding scheduler (this creates an asyncio task)
     scheduler_service.start_scheduler()
     print('Feeding scheduler started')
+    
+    # Write state changes back to flash periodically
+    state.start_flush_task()
     gc.collect()
+    boot_trace.mark('scheduler')
     
     # Import and start API server
     import api
     print('API module imported successfully')
     gc.collect()
     print('Free memory after import:', gc.mem_free())
+    boot_trace.mark('api_import')
     
     # Start the server (this will run the asyncio event loop)
     api.app.run(host='0.0.0.0', port=80)
@@ -45,3 +51,9 @@ except Exception as e:
     print('Error starting system:', e)
     import sys
     sys.print_exception(e)
+finally:
+    # Don't lose state changes that have not been flushed yet
+    try:
+        state.flush()
+    except Exception:
+        pass
@@ -1,9 +1,13 @@
-NEXT_FEED_FILE = "data/next_feed.txt"
+# Next feed time, served from the in-memory state store
+import state
+
+def read_next_feed_iso():
+    """Raw ISO timestamp, or "" / "Not scheduled"."""
+    return state.get('next_feed')
 
 def read_next_feed():
     try:
-        with open(NEXT_FEED_FILE, "r") as f:
-            raw_time = f.read().strip()
+        raw_time = state.get('next_feed')
         if not raw_time or raw_time == "Not scheduled":
             return "Not scheduled"
         # Parse and format manually from ISO string: YYYY-MM-DDTHH:MM:SS
@@ -28,9 +32,5 @@ def read_next_feed():
         return "Not scheduled"
 
 def write_next_feed(iso_time):
-    try:
-        with open(NEXT_FEED_FILE, "w") as f:
-            f.write(iso_time)
-        return True
-    except:
-        return False
+    state.set('next_feed', iso_time)
+    return True
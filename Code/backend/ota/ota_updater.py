@@ -14,6 +14,7 @@ except ImportError:
     import os
 
 import gc
+import gc_policy
 
 class OTAUpdater:
     def __init__(self, base_url="http://feeder-ota.surge.sh"):
@@ -129,31 +130,31 @@ class OTAUpdater:
         """Fetch remote version.json from GitHub"""
         try:
             print(f"Fetching version info from {self.version_url}")
-            gc.collect()  # Free memory before request
+            gc_policy.maybe_collect('ota.get_remote_version')  # Free memory before request
             
             response = requests.get(self.version_url)
             
             if response.status_code != 200:
                 print(f"Failed to fetch version.json: HTTP {response.status_code}")
                 response.close()
-                gc.collect()
+                gc_policy.maybe_collect('ota.get_remote_version')
                 return None
             
             # Read content as text first (more memory efficient)
             content = response.text
             response.close()
-            gc.collect()
+            gc_policy.maybe_collect('ota.get_remote_version')
             
             # Parse JSON manually (avoids ujson memory overhead)
             version_data = self._parse_json(content)
             
             del content
-            gc.collect()
+            gc_policy.maybe_collect('ota.get_remote_version')
             return version_data
             
         except Exception as e:
             print(f"Error fetching remote version: {e}")
-            gc.collect()
+            gc_policy.maybe_collect('ota.get_remote_version')
             return None
     
     def download_file(self, remote_path, local_path):
@@ -176,7 +177,7 @@ class OTAUpdater:
         
         print("  Downloading: " + surge_filename + " -> " + remote_path)
         print("  URL: " + url)
-        gc.collect()  # Free memory before download
+        gc_policy.maybe_collect('ota.download_file')  # Free memory before download
         
         try:
             # Ensure directory exists (create nested directories one by one)
@@ -193,7 +194,7 @@ class OTAUpdater:
                     except:
                         pass  # Directory already exists
             
-            gc.collect()
+            gc_policy.maybe_collect('ota.download_file')
             
             # Download file
             response = requests.get(url)
@@ -201,19 +202,19 @@ class OTAUpdater:
             if response.status_code != 200:
                 print(f"  ✗ Failed: HTTP {response.status_code}")
                 response.close()
-                gc.collect()
+                gc_policy.maybe_collect('ota.download_file')
                 return False
             
             # Write to temporary file
             content = response.content
             response.close()
-            gc.collect()
+            gc_policy.maybe_collect('ota.download_file')
             
             with open(tmp_path, 'wb') as f:
                 f.write(content)
             
             del content
-            gc.collect()
+            gc_policy.maybe_collect('ota.download_file')
             
             # Atomic rename: delete original, rename temp
             try:
@@ -223,7 +224,7 @@ class OTAUpdater:
             
             os.rename(tmp_path, local_path)
             print(f"  ✓ Downloaded: {remote_path}")
-            gc.collect()
+            gc_policy.maybe_collect('ota.download_file')
             return True
             
         except Exception as e:
@@ -233,7 +234,7 @@ class OTAUpdater:
                 os.remove(tmp_path)
             except:
                 pass
-            gc.collect()
+            gc_policy.maybe_collect('ota.download_file')
             return False
     
     def update_local_version(self, version_data):
@@ -262,18 +263,18 @@ class OTAUpdater:
             dict: Remote version data if update available, None otherwise
         """
         print("\n=== OTA Update Check ===")
-        gc.collect()
+        gc_policy.maybe_collect('ota.check_for_updates')
         print(f"Free RAM: {gc.mem_free()} bytes")
         
         local_version = self.get_local_version()
         print(f"Local version: {local_version}")
         
-        gc.collect()  # Free memory before network request
+        gc_policy.maybe_collect('ota.check_for_updates')  # Free memory before network request
         remote_data = self.get_remote_version()
         
         if not remote_data:
             print("✗ Could not fetch remote version")
-            gc.collect()
+            gc_policy.maybe_collect('ota.check_for_updates')
             return None
         
         remote_version = remote_data.get("version", "0.0.0")
@@ -286,7 +287,7 @@ class OTAUpdater:
             print("✓ Already up to date")
             # Return None but keep the check minimal
             del remote_data
-            gc.collect()
+            gc_policy.maybe_collect('ota.check_for_updates')
             return None
     
     def perform_update(self):
@@ -317,7 +318,7 @@ class OTAUpdater:
                 success_count += 1
             else:
                 failed_files.append(file_path)
-            gc.collect()
+            gc_policy.maybe_collect('ota.perform_update')
         
         print(f"\n=== Update Complete ===")
         print(f"Success: {success_count}/{len(files)} files")
@@ -1,17 +1,13 @@
-QUANTITY_FILE = 'data/quantity.txt'
+# Feed quantity, served from the in-memory state store
+import state
 
 def read_quantity():
-    try:
-        with open(QUANTITY_FILE, 'r') as f:
-            return int(f.read().strip())
-    except:
-        return 0
+    return state.get('quantity')
 
 def write_quantity(value):
     try:
         value = max(0, min(15, int(value)))
-        with open(QUANTITY_FILE, 'w') as f:
-            f.write(str(value))
+        state.set('quantity', value)
         return True
     except:
         return False
@@ -0,0 +1,56 @@
+# Table-driven request router for SimpleServer
+# Exact routes live in a dict keyed by (path, method); a small prefix table,
+# keyed by parent directory, covers paths such as /api/schedule/<id>.
+
+class Router:
+    def __init__(self):
+        self.exact = {}      # (path, method) -> handler
+        self.allowed = {}    # path -> [methods], used for 405 responses
+        self.prefixes = {}   # (prefix, method) -> handler, prefix ends with '/'
+        self.prefix_allowed = {}
+
+    def add(self, path, methods, handler, prefix=False):
+        """Register handler(conn, req) for path and each method.
+        A prefix route matches any path directly below it, e.g. '/api/schedule/'
+        matches '/api/schedule/3'.
+        """
+        if prefix:
+            table, allowed = self.prefixes, self.prefix_allowed
+            if not path.endswith('/'):
+                path += '/'
+        else:
+            table, allowed = self.exact, self.allowed
+        for method in methods:
+            table[(path, method)] = handler
+            allowed.setdefault(path, []).append(method)
+
+    def route(self, *paths, methods=('GET',), prefix=False):
+        """Decorator form of add(), e.g. @route('/api/ping', '/api/status')."""
+        def decorator(handler):
+            for path in paths:
+                self.add(path, methods, handler, prefix)
+            return handler
+        return decorator
+
+    def match(self, method, path):
+        """Look up a handler with at most four dict lookups.
+        Returns: (handler, None) on a match, (None, allowed_methods) if the path
+        exists but not for this method, (None, None) if the path is unknown.
+        """
+        handler = self.exact.get((path, method))
+        if handler is not None:
+            return handler, None
+        allowed = self.allowed.get(path)
+        if allowed is not None:
+            return None, allowed
+        if self.prefixes:
+            parent = path[:path.rfind('/') + 1]
+            handler = self.prefixes.get((parent, method))
+            if handler is not None:
+                return handler, None
+            return None, self.prefix_allowed.get(parent)
+        return None, None
+
+# Application-wide route table; handler modules register on import
+routes = Router()
+route = routes.route
@@ -0,0 +1,89 @@
+# Schedule compiler
+# Turns the schedule dict into a sorted array of minute-of-week offsets
+# (Monday 00:00 = 0), built once when the schedule changes. Finding the next
+# feed is then one localtime() call and a binary search instead of a loop over
+# 8 days x N feeding times.
+
+from array import array
+try:
+    import utime as time
+except ImportError:
+    import time
+import state
+
+MINUTES_PER_DAY = 1440
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+def day_mask(days):
+    """7-bit mask of enabled weekdays, bit 0 = Monday."""
+    mask = 0
+    for i, day in enumerate(state.WEEKDAYS):
+        if days.get(day):
+            mask |= 1 << i
+    return mask
+
+def minute_of_day(hour, minute, ampm):
+    """12-hour time -> minutes since midnight."""
+    if ampm == 'PM' and hour < 12:
+        hour += 12
+    if ampm == 'AM' and hour == 12:
+        hour = 0
+    return hour * 60 + minute
+
+def compile(schedule):
+    """Sorted array('H') of minute-of-week offsets for every enabled feed.
+    Days are added in order and times are sorted within a day, so the result
+    is sorted without sorting the whole week.
+    """
+    if not schedule:
+        return array('H')
+    mask = day_mask(schedule.get('days', {}))
+    minutes = [minute_of_day(t.get('hour', 0), t.get('minute', 0), t.get('ampm', 'AM'))
+               for t in schedule.get('feeding_times', []) if t.get('enabled')]
+    minutes.sort()
+    table = array('H')
+    for day in range(7):
+        if mask & (1 << day):
+            base = day * MINUTES_PER_DAY
+            last = -1
+            for m in minutes:
+                # Sorted per day, so duplicates are adjacent
+                if m != last:
+                    table.append(base + m)
+                    last = m
+    return table
+
+def bisect_right(table, x):
+    """Index of the first entry greater than x (MicroPython has no bisect)."""
+    lo, hi = 0, len(table)
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if x < table[mid]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+def next_feed_secs(table, now_secs=None):
+    """Epoch seconds of the first feed strictly after now_secs, or None."""
+    if not len(table):
+        return None
+    if now_secs is None:
+        now_secs = int(time.time())
+    now = time.localtime(now_secs)
+    week_secs = now[6] * 86400 + now[3] * 3600 + now[4] * 60 + now[5]
+    i = bisect_right(table, week_secs // 60)
+    target = table[i] if i < len(table) else table[0] + MINUTES_PER_WEEK
+    return now_secs + target * 60 - week_secs
+
+# Table for the current schedule, rebuilt by set_schedule()
+_table = None
+
+def set_schedule(schedule):
+    global _table
+    _table = compile(schedule)
+
+def table():
+    if _table is None:
+        set_schedule(state.get('schedule'))
+    return _table
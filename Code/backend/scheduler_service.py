@@ -1,15 +1,37 @@
 """
 Asyncio-based feeding scheduler service.
-Monitors next_feed.txt and automatically triggers feeding at scheduled times.
+Sleeps until the next feed time and queues a feed job (see feed_jobs) when it
+is reached. Anything that can move the next feed (schedule saves, manual
+feeds, clock changes) calls wake() so the deadline is recomputed at once.
 """
 
-import uasyncio as asyncio
-import utime as time
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    import utime as time
+except ImportError:
+    import time
+import ticks
 import next_feed_service
-import calibration_service
+import feed_jobs
 
-# Maximum sleep time (5 minutes in seconds)
-MAX_SLEEP_SECONDS = 300
+# Longest single sleep. ticks_ms() differences are only valid for about six
+# days on MicroPython, and a feed can be a week away.
+MAX_SLEEP_MS = 24 * 3600 * 1000
+
+# Set by wake(); created by the scheduler task inside the event loop
+_wake = None
+
+# Counters for /api/system/scheduler
+stats = {'wakeups': 0, 'signals': 0, 'feeds': 0}
+
+def wake():
+    """Make the scheduler recompute its deadline now."""
+    stats['signals'] += 1
+    if _wake is not None:
+        _wake.set()
 
 def parse_iso_time(iso_str):
     """Parse ISO format time string to time tuple.
@@ -36,9 +58,7 @@ def seconds_until_next_feed():
     Returns: seconds until next feed, or None if not scheduled
     """
     try:
-        # Read next feed time from file
-        with open(next_feed_service.NEXT_FEED_FILE, 'r') as f:
-            iso_time = f.read().strip()
+        iso_time = next_feed_service.read_next_feed_iso()
         
         if not iso_time or iso_time == "Not scheduled":
             return None
@@ -64,188 +84,81 @@ def seconds_until_next_feed():
         return None
 
 def calculate_and_update_next_feed():
-    """Calculate the next feed time based on schedule and update next_feed.txt.
-    This is called after each feeding to prepare for the next one.
+    """Calculate the next feed time from the compiled schedule and update next_feed.txt.
+    This is called after each feeding and whenever the schedule is saved.
     """
     try:
-        import services
+        import schedule_compiler
         
-        # Read current schedule
-        schedule = services.read_schedule()
-        if not schedule or not schedule.get('feeding_times'):
-            print("No schedule configured")
-            next_feed_service.write_next_feed("Not scheduled")
-            return
-        
-        # Get enabled feeding times and days
-        feeding_times = [t for t in schedule.get('feeding_times', []) if t.get('enabled')]
-        enabled_days = [day for day, enabled in schedule.get('days', {}).items() if enabled]
-        
-        if not feeding_times or not enabled_days:
+        feed_secs = schedule_compiler.next_feed_secs(schedule_compiler.table())
+        if feed_secs is None:
             print("No enabled feeding times or days")
             next_feed_service.write_next_feed("Not scheduled")
             return
         
-        # Find next feed time
-        now = time.localtime()
-        now_secs = time.mktime(now)
-        next_feed_secs = None
-        next_feed_tuple = None
-        
-        weekday_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        
-        # Search up to 7 days ahead
-        for day_offset in range(8):
-            check_secs = now_secs + (86400 * day_offset)
-            check_date = time.localtime(check_secs)
-            weekday = weekday_names[check_date[6]]
-            
-            if weekday in enabled_days:
-                for feed_time in feeding_times:
-                    hour = feed_time.get('hour', 0)
-                    minute = feed_time.get('minute', 0)
-                    ampm = feed_time.get('ampm', 'AM')
-                    
-                    # Convert to 24-hour format
-                    if ampm == 'PM' and hour < 12:
-                        hour += 12
-                    if ampm == 'AM' and hour == 12:
-                        hour = 0
-                    
-                    feed_tuple = (check_date[0], check_date[1], check_date[2], hour, minute, 0, check_date[6], check_date[7])
-                    feed_secs = time.mktime(feed_tuple)
-                    
-                    if feed_secs > now_secs:
-                        if next_feed_secs is None or feed_secs < next_feed_secs:
-                            next_feed_secs = feed_secs
-                            next_feed_tuple = feed_tuple
-                
-                if next_feed_tuple:
-                    break
-        
-        # Write next feed time
-        if next_feed_tuple:
-            iso_str = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(
-                next_feed_tuple[0], next_feed_tuple[1], next_feed_tuple[2],
-                next_feed_tuple[3], next_feed_tuple[4], next_feed_tuple[5]
-            )
-            next_feed_service.write_next_feed(iso_str)
-            print(f"Next feed scheduled for: {iso_str}")
-        else:
-            next_feed_service.write_next_feed("Not scheduled")
-            print("No upcoming feed times found")
+        t = time.localtime(feed_secs)
+        iso_str = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(t[0], t[1], t[2], t[3], t[4], t[5])
+        next_feed_service.write_next_feed(iso_str)
+        print(f"Next feed scheduled for: {iso_str}")
             
     except Exception as e:
         print(f"Error calculating next feed: {e}")
         import sys
         sys.print_exception(e)
 
+async def _sleep_until(deadline):
+    """Wait until the ticks_ms() deadline (None = no deadline) or until wake()."""
+    _wake.clear()
+    timeout = MAX_SLEEP_MS if deadline is None else min(MAX_SLEEP_MS, max(0, ticks.ticks_diff(deadline, ticks.ticks_ms())))
+    try:
+        if hasattr(asyncio, 'wait_for_ms'):
+            await asyncio.wait_for_ms(_wake.wait(), timeout)
+        else:
+            await asyncio.wait_for(_wake.wait(), timeout / 1000)
+    except asyncio.TimeoutError:
+        pass
+    stats['wakeups'] += 1
+
 async def feeding_scheduler():
     """Main scheduler loop that monitors and triggers feeding."""
-    import gc
+    global _wake
+    import gc_policy
     
+    if _wake is None:
+        _wake = asyncio.Event()
     print("Feeding scheduler started")
     
     while True:
         try:
-            # Free memory at start of each cycle
-            gc.collect()
-            
             # Calculate seconds until next feed
             seconds = seconds_until_next_feed()
             
-            # If next_feed.txt is empty or not scheduled, feed immediately and recalculate
             if seconds is None:
+                if next_feed_service.read_next_feed_iso() == "Not scheduled":
+                    # Nothing to do until the schedule (or clock) changes
+                    print("No feed scheduled - waiting for a schedule change")
+                    await _sleep_until(None)
+                    continue
+                # next_feed.txt is empty: feed immediately and calculate the schedule
                 print("No scheduled feed time found - feeding now and calculating schedule")
-                
-                # Log event
-                import event_log_service
-                event_log_service.log_event(event_log_service.EVENT_FEED_IMMEDIATE, 'No schedule found')
-                
-                calibration_service.disburseFood()
-                
-                # Update quantity
-                import quantity_service
-                quantity = quantity_service.read_quantity()
-                if quantity > 0:
-                    quantity -= 1
-                    quantity_service.write_quantity(quantity)
-                
-                # Update last fed time
-                import last_fed_service
-                now = time.localtime()
-                iso_time = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(
-                    now[0], now[1], now[2], now[3], now[4], now[5]
-                )
-                last_fed_service.write_last_fed(iso_time)
-                
-                # Send notification
-                try:
-                    import lib.notification
-                    time_str = "{:02d}:{:02d}:{:02d}".format(now[3], now[4], now[5])
-                    msg = "Food disbursed at {}. Feed remaining: {}".format(time_str, quantity)
-                    lib.notification.send_ntfy_notification(msg)
-                except Exception as e:
-                    print(f"Could not send notification: {e}")
-                
-                # Calculate and update next feed time
+                feed_jobs.submit(feed_jobs.SOURCE_UNSCHEDULED)
+                stats['feeds'] += 1
                 calculate_and_update_next_feed()
-                
-                # Clean up after feeding cycle
-                gc.collect()
-                
-                # Sleep for a bit before checking again
-                await asyncio.sleep(60)
                 continue
             
-            # If feed time is now or past, feed immediately
+            # If feed time is now or past, queue the feed
             if seconds <= 0:
                 print("Feed time reached - dispensing food")
+                feed_jobs.submit(feed_jobs.SOURCE_SCHEDULED)
+                stats['feeds'] += 1
                 
-                # Log event
-                import event_log_service
-                event_log_service.log_event(event_log_service.EVENT_FEED_SCHEDULED, 'Scheduled feeding')
-                
-                calibration_service.disburseFood()
-                
-                # Update quantity
-                import quantity_service
-                quantity = quantity_service.read_quantity()
-                if quantity > 0:
-                    quantity -= 1
-                    quantity_service.write_quantity(quantity)
-                
-                # Update last fed time
-                import last_fed_service
-                now = time.localtime()
-                iso_time = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(
-                    now[0], now[1], now[2], now[3], now[4], now[5]
-                )
-                last_fed_service.write_last_fed(iso_time)
-                
-                # Send notification
-                try:
-                    import lib.notification
-                    time_str = "{:02d}:{:02d}:{:02d}".format(now[3], now[4], now[5])
-                    msg = "Food disbursed at {}. Feed remaining: {}".format(time_str, quantity)
-                    lib.notification.send_ntfy_notification(msg)
-                except Exception as e:
-                    print(f"Could not send notification: {e}")
-                
-                # Calculate and update next feed time
+                # The next feed is strictly after now, so this can't re-trigger
                 calculate_and_update_next_feed()
-                
-                # Clean up after feeding cycle
-                gc.collect()
-                
-                # Sleep for a bit to avoid immediate re-trigger
-                await asyncio.sleep(60)
+                gc_policy.maybe_collect('scheduler.feeding_scheduler')
                 continue
             
-            # Sleep until next feed or max 5 minutes
-            sleep_time = min(seconds, MAX_SLEEP_SECONDS)
-            print(f"Scheduler sleeping for {sleep_time:.0f} seconds ({sleep_time/60:.1f} minutes)")
-            await asyncio.sleep(sleep_time)
+            # Sleep until the feed time unless something signals a change first
+            await _sleep_until(ticks.ticks_add(ticks.ticks_ms(), int(seconds * 1000)))
             
         except Exception as e:
             print(f"Error in feeding scheduler: {e}")
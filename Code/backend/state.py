@@ -0,0 +1,232 @@
+# Device state kept in RAM
+# Quantity, last/next feed time, calibration and schedule are read from data/
+# once and served from memory afterwards. With STATE_FORMAT = 'binary' they
+# are kept in one CRC-checked record instead (see state_record.py). set() only updates memory and marks
+# the field dirty; flush() writes dirty fields back to flash. A background
+# task flushes every STATE_FLUSH_SECONDS (in blocking server mode the request
+# loop calls flush_if_due() instead), and reboot/shutdown paths call flush()
+# directly.
+# revision counts changes made through set(); API endpoints built from this
+# state use it as their ETag.
+
+try:
+    import config
+    FLUSH_SECONDS = config.STATE_FLUSH_SECONDS if hasattr(config, 'STATE_FLUSH_SECONDS') else 60
+    FORMAT = config.STATE_FORMAT if hasattr(config, 'STATE_FORMAT') else 'text'
+except ImportError:
+    FLUSH_SECONDS = 60
+    FORMAT = 'text'
+
+import ticks
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def parse_schedule(text):
+    """Parse schedule.txt.
+    Format: times=08:00:AM,20:00:PM
+            days=Monday,Tuesday,Wednesday
+    Returns: dict with feeding_times and days for API compatibility
+    """
+    feeding_times = []
+    days = {}
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if '=' in line:
+            key, value = line.split('=', 1)
+            if key == 'times':
+                # Parse times: 08:00:AM,20:00:PM
+                for time_str in value.split(','):
+                    if time_str:
+                        parts = time_str.split(':')
+                        if len(parts) >= 2:
+                            hour = int(parts[0])
+                            min_ampm = parts[1]
+                            if 'AM' in min_ampm or 'PM' in min_ampm:
+                                minute = int(min_ampm[:2])
+                                ampm = min_ampm[2:]
+                            else:
+                                minute = int(min_ampm)
+                                ampm = parts[2] if len(parts) > 2 else 'AM'
+                            feeding_times.append({
+                                'hour': hour,
+                                'minute': minute,
+                                'ampm': ampm,
+                                'enabled': True
+                            })
+            elif key == 'days':
+                # Parse days: Monday,Tuesday,Wednesday
+                enabled_days = [d.strip() for d in value.split(',') if d.strip()]
+                for day in WEEKDAYS:
+                    days[day] = day in enabled_days
+    return {'feeding_times': feeding_times, 'days': days}
+
+def format_schedule(schedule):
+    """Inverse of parse_schedule; only enabled times and days are stored."""
+    times_list = []
+    for t in schedule.get('feeding_times', []):
+        if t.get('enabled'):
+            times_list.append("{:02d}:{:02d}:{}".format(t.get('hour', 0), t.get('minute', 0), t.get('ampm', 'AM')))
+    enabled_days = [day for day, enabled in schedule.get('days', {}).items() if enabled]
+    return "times={}\ndays={}\n".format(','.join(times_list), ','.join(enabled_days))
+
+def _parse_calibration(text):
+    parts = text.split(',')
+    return int(parts[0]), int(parts[1])
+
+def _format_calibration(value):
+    return "{},{}".format(value[0], value[1])
+
+# name -> (file, parse(text), format(value), default)
+FIELDS = {
+    'quantity': ('data/quantity.txt', int, str, 0),
+    'last_fed': ('data/last_fed.txt', str, str, None),
+    'next_feed': ('data/next_feed.txt', str, str, ''),
+    'calibration': ('data/calibration.txt', _parse_calibration, _format_calibration, None),
+    'schedule': ('data/schedule.txt', parse_schedule, format_schedule, None),
+}
+
+_values = {}
+_dirty = []
+_dirty_since = 0    # ticks when the first of the current dirty fields changed
+revision = 0
+flushes = 0
+writes = 0
+bytes_written = 0
+
+def _load(name):
+    path, parse, _, default = FIELDS[name]
+    try:
+        with open(path, 'r') as f:
+            _values[name] = parse(f.read().strip())
+    except Exception:
+        # Missing or corrupt file: fall back to the default
+        _values[name] = default
+
+def load():
+    """Read every field from flash. Called once at boot.
+    Falls back to STATE_FORMAT 'text' if the text files can't be migrated.
+    """
+    global FORMAT
+    if FORMAT == 'binary':
+        import state_record
+        values = state_record.load()
+        if values is not None:
+            _values.update(values)
+            return
+        # No valid record yet: migrate from the text files once
+        print('Migrating state from text files to', state_record.RECORD_FILE)
+        for name in FIELDS:
+            _load(name)
+        try:
+            state_record.save(_values)
+        except (OSError, ValueError) as e:
+            # Keep booting on the text files rather than crash
+            print('State migration failed, keeping text files: {}'.format(e))
+            FORMAT = 'text'
+        return
+    for name in FIELDS:
+        _load(name)
+
+def get(name):
+    if name not in _values:
+        _load(name)
+    return _values[name]
+
+def _boot_id():
+    """Random tag so ETags from before a reboot never match."""
+    try:
+        import os
+        return ''.join(['%02x' % b for b in os.urandom(3)])
+    except Exception:
+        return '0'
+
+BOOT_ID = _boot_id()
+
+def set(name, value):
+    """Update a field in RAM; it reaches flash on the next flush()."""
+    global revision, _dirty_since
+    if name in _values and _values[name] == value:
+        return
+    _values[name] = value
+    revision += 1
+    if not _dirty:
+        _dirty_since = ticks.ticks_ms()
+    if name not in _dirty:
+        _dirty.append(name)
+
+def dirty():
+    return list(_dirty)
+
+def flush():
+    """Write dirty fields to flash.
+    Returns: number of files written.
+    """
+    global flushes, writes, bytes_written
+    if FORMAT == 'binary':
+        if not _dirty:
+            return 0
+        import state_record
+        for name in FIELDS:
+            get(name)
+        try:
+            bytes_written += state_record.save(_values)
+        except (OSError, ValueError) as e:
+            print('State flush failed: {}'.format(e))
+            return 0
+        del _dirty[:]
+        flushes += 1
+        writes += 1
+        return 1
+    count = 0
+    while _dirty:
+        name = _dirty[0]
+        path, _, fmt, _ = FIELDS[name]
+        value = _values[name]
+        try:
+            text = fmt(value) if value is not None else ''
+            with open(path, 'w') as f:
+                f.write(text)
+            bytes_written += len(text)
+        except OSError as e:
+            # Leave it dirty and retry on the next flush
+            print('State flush failed for {}: {}'.format(name, e))
+            break
+        _dirty.pop(0)
+        count += 1
+    if count:
+        flushes += 1
+        writes += count
+    return count
+
+def flush_if_due():
+    """Flush once a field has been dirty for FLUSH_SECONDS. For blocking
+    server mode, where no event loop runs the flush task.
+    Returns: number of files written.
+    """
+    if not _dirty or ticks.ticks_diff(ticks.ticks_ms(), _dirty_since) < FLUSH_SECONDS * 1000:
+        return 0
+    print('Flushing state: {}'.format(', '.join(_dirty)))
+    return flush()
+
+async def _flush_task():
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    while True:
+        await asyncio.sleep(FLUSH_SECONDS)
+        if _dirty:
+            print('Flushing state: {}'.format(', '.join(_dirty)))
+            flush()
+
+def start_flush_task():
+    """Start the periodic flush as an asyncio task."""
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    loop = asyncio.get_event_loop()
+    loop.create_task(_flush_task())
+    print("State flush task created")
@@ -0,0 +1,216 @@
+# Binary state record (STATE_FORMAT = 'binary')
+# All fields of the state store packed into one fixed-layout struct with a
+# version byte, a sequence number and a CRC32. data/state.bin holds two slots;
+# each save goes to the slot not holding the newest record, so a write torn by
+# a reset leaves the previous record intact.
+
+import struct
+import state
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+RECORD_FILE = 'data/state.bin'
+VERSION = 1
+MAX_TIMES = 8
+
+# version, seq, flags, quantity, last_fed (y,mo,d,h,mi,s), next_feed (same),
+# duty, pulse, days mask, time count, MAX_TIMES x (hour | 0x80 for PM, minute).
+# Like schedule.txt, only enabled feeding times are stored.
+BODY = '<BHBB' + 'HBBBBB' * 2 + 'HHBB' + 'B' * (MAX_TIMES * 2)
+BODY_SIZE = struct.calcsize(BODY)
+SIZE = BODY_SIZE + 4
+
+# flags
+HAS_LAST_FED = 0x01
+HAS_NEXT_FEED = 0x02
+NEXT_NOT_SCHEDULED = 0x04
+HAS_CALIBRATION = 0x08
+HAS_SCHEDULE = 0x10
+LAST_FED_EMPTY = 0x20
+
+# Largest value each packed field holds: year (H), the other timestamp parts (B)
+ISO_LIMITS = (0xffff, 0xff, 0xff, 0xff, 0xff, 0xff)
+
+# struct.error on CPython; MicroPython's struct has no error class of its own
+PACK_ERROR = getattr(struct, 'error', ValueError)
+
+def _check(name, value, limit):
+    """Raise ValueError unless value fits an unsigned field of at most limit."""
+    if not isinstance(value, int) or not 0 <= value <= limit:
+        raise ValueError('{} out of range: {}'.format(name, value))
+
+def _clamp(value, limit):
+    return max(0, min(limit, int(value)))
+
+def _crc(data):
+    if crc32 is not None:
+        return crc32(data) & 0xffffffff
+    crc = 0xffffffff
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ (0xedb88320 if crc & 1 else 0)
+    return crc ^ 0xffffffff
+
+def _pack_iso(iso):
+    """'YYYY-MM-DDTHH:MM:SS' -> 6 ints, or None if it isn't a timestamp."""
+    try:
+        date_part, time_part = iso.split('T')
+        y, mo, d = date_part.split('-')
+        h, mi, s = time_part.split(':')
+        return [int(y), int(mo), int(d), int(h), int(mi), int(s)]
+    except (ValueError, AttributeError):
+        return None
+
+def _unpack_iso(parts):
+    return "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(*parts)
+
+def enabled_times(schedule):
+    return [t for t in schedule.get('feeding_times', []) if t.get('enabled')]
+
+def encode(values, seq):
+    """Pack a dict of state values into a SIZE-byte record.
+    Quantity and calibration, which come from the API, are clamped to their
+    fields. Raises ValueError if the schedule has more than MAX_TIMES enabled
+    times or a time doesn't fit its field.
+    """
+    flags = 0
+    last_fed = _pack_iso(values.get('last_fed'))
+    if last_fed:
+        flags |= HAS_LAST_FED
+    else:
+        if values.get('last_fed') == '':
+            flags |= LAST_FED_EMPTY
+        last_fed = [0] * 6
+    next_feed = _pack_iso(values.get('next_feed'))
+    if next_feed:
+        flags |= HAS_NEXT_FEED
+    else:
+        if values.get('next_feed') == 'Not scheduled':
+            flags |= NEXT_NOT_SCHEDULED
+        next_feed = [0] * 6
+    calibration = values.get('calibration')
+    if calibration:
+        flags |= HAS_CALIBRATION
+        calibration = (_clamp(calibration[0], 0xffff), _clamp(calibration[1], 0xffff))
+    else:
+        calibration = (0, 0)
+    schedule = values.get('schedule')
+    days = 0
+    times = []
+    if schedule is not None:
+        flags |= HAS_SCHEDULE
+        for i, day in enumerate(state.WEEKDAYS):
+            if schedule['days'].get(day):
+                days |= 1 << i
+        enabled = enabled_times(schedule)
+        if len(enabled) > MAX_TIMES:
+            raise ValueError('more than {} feeding times'.format(MAX_TIMES))
+        for t in enabled:
+            _check('hour', t['hour'], 0x7f)
+            _check('minute', t['minute'], 0xff)
+            times.append(t['hour'] | (0x80 if t['ampm'] == 'PM' else 0))
+            times.append(t['minute'])
+    quantity = _clamp(values.get('quantity') or 0, 0xff)
+    for name, parts in (('last_fed', last_fed), ('next_feed', next_feed)):
+        for part, limit in zip(parts, ISO_LIMITS):
+            _check(name, part, limit)
+    count = len(times) // 2
+    times += [0] * (MAX_TIMES * 2 - len(times))
+    try:
+        body = struct.pack(BODY, VERSION, seq & 0xffff, flags, quantity,
+                           *(last_fed + next_feed + [calibration[0], calibration[1], days, count] + times))
+    except PACK_ERROR as e:
+        raise ValueError('cannot pack state: {}'.format(e))
+    return body + struct.pack('<I', _crc(body))
+
+def decode(record):
+    """Unpack a record. Returns: (seq, values) or None if it fails the CRC or version check."""
+    if len(record) != SIZE:
+        return None
+    body = record[:BODY_SIZE]
+    if struct.unpack('<I', record[BODY_SIZE:])[0] != _crc(body):
+        return None
+    fields = struct.unpack(BODY, body)
+    if fields[0] != VERSION:
+        return None
+    seq, flags, quantity = fields[1], fields[2], fields[3]
+    values = {'quantity': quantity}
+    if flags & HAS_LAST_FED:
+        values['last_fed'] = _unpack_iso(fields[4:10])
+    else:
+        values['last_fed'] = '' if flags & LAST_FED_EMPTY else None
+    if flags & HAS_NEXT_FEED:
+        values['next_feed'] = _unpack_iso(fields[10:16])
+    else:
+        values['next_feed'] = 'Not scheduled' if flags & NEXT_NOT_SCHEDULED else ''
+    values['calibration'] = (fields[16], fields[17]) if flags & HAS_CALIBRATION else None
+    if flags & HAS_SCHEDULE:
+        days = {}
+        for i, day in enumerate(state.WEEKDAYS):
+            days[day] = bool(fields[18] & (1 << i))
+        feeding_times = []
+        times = fields[20:]
+        for i in range(fields[19]):
+            packed = times[i * 2]
+            feeding_times.append({
+                'hour': packed & 0x7f,
+                'minute': times[i * 2 + 1],
+                'ampm': 'PM' if packed & 0x80 else 'AM',
+                'enabled': True
+            })
+        values['schedule'] = {'feeding_times': feeding_times, 'days': days}
+    else:
+        values['schedule'] = None
+    return seq, values
+
+def _newer(a, b):
+    """Sequence comparison that survives the 16-bit wrap."""
+    return 0 < ((a - b) & 0xffff) < 0x8000
+
+# Slot holding the newest valid record and its sequence number
+_slot = None
+_seq = 0
+
+def load():
+    """Read both slots and return the newest valid values, or None."""
+    global _slot, _seq
+    try:
+        with open(RECORD_FILE, 'rb') as f:
+            data = f.read(SIZE * 2)
+    except OSError:
+        return None
+    best = None
+    for slot in (0, 1):
+        decoded = decode(data[slot * SIZE:(slot + 1) * SIZE])
+        if decoded is not None and (best is None or _newer(decoded[0], best[1])):
+            best = (slot, decoded[0], decoded[1])
+    if best is None:
+        return None
+    _slot, _seq = best[0], best[1]
+    return best[2]
+
+def save(values):
+    """Write values into the slot not holding the newest record.
+    Returns: bytes written.
+    """
+    global _slot, _seq
+    seq = (_seq + 1) & 0xffff
+    slot = 0 if _slot != 0 else 1
+    record = encode(values, seq)
+    try:
+        f = open(RECORD_FILE, 'r+b')
+    except OSError:
+        # First save: create both slots, the other one left invalid
+        f = open(RECORD_FILE, 'wb')
+        f.write(bytes(SIZE * 2))
+    try:
+        f.seek(slot * SIZE)
+        f.write(record)
+    finally:
+        f.close()
+    _slot, _seq = slot, seq
+    return len(record)
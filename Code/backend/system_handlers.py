@@ -1,93 +1,166 @@
 # System endpoint handlers
 import gc
-import utime as time
+import gc_policy
+try:
+    import utime as time
+except ImportError:
+    import time
+from router import route
+from json_utils import json_encode
+from http_utils import send_response, send_json
 
-def handle_events(conn, method, query_params):
+# Track server start time for uptime calculation
+SERVER_START_TIME = time.time()
+
+@route('/api/events', methods=('GET', 'DELETE'))
+def handle_events(conn, req):
     """Handle events endpoint"""
-    from json_utils import json_encode
-    from http_utils import send_response
     import event_log_service
-    
-    if method == 'GET':
+
+    if req.method == 'GET':
         # Get optional limit parameter
         limit = 100  # Default to all events
-        if query_params and 'limit' in query_params:
+        if 'limit' in req.query:
             try:
-                limit = int(query_params['limit'])
+                limit = int(req.query['limit'])
             except:
                 pass
-        
-        events = event_log_service.read_events(limit)
-        send_response(conn, '200 OK', 'application/json', json_encode({'events': events}))
-    elif method == 'DELETE':
+
+        # Optional filters: ?type=ERROR&since=2025-11-10T08:00:00
+        event_type = req.query.get('type') or None
+        since = req.query.get('since') or None
+        # ?after=<seq>: only events newer than a previous response's cursor
+        after = None
+        if 'after' in req.query:
+            try:
+                after = int(req.query['after'])
+            except:
+                pass
+
+        try:
+            events = event_log_service.query(event_type, since, limit, after)
+            if after is not None and events and len(events) >= limit:
+                cursor = events[-1]['seq']
+            else:
+                cursor = event_log_service.latest_seq()
+        except Exception as e:
+            print('Error reading events:', e)
+            send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+            gc_policy.maybe_collect('system_handlers.handle_events')
+            return
+        # Outside the try: once the chunked headers are out, a 500 can't follow
+        send_json(conn, req, '200 OK', {'events': events, 'cursor': cursor})
+        del events
+        gc_policy.maybe_collect('system_handlers.handle_events')
+    else:
         # Clear event log
         event_log_service.clear_events()
         send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'message': 'Events cleared'}))
-    else:
-        send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Method not allowed'}))
 
-def handle_ping(conn):
+@route('/api/system/scheduler')
+def handle_system_scheduler(conn, req):
+    """Scheduler wake-up counters and the current deadline"""
+    import scheduler_service
+    import next_feed_service
+    result = {
+        'next_feed': next_feed_service.read_next_feed_iso(),
+        'wakeups': scheduler_service.stats['wakeups'],
+        'signals': scheduler_service.stats['signals'],
+        'feeds': scheduler_service.stats['feeds']
+    }
+    send_response(conn, '200 OK', 'application/json', json_encode(result))
+
+@route('/api/system/time')
+def handle_system_time(conn, req):
+    """Current clock and the last SNTP sync (server, rtt, offset, drift)"""
+    import lib.sntp
+    t = time.localtime()
+    result = {'time': "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(t[0], t[1], t[2], t[3], t[4], t[5])}
+    result.update(lib.sntp.stats)
+    send_response(conn, '200 OK', 'application/json', json_encode(result))
+
+@route('/api/system/boot')
+def handle_system_boot(conn, req):
+    """Boot phase timings for this boot and the one before it"""
+    import boot_trace
+    previous = boot_trace.previous()
+    body = '{"current": ' + json_encode(boot_trace.profile()) + ', "previous": ' + (previous or 'null') + '}'
+    send_response(conn, '200 OK', 'application/json', body)
+    del body, previous
+    gc_policy.maybe_collect('system_handlers.handle_system_boot')
+
+@route('/api/ping', '/api/status')
+def handle_ping(conn, req):
     """Handle ping/status endpoint"""
-    from json_utils import json_encode
-    from http_utils import send_response
-    
     send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'message': 'Server is running'}))
+    gc_policy.maybe_collect('system_handlers.handle_ping')
 
-def handle_system_memory(conn, method):
+@route('/api/system/memory')
+def handle_system_memory(conn, req):
     """Handle system memory status"""
-    from json_utils import json_encode
-    from http_utils import send_response
-    
-    if method == 'GET':
-        try:
-            gc.collect()
-            free_mem = gc.mem_free()
-            send_response(conn, '200 OK', 'application/json', json_encode({'free_memory': free_mem}))
-        except Exception as e:
-            print('Error reading memory:', e)
-            send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-    else:
-        send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
+    try:
+        # A real collection so the reported figure is reachable memory only
+        gc_policy.collect('system_handlers.handle_system_memory')
+        free_mem = gc.mem_free()
+        send_response(conn, '200 OK', 'application/json', json_encode({'free_memory': free_mem}))
+        del free_mem
+        gc_policy.maybe_collect('system_handlers.handle_system_memory')
+    except Exception as e:
+        print('Error reading memory:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+        gc_policy.maybe_collect('system_handlers.handle_system_memory')
+
+@route('/api/system/gc', methods=('GET', 'DELETE'))
+def handle_system_gc(conn, req):
+    """Handle garbage collection statistics (DELETE resets the counters)"""
+    if req.method == 'DELETE':
+        gc_policy.reset_stats()
+    send_response(conn, '200 OK', 'application/json', json_encode(gc_policy.stats()))
 
-def handle_system_uptime(conn, method, server_start_time):
+@route('/api/system/uptime')
+def handle_system_uptime(conn, req):
     """Handle system uptime"""
-    from json_utils import json_encode
-    from http_utils import send_response
-    
-    if method == 'GET':
-        try:
-            uptime_seconds = int(time.time() - server_start_time)
-            send_response(conn, '200 OK', 'application/json', json_encode({'uptime': uptime_seconds}))
-        except Exception as e:
-            print('Error reading uptime:', e)
-            send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-    else:
-        send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
+    try:
+        uptime_seconds = int(time.time() - SERVER_START_TIME)
+        send_response(conn, '200 OK', 'application/json', json_encode({'uptime': uptime_seconds}))
+        del uptime_seconds
+        gc_policy.maybe_collect('system_handlers.handle_system_uptime')
+    except Exception as e:
+        print('Error reading uptime:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+        gc_policy.maybe_collect('system_handlers.handle_system_uptime')
 
-def handle_config(conn, method):
+@route('/api/config')
+def handle_config(conn, req):
     """Handle configuration endpoint"""
-    from json_utils import json_encode
-    from http_utils import send_response
-    
-    if method == 'GET':
-        try:
-            import config
-            result = {
-                'ntfy_topic': config.NTFY_TOPIC if hasattr(config, 'NTFY_TOPIC') else 'N/A',
-                'ntfy_server': config.NTFY_SERVER if hasattr(config, 'NTFY_SERVER') else 'N/A'
-            }
-            send_response(conn, '200 OK', 'application/json', json_encode(result))
-        except Exception as e:
-            print('Error reading config:', e)
-            send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
-    else:
-        send_response(conn, '405 Method Not Allowed', 'application/json', json_encode({'error': 'Only GET allowed'}))
+    try:
+        import config
+        result = {
+            'ntfy_topic': config.NTFY_TOPIC if hasattr(config, 'NTFY_TOPIC') else 'N/A',
+            'ntfy_server': config.NTFY_SERVER if hasattr(config, 'NTFY_SERVER') else 'N/A'
+        }
+        send_response(conn, '200 OK', 'application/json', json_encode(result))
+        del result
+        gc_policy.maybe_collect('system_handlers.handle_config')
+    except Exception as e:
+        print('Error reading config:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'error': str(e)}))
+        gc_policy.maybe_collect('system_handlers.handle_config')
 
-def handle_reboot(conn):
+@route('/api/system/reboot', methods=('POST',))
+def handle_reboot(conn, req):
     """Handle reboot endpoint"""
-    from json_utils import json_encode
-    from http_utils import send_response
-    import machine
-    
-    send_response(conn, '200 OK', 'application/json', json_encode({'status': 'ok', 'message': 'Rebooting...'}))
-    machine.reset()
+    try:
+        send_response(conn, '200 OK', 'application/json', json_encode({'success': True, 'message': 'Rebooting...'}))
+        gc_policy.maybe_collect('system_handlers.handle_reboot')
+        # Save pending state before the reset
+        import state
+        state.flush()
+        # Reboot after sending response
+        import machine
+        time.sleep(1)
+        machine.reset()
+    except Exception as e:
+        print('Reboot error:', e)
+        send_response(conn, '500 Internal Server Error', 'application/json', json_encode({'success': False, 'error': str(e)}))
+        gc_policy.maybe_collect('system_handlers.handle_reboot')
@@ -0,0 +1,99 @@
+"""
+Energy model for the battery build.
+Simulates a week of battery.plan() wake cycles for a few schedules and
+reports awake milliseconds per day and estimated runtime on 4 AA cells,
+compared with the always-on API build and with plain timer polling.
+Runs under MicroPython or CPython (no hardware required).
+"""
+
+try:
+    import utime as time
+except ImportError:
+    import time
+import state
+import schedule_compiler
+import battery
+
+# Model constants (ESP8266 with the radio off, DS3231 on a coin cell)
+BOOT_MS = 450           # Reset to main.py
+WAKE_MS = 120           # DS3231 read, state load, plan, alarm, flush
+FEED_MS = 250           # Servo pulse plus event log and state writes
+AWAKE_MA = 70.0
+SLEEP_MA = 0.02
+BATTERY_MAH = 2000      # Usable capacity of 4 AA alkaline cells
+DAYS = 7
+
+# 2025-11-10 00:00:00 (a Monday)
+START = time.mktime((2025, 11, 10, 0, 0, 0, 0, 0, -1))
+
+def schedule(times, days=state.WEEKDAYS):
+    feeding_times = []
+    for hour, minute in times:
+        feeding_times.append({'hour': hour % 12 or 12, 'minute': minute,
+                              'ampm': 'PM' if hour >= 12 else 'AM', 'enabled': True})
+    return {'feeding_times': feeding_times, 'days': dict((d, d in days) for d in state.WEEKDAYS)}
+
+def simulate(table, max_sleep_minutes):
+    """Run wake cycles for DAYS days. Returns: (wakes, feeds, awake_ms, feed times)."""
+    battery.MAX_SLEEP_MINUTES = max_sleep_minutes
+    now = START
+    end = START + DAYS * 86400
+    stored = None
+    wakes = feeds = awake_ms = 0
+    fed_at = []
+    while now < end:
+        wakes += 1
+        feed_now, stored, sleep_ms = battery.plan(table, now, stored)
+        awake_ms += BOOT_MS + WAKE_MS
+        if feed_now:
+            feeds += 1
+            awake_ms += FEED_MS
+            fed_at.append(now)
+        if sleep_ms is None:
+            if stored is None:
+                break
+            now = stored
+        else:
+            # The alarm or the timer, whichever comes first
+            now = min(now + sleep_ms // 1000, stored) if stored is not None else now + sleep_ms // 1000
+    return wakes, feeds, awake_ms, fed_at
+
+def report(label, wakes, awake_ms_per_day):
+    sleep_ms = 86400000 - awake_ms_per_day
+    mah_per_day = (awake_ms_per_day * AWAKE_MA + sleep_ms * SLEEP_MA) / 3600000
+    print("  {:<28} {:>5.1f} wakes/day {:>10.0f} ms awake/day {:>8.2f} mAh/day {:>7.0f} days".format(
+        label, wakes, awake_ms_per_day, mah_per_day, BATTERY_MAH / mah_per_day))
+
+def test_feeds_on_time():
+    print("\n=== Feeds Happen At Scheduled Times ===")
+    table = schedule_compiler.compile(schedule([(8, 0), (20, 0)], ('Monday', 'Wednesday', 'Friday')))
+    for max_sleep in (0, 30):
+        wakes, feeds, _, fed_at = simulate(table, max_sleep)
+        expected = [START + offset * 60 for offset in table]
+        assert fed_at == expected, (max_sleep, fed_at, expected)
+    print("  OK")
+
+def test_energy_model():
+    print("\n=== Energy Model ({} days) ===".format(DAYS))
+    report('API build (always awake)', 0, 86400000)
+    for label, sched in (('2 feeds/day', schedule([(8, 0), (20, 0)])),
+                         ('4 feeds/day', schedule([(7, 0), (11, 30), (16, 0), (21, 0)])),
+                         ('1 feed, weekdays', schedule([(9, 0)], state.WEEKDAYS[:5]))):
+        table = schedule_compiler.compile(sched)
+        print("  {}:".format(label))
+        for name, max_sleep in (('30 min timer (default)', 30), ('alarm + 6 h timer', 360), ('DS3231 alarm only', 0)):
+            wakes, feeds, awake, _ = simulate(table, max_sleep)
+            assert feeds == len(table)
+            report('  ' + name, wakes / DAYS, awake / DAYS)
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Battery Mode Simulation")
+    print("=" * 60)
+
+    test_feeds_on_time()
+    test_energy_model()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
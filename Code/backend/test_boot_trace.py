@@ -0,0 +1,109 @@
+"""
+Test for the boot phase tracer (boot_trace.py) and /api/system/boot.
+Marks phases, checks the profile, then simulates two boots to check that
+finish() keeps the previous profile and that the endpoint serves both.
+Runs under MicroPython or CPython (no hardware required); profiles are
+written to a scratch directory, never to data/.
+"""
+
+import os
+import boot_trace
+from json_utils import parse_simple_json
+
+SCRATCH = 'boot_trace_test'
+
+class NullConn:
+    keep_alive = False
+
+    def __init__(self):
+        self.data = b''
+
+    def send(self, data):
+        self.data += bytes(data)
+        return len(data)
+
+def setup_module():
+    try:
+        os.mkdir(SCRATCH)
+    except OSError:
+        pass
+    boot_trace.PROFILE_FILE = SCRATCH + '/boot_profile.json'
+    boot_trace.PREVIOUS_FILE = SCRATCH + '/boot_profile.prev.json'
+
+def teardown_module():
+    for path in (boot_trace.PROFILE_FILE, boot_trace.PREVIOUS_FILE):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    os.rmdir(SCRATCH)
+
+def new_boot():
+    """Reset the tracer as if the module had just been imported."""
+    boot_trace._count = 0
+    boot_trace._finished = False
+    boot_trace.mark('reset')
+
+def test_profile():
+    print("\n=== Testing Profile ===")
+    new_boot()
+    for name in ('rtc', 'wifi', 'state'):
+        boot_trace.mark(name)
+    profile = boot_trace.profile()
+    names = [p['phase'] for p in profile['phases']]
+    assert names == ['reset', 'rtc', 'wifi', 'state'], names
+    assert profile['total_ms'] == profile['phases'][-1]['at_ms']
+    assert sum(p['ms'] for p in profile['phases']) == profile['total_ms']
+    print("  {} phases, {} ms total OK".format(len(names), profile['total_ms']))
+
+    for i in range(boot_trace.MAX_PHASES + 4):
+        boot_trace.mark('extra {}'.format(i))
+    assert len(boot_trace.profile()['phases']) == boot_trace.MAX_PHASES
+    print("  marks past MAX_PHASES dropped OK")
+
+def test_finish():
+    print("\n=== Testing Finish Across Two Boots ===")
+    new_boot()
+    boot_trace.mark('first')
+    boot_trace.finish()
+    boot_trace.finish()
+    assert boot_trace.previous() is None
+    with open(boot_trace.PROFILE_FILE) as f:
+        first = parse_simple_json(f.read())
+    assert [p['phase'] for p in first['phases']] == ['reset', 'first', 'listening']
+    print("  first boot written once OK")
+
+    new_boot()
+    boot_trace.mark('second')
+    boot_trace.finish()
+    assert parse_simple_json(boot_trace.previous()) == first
+    print("  second boot kept the first as previous OK")
+
+def test_endpoint():
+    print("\n=== Testing /api/system/boot ===")
+    import system_handlers
+    conn = NullConn()
+    system_handlers.handle_system_boot(conn, None)
+    head, _, body = conn.data.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 200 OK')
+    result = parse_simple_json(body.decode())
+    assert [p['phase'] for p in result['current']['phases']] == ['reset', 'second', 'listening']
+    assert [p['phase'] for p in result['previous']['phases']] == ['reset', 'first', 'listening']
+    print("  current and previous profiles served OK")
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Boot Trace Test Suite")
+    print("=" * 60)
+
+    setup_module()
+    try:
+        test_profile()
+        test_finish()
+        test_endpoint()
+    finally:
+        teardown_module()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
@@ -0,0 +1,218 @@
+"""
+Test and benchmark for the ring-buffer event log.
+Checks wrap-around, migration from the old line-based log, the type and
+time indexes behind query(), sequence number cursors, and logs 10,000 events with the old read-all/rewrite-all implementation and the ring.
+Runs under MicroPython or CPython (no hardware required); uses a scratch
+directory.
+"""
+
+import os
+import ticks
+import event_log_service as log
+
+SCRATCH = 'event_test'
+EVENTS = 10000
+
+def setup_module():
+    for path in (SCRATCH, SCRATCH + '/data'):
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass
+    os.chdir(SCRATCH)
+
+def teardown_module():
+    for name in (log.LOG_FILE, log.LEGACY_LOG_FILE):
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+    os.chdir('..')
+    os.rmdir(SCRATCH + '/data')
+    os.rmdir(SCRATCH)
+
+def fresh():
+    """Start from an empty log."""
+    try:
+        os.remove(log.LOG_FILE)
+    except OSError:
+        pass
+    log._head = None
+    log._count = 0
+    log._next_seq = 1
+    log._reset_index()
+
+def legacy_log_event(event_type, details=''):
+    """The previous log_event: read every line, append, trim, rewrite the file."""
+    entry = "2025-01-01T08:00:00,{},{}".format(event_type, details)
+    entries = []
+    try:
+        with open(log.LEGACY_LOG_FILE, 'r') as f:
+            entries = [line.strip() for line in f.readlines() if line.strip()]
+    except OSError:
+        pass
+    entries.append(entry)
+    if len(entries) > log.MAX_ENTRIES:
+        entries = entries[-log.MAX_ENTRIES:]
+    with open(log.LEGACY_LOG_FILE, 'w') as f:
+        for e in entries:
+            f.write(e + '\n')
+
+def test_ring():
+    print("\n=== Testing Ring Wrap-Around ===")
+    fresh()
+    for i in range(log.MAX_ENTRIES + 25):
+        log.log_event(log.EVENT_FEED_SCHEDULED, 'feed {}'.format(i))
+    events = log.read_events(10)
+    assert [e['details'] for e in events] == ['feed {}'.format(i) for i in range(115, 125)]
+    assert log.get_event_count() == log.MAX_ENTRIES
+    assert len(log.read_events(500)) == log.MAX_ENTRIES
+    log.log_event(log.EVENT_ERROR, 'x' * 300)
+    assert len(log.read_events(1)[0]['details']) < log.RECORD_SIZE
+    log.clear_events()
+    assert log.read_events() == [] and log.get_event_count() == 0
+    print("  OK")
+
+def test_migration():
+    print("\n=== Testing Migration From events.log ===")
+    fresh()
+    with open(log.LEGACY_LOG_FILE, 'w') as f:
+        for i in range(120):
+            f.write('2025-01-01T08:00:00,FEED_MANUAL,old {}\n'.format(i))
+    events = log.read_events(100)
+    assert len(events) == 100 and events[-1]['details'] == 'old 119'
+    assert events[0]['event_type'] == 'FEED_MANUAL'
+    print("  OK")
+
+def append_at(timestamp, event_type, details):
+    f = log._open()
+    try:
+        log._append(f, '{},{},{}'.format(timestamp, event_type, details))
+    finally:
+        f.close()
+
+def test_query():
+    print("\n=== Testing Indexed Queries ===")
+    fresh()
+    # Two events per hour over 3 days; every fifth one is an error
+    for i in range(log.MAX_ENTRIES + 44):
+        hour = i // 2
+        ts = '2025-11-{:02d}T{:02d}:{:02d}:00'.format(10 + hour // 24, hour % 24, (i % 2) * 30)
+        append_at(ts, log.EVENT_ERROR if i % 5 == 0 else log.EVENT_FEED_SCHEDULED, 'e{}'.format(i))
+    expected = [e for e in log.read_events(log.MAX_ENTRIES) if e['event_type'] == log.EVENT_ERROR]
+    assert len(expected) == 20
+    assert log.get_recent_errors(5) == expected[-5:]
+    assert log.query(log.EVENT_ERROR, limit=50) == expected
+    since = '2025-11-12T10:30:00'
+    assert log.query(since=since, limit=500) == [e for e in log.read_events(500) if e['timestamp'] >= since]
+    assert log.query(log.EVENT_ERROR, '2025-11-12', 3) == [e for e in expected if e['timestamp'] >= '2025-11-12'][-3:]
+    assert log.query(log.EVENT_ERROR, '2026') == []
+    assert log.query('UNKNOWN') == []
+
+    # Rebuilding from flash gives the same answers
+    log._head = None
+    log._reset_index()
+    assert log.get_recent_errors(5) == expected[-5:]
+    assert log.query(since=since, limit=3) == log.read_events(3)
+    print("  OK")
+
+def test_cursor():
+    print("\n=== Testing Sequence Cursors ===")
+    fresh()
+    for i in range(30):
+        log.log_event(log.EVENT_FEED_MANUAL, 'c{}'.format(i))
+    assert [e['seq'] for e in log.read_events(3)] == [28, 29, 30]
+    assert log.latest_seq() == 30
+    assert log.query(after=30) == []
+    page = log.query(limit=5, after=10)
+    assert [e['seq'] for e in page] == [11, 12, 13, 14, 15] and page[0]['details'] == 'c10'
+
+    # Numbers keep increasing across wrap-around; cursors older than the ring start at the oldest entry
+    for i in range(log.MAX_ENTRIES):
+        log.log_event(log.EVENT_ERROR if i % 10 == 0 else log.EVENT_FEED_MANUAL, 'w{}'.format(i))
+    assert log.latest_seq() == 130
+    assert log.query(limit=1, after=0)[0]['seq'] == 31
+    assert [e['seq'] for e in log.query(log.EVENT_ERROR, limit=2, after=50)] == [51, 61]
+    assert [e['seq'] for e in log.query(after=127)] == [128, 129, 130]
+
+    # clear_events() keeps numbering; a cursor from a recreated log matches everything
+    log.clear_events()
+    log.log_event(log.EVENT_RESTART, 'after clear')
+    assert log.query(after=130)[0]['seq'] == 131
+    assert len(log.query(after=5000)) == 1
+
+    # An EVL1 ring from before sequence numbers is converted in place
+    fresh()
+    import struct
+    with open(log.LOG_FILE, 'wb') as f:
+        f.write(struct.pack(log.V1_HEADER, log.V1_MAGIC, 2, 2))
+        f.write(log._encode('2025-01-01T08:00:00,FEED_MANUAL,v1 a'))
+        f.write(log._encode('2025-01-01T09:00:00,ERROR,v1 b'))
+    events = log.query(after=0)
+    assert [(e['seq'], e['details']) for e in events] == [(1, 'v1 a'), (2, 'v1 b')]
+    assert log.get_recent_errors()[0]['details'] == 'v1 b'
+    print("  OK")
+
+def quiet(fn, *args):
+    """Call fn with print() silenced."""
+    import builtins
+    saved = builtins.print
+    builtins.print = lambda *a, **k: None
+    try:
+        return fn(*args)
+    finally:
+        builtins.print = saved
+
+def bench(fn, count):
+    start = ticks.ticks_ms()
+    for i in range(count):
+        fn(log.EVENT_FEED_SCHEDULED, 'Scheduled feeding {}'.format(i))
+    return ticks.ticks_diff(ticks.ticks_ms(), start)
+
+def report(label, elapsed, count):
+    print("  {:<7} {:>6} events {:>7} ms  {:>8.3f} ms/event".format(label, count, elapsed, elapsed / count))
+    return elapsed / count
+
+def test_append_benchmark():
+    print("\n=== Append Benchmark ===")
+    fresh()
+    try:
+        os.remove(log.LEGACY_LOG_FILE)
+    except OSError:
+        pass
+    before = report('legacy', bench(legacy_log_event, EVENTS), EVENTS)
+    after = report('ring', quiet(bench, log.log_event, EVENTS), EVENTS)
+    print("  speedup: {:.1f}x".format(before / after))
+    start = ticks.ticks_ms()
+    for _ in range(100):
+        log.read_events(10)
+    print("  read_events(10): {:.3f} ms".format(ticks.ticks_diff(ticks.ticks_ms(), start) / 100))
+    for i in range(0, 200, 10):
+        quiet(log.log_event, log.EVENT_ERROR, 'error {}'.format(i))
+    start = ticks.ticks_ms()
+    for _ in range(100):
+        log.get_recent_errors(10)
+    print("  get_recent_errors(10): {:.3f} ms".format(ticks.ticks_diff(ticks.ticks_ms(), start) / 100))
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Event Log Test Suite")
+    print("=" * 60)
+
+    setup_module()
+    try:
+        quiet(test_ring)
+        print("  ring OK")
+        quiet(test_migration)
+        print("  migration OK")
+        quiet(test_query)
+        print("  query OK")
+        quiet(test_cursor)
+        print("  cursor OK")
+        test_append_benchmark()
+    finally:
+        teardown_module()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
@@ -0,0 +1,145 @@
+"""
+Test for the feed job queue (feed_jobs.py) and POST /api/feednow.
+Checks that jobs run on the background worker inside an event loop, and
+that in blocking server mode, or with no running loop, a feed runs before
+the request returns instead of leaving a job that never runs.
+Host-only (CPython): the servo is replaced by a counter, and the event log
+goes to a scratch directory.
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+# Host stand-ins for the MicroPython-only modules the feed path imports
+sys.modules.setdefault('utime', time)
+
+class FakeServo:
+    """Takes the place of calibration_service, which needs machine.PWM."""
+
+    def __init__(self):
+        self.feeds = 0
+
+    def disburseFood(self):
+        self.feeds += 1
+        return True
+
+    async def disburseFoodAsync(self):
+        await asyncio.sleep(0.01)
+        return self.disburseFood()
+
+servo = FakeServo()
+sys.modules['calibration_service'] = servo
+
+import state
+import feed_jobs
+import lib.notification
+from http_utils import Request
+
+SCRATCH = 'feed_jobs_test'
+notifications = []
+send_ntfy_notification = lib.notification.send_ntfy_notification
+
+def setup_module():
+    for path in (SCRATCH, SCRATCH + '/data'):
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass
+    os.chdir(SCRATCH)
+    lib.notification.send_ntfy_notification = notifications.append
+
+def teardown_module():
+    lib.notification.send_ntfy_notification = send_ntfy_notification
+    for name in os.listdir('data'):
+        os.remove('data/' + name)
+    os.chdir('..')
+    os.rmdir(SCRATCH + '/data')
+    os.rmdir(SCRATCH)
+
+def reset(blocking=False):
+    """Forget every job and the worker, as after a reboot."""
+    del feed_jobs._jobs[:]
+    del feed_jobs._queue[:]
+    feed_jobs._worker = None
+    feed_jobs._wake = None
+    feed_jobs.set_blocking(blocking)
+    servo.feeds = 0
+    del notifications[:]
+    state._values['quantity'] = 10
+
+class NullConn:
+    keep_alive = False
+
+    def __init__(self):
+        self.data = b''
+
+    def send(self, data):
+        self.data += bytes(data)
+        return len(data)
+
+def post_feednow():
+    """Call the /api/feednow handler. Returns: (status line, job_id)."""
+    import api
+    from json_utils import parse_simple_json
+    conn = NullConn()
+    api.feed_now(conn, Request('POST', '/api/feednow'))
+    head, _, body = conn.data.partition(b'\r\n\r\n')
+    return head.split(b'\r\n')[0].decode(), parse_simple_json(body.decode())
+
+def test_blocking_mode():
+    print("\n=== Testing Blocking Server Mode ===")
+    reset(blocking=True)
+    status, result = post_feednow()
+    assert status == 'HTTP/1.1 200 OK', status
+    assert result['status'] == feed_jobs.DONE and servo.feeds == 1, result
+    assert state.get('quantity') == 9 and len(notifications) == 1
+    print("  fed before the response: {} OK".format(status))
+
+    status, again = post_feednow()
+    assert again['coalesced'] and again['job_id'] == result['job_id'] and servo.feeds == 1
+    assert feed_jobs.get(result['job_id']).status == feed_jobs.DONE
+    assert not feed_jobs._queue and feed_jobs._worker is None
+    print("  repeat request coalesced into the finished job OK")
+
+def test_no_running_loop():
+    print("\n=== Testing No Running Event Loop ===")
+    reset()
+    job, created = feed_jobs.submit(feed_jobs.SOURCE_MANUAL)
+    assert created and job.status == feed_jobs.DONE and servo.feeds == 1
+    assert feed_jobs._worker is None and not feed_jobs._queue
+    print("  job ran synchronously instead of failing OK")
+
+async def run_worker():
+    job, created = feed_jobs.submit(feed_jobs.SOURCE_MANUAL)
+    assert created and job.status == feed_jobs.QUEUED and servo.feeds == 0
+    while job.status != feed_jobs.DONE:
+        await asyncio.sleep(0.01)
+    feed_jobs._worker.cancel()
+    return job
+
+def test_worker():
+    print("\n=== Testing Background Worker ===")
+    reset()
+    job = asyncio.run(run_worker())
+    assert servo.feeds == 1 and job.quantity == 9
+    print("  queued, then fed by the worker OK")
+    reset()
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Feed Job Test Suite")
+    print("=" * 60)
+
+    setup_module()
+    try:
+        test_blocking_mode()
+        test_no_running_loop()
+        test_worker()
+    finally:
+        teardown_module()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
@@ -0,0 +1,215 @@
+"""
+Benchmark for the static file sender.
+Compares the old read(512) + gc.collect() loop with http_utils.send_file
+over a socket stand-in that accepts short writes, then serves a file in
+stream mode to a slow reader and measures how much of it the writer queues,
+and checks that a full non-blocking socket is waited on, not spun on.
+Runs under MicroPython or CPython (no hardware required); the stream mode
+test needs asyncio.
+"""
+
+import gc
+import ticks
+import http_utils
+
+FILES = ['UI/index.html', 'UI/css/styles.css', 'UI/assets/images/Header.png']
+ROUNDS = 20
+
+class FakeSocket:
+    """Accepts at most max_write bytes per send() like a full TCP send buffer."""
+
+    def __init__(self, max_write=1024):
+        self.max_write = max_write
+        self.received = 0
+
+    def send(self, data):
+        n = min(len(data), self.max_write)
+        self.received += n
+        return n
+
+def legacy_send(conn, path):
+    """The loop serve_static used before send_file."""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(512)
+            if not chunk:
+                break
+            conn.send(chunk)
+            gc.collect()
+
+class FullOnce:
+    """Real socket whose first send() reports a full buffer (returns None)."""
+
+    def __init__(self, sock, full=1):
+        self.sock = sock
+        self.full = full
+        self.calls = 0
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, data):
+        self.calls += 1
+        if self.calls <= self.full:
+            return None
+        return self.sock.send(data)
+
+def test_full_send_buffer():
+    """send_all must poll() for POLLOUT after a None from send(), not retry at once."""
+    print("\n=== Testing Full Send Buffer ===")
+    import socket
+    a, b = socket.socketpair()
+    try:
+        conn = FullOnce(a)
+        assert http_utils.send_all(conn, b'x' * 100) == 100
+        assert conn.calls == 2, conn.calls
+        print("  one poll() then one send() OK")
+
+        # Peer never reads: the wait gives up instead of spinning forever
+        a.setblocking(False)
+        try:
+            while True:
+                a.send(b'x' * 4096)
+        except OSError:
+            pass
+        timeout = http_utils.SEND_TIMEOUT_MS
+        http_utils.SEND_TIMEOUT_MS = 100
+        conn = FullOnce(a, full=1000)
+        start = ticks.ticks_ms()
+        try:
+            http_utils.send_all(conn, b'x' * 100)
+            assert False, 'send_all returned'
+        except OSError:
+            pass
+        finally:
+            http_utils.SEND_TIMEOUT_MS = timeout
+        elapsed = ticks.ticks_diff(ticks.ticks_ms(), start)
+        assert conn.calls == 1 and elapsed >= 100, (conn.calls, elapsed)
+        print("  gave up after {} ms and 1 send() OK".format(elapsed))
+    finally:
+        a.close()
+        b.close()
+
+def file_size(path):
+    with open(path, 'rb') as f:
+        return len(f.read())
+
+def test_short_writes():
+    """send_file must deliver every byte even when send() is partial."""
+    print("\n=== Testing Short Writes ===")
+    for path in FILES:
+        conn = FakeSocket(max_write=100)
+        sent = http_utils.send_file(conn, path)
+        assert sent == conn.received == file_size(path), path
+        print("  {:<32} {:>6} bytes OK".format(path, sent))
+
+def bench(label, sender, path):
+    size = file_size(path)
+    start = ticks.ticks_ms()
+    for _ in range(ROUNDS):
+        sender(FakeSocket(), path)
+    elapsed = max(1, ticks.ticks_diff(ticks.ticks_ms(), start))
+    rate = size * ROUNDS / elapsed  # bytes/ms == KB/s
+    print("  {:<9} {:<32} {:>6} ms  {:>8.0f} KB/s".format(label, path, elapsed, rate))
+    return rate
+
+def test_throughput_benchmark():
+    print("\n=== Throughput Benchmark ({} rounds, chunk {} bytes) ===".format(ROUNDS, http_utils.SEND_CHUNK))
+    for path in FILES:
+        old = bench('legacy', legacy_send, path)
+        new = bench('send_file', http_utils.send_file, path)
+        print("  speedup: {:.1f}x".format(new / old))
+
+async def serve_slowly(send_body):
+    """Serve FILES[2] to a client that reads 512 bytes every 5 ms.
+    Returns: (bytes received, most bytes queued in the writer at once)
+    """
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    import socket
+    import api
+    path = FILES[2]
+    peak = [0]
+
+    def queued(writer):
+        # CPython transport buffer, or uasyncio's out_buf
+        if hasattr(writer, 'transport'):
+            return writer.transport.get_write_buffer_size()
+        return len(writer.out_buf)
+
+    async def handle(reader, writer):
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            # Small kernel buffers, so the file can't all vanish into them
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048)
+        conn = api.StreamConnection(writer)
+        write = writer.write
+
+        def write_and_measure(data):
+            write(data)
+            peak[0] = max(peak[0], queued(writer))
+        writer.write = write_and_measure
+        await send_body(conn, path)
+        await conn.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    client = socket.socket()
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2048)
+    client.connect(('127.0.0.1', port))
+    client.setblocking(False)
+    reader, writer = await asyncio.open_connection(sock=client)
+    received = 0
+    while True:
+        data = await reader.read(512)
+        if not data:
+            break
+        received += len(data)
+        await asyncio.sleep(0.005)
+    writer.close()
+    server.close()
+    return received, peak[0]
+
+async def buffered_body(conn, path):
+    """What stream mode did before: write every chunk, then drain once."""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(http_utils.SEND_CHUNK)
+            if not chunk:
+                break
+            conn.send(chunk)
+    await conn.drain()
+
+async def streamed_body(conn, path):
+    http_utils.send_file(conn, path)
+    await conn.write_body()
+
+def test_stream_mode():
+    print("\n=== Stream Mode: Bytes Queued In The Writer ({}) ===".format(FILES[2]))
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    size = file_size(FILES[2])
+    for label, send_body in (('write all, drain once', buffered_body), ('drain per chunk', streamed_body)):
+        received, peak = asyncio.run(serve_slowly(send_body))
+        assert received == size, (label, received, size)
+        print("  {:<22} peak queued {:>6} bytes".format(label, peak))
+    assert peak <= http_utils.SEND_CHUNK, peak
+    assert len(http_utils._send_pool) == http_utils.SEND_BUFFERS
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("File Sender Test Suite")
+    print("=" * 60)
+
+    test_short_writes()
+    test_full_send_buffer()
+    test_throughput_benchmark()
+    test_stream_mode()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
@@ -0,0 +1,67 @@
+"""
+Test and benchmark for the garbage collection policy.
+Dispatches requests through api.handle_request with collection at every
+call site (the old behaviour) and with the watermark policy, and reports
+collections and latency per request.
+Runs under MicroPython or CPython (no hardware required).
+"""
+
+import gc_policy
+from http_utils import Request
+import api
+
+ROUNDS = 20
+PATHS = ['/api/ping', '/api/quantity', '/api/schedule', '/api/config',
+         '/api/system/uptime', '/css/styles.css', '/index.html']
+
+class NullConn:
+    keep_alive = False
+
+    def send(self, data):
+        return len(data)
+
+def run(label, always):
+    gc_policy.ALWAYS_COLLECT = always
+    gc_policy.reset_stats()
+    for _ in range(ROUNDS):
+        for path in PATHS:
+            api.handle_request(NullConn(), Request('GET', path))
+    stats = gc_policy.stats()
+    print("  {:<10} {:>5.2f} collections/request  {:>6.2f} ms/request  ({} collections, {} ms collecting)".format(
+        label, stats['collections_per_request'], stats['ms_per_request'], stats['collections'], stats['collect_ms']))
+    return stats
+
+def test_site_counters():
+    """Every maybe_collect call is attributed to its call site."""
+    print("\n=== Testing Call Site Counters ===")
+    gc_policy.ALWAYS_COLLECT = True
+    gc_policy.reset_stats()
+    gc_policy.maybe_collect('test.a')
+    gc_policy.maybe_collect('test.a')
+    gc_policy.maybe_collect('test.b')
+    stats = gc_policy.stats()
+    assert stats['calls'] == 3 and stats['collections'] == 3
+    assert stats['sites']['test.a'] == {'calls': 2, 'collections': 2}
+    print("  OK")
+
+def test_request_benchmark():
+    print("\n=== Per-Request GC Benchmark ({} rounds x {} paths) ===".format(ROUNDS, len(PATHS)))
+    before = run('always', True)
+    after = run('watermark', False)
+    assert after['collections'] <= before['collections']
+    print("\n  Busiest call sites (always):")
+    sites = sorted(before['sites'].items(), key=lambda item: -item[1]['collections'])
+    for reason, site in sites[:5]:
+        print("    {:<40} {:>5}".format(reason, site['collections']))
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("GC Policy Test Suite")
+    print("=" * 60)
+
+    test_site_counters()
+    test_request_benchmark()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
@@ -0,0 +1,146 @@
+"""
+Test for the incremental request parser (http_parser.py).
+Feeds requests into pooled buffers the way the servers do, in pieces, and
+checks split reads, bodies that arrive across reads, pipelining, the 413 and
+400 paths, and that a browser's schedule POST fits the default buffer.
+Runs under MicroPython or CPython (no hardware required).
+"""
+
+import http_parser
+from http_parser import RequestParser, NEED_DATA, COMPLETE, TOO_LARGE, BAD_REQUEST
+
+# What Chrome sends for the Save button on setschedule.html
+BROWSER_HEADERS = (
+    b'POST /api/schedule HTTP/1.1\r\n'
+    b'Host: 192.168.1.23\r\n'
+    b'Connection: keep-alive\r\n'
+    b'Content-Length: {length}\r\n'
+    b'sec-ch-ua-platform: "Windows"\r\n'
+    b'User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    b'(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36\r\n'
+    b'sec-ch-ua: "Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"\r\n'
+    b'Content-Type: application/json\r\n'
+    b'sec-ch-ua-mobile: ?0\r\n'
+    b'Accept: */*\r\n'
+    b'Origin: http://192.168.1.23\r\n'
+    b'Referer: http://192.168.1.23/setschedule.html\r\n'
+    b'Accept-Encoding: gzip, deflate\r\n'
+    b'Accept-Language: en-GB,en-US;q=0.9,en;q=0.8\r\n'
+    b'\r\n'
+)
+# JSON.stringify({feeding_times, days}) with three times, as the page builds it
+BROWSER_BODY = (
+    b'{"feeding_times":[{"enabled":true,"hour":8,"minute":0,"ampm":"AM"},'
+    b'{"enabled":false,"hour":12,"minute":30,"ampm":"PM"},'
+    b'{"enabled":true,"hour":8,"minute":0,"ampm":"PM"}],'
+    b'"days":{"Monday":true,"Tuesday":true,"Wednesday":true,"Thursday":true,'
+    b'"Friday":true,"Saturday":false,"Sunday":false}}'
+)
+
+def browser_post():
+    return BROWSER_HEADERS.replace(b'{length}', str(len(BROWSER_BODY)).encode()) + BROWSER_BODY
+
+def feed(parser, data):
+    """Copy data into the parser's free space the way readinto() does."""
+    space = parser.space()
+    space[:len(data)] = data
+    return parser.feed(len(data))
+
+def test_split_reads():
+    print("\n=== Request Split Across Reads ===")
+    parser = RequestParser(bytearray(http_parser.BUFFER_SIZE))
+    request = b'GET /api/events?type=ERROR&limit=10 HTTP/1.1\r\nHost: feeder\r\nIf-None-Match: "x"\r\n\r\n'
+    # Every split point, including the middle of the blank line
+    for size in (1, 2, 3, 7, 50):
+        parser.reset()
+        state = NEED_DATA
+        for i in range(0, len(request), size):
+            assert state == NEED_DATA, (size, i)
+            state = feed(parser, request[i:i + size])
+        assert state == COMPLETE, size
+        req = parser.request
+        assert req.method == 'GET' and req.path == '/api/events', (req.method, req.path)
+        assert req.query == {'type': 'ERROR', 'limit': '10'}, req.query
+        assert req.headers['if-none-match'] == '"x"'
+        assert len(req.body) == 0
+    print("  OK")
+
+def test_body_across_reads():
+    print("\n=== Body Arriving Across Reads ===")
+    data = browser_post()
+    parser = RequestParser(bytearray(http_parser.BUFFER_SIZE))
+    head = data.index(b'\r\n\r\n') + 4
+    # Headers plus part of the body, then the rest of the body in two reads
+    cuts = (0, head + 10, head + 100, len(data))
+    for i in range(len(cuts) - 1):
+        state = feed(parser, data[cuts[i]:cuts[i + 1]])
+        assert state == (COMPLETE if i == len(cuts) - 2 else NEED_DATA), (i, state)
+    assert bytes(parser.request.body) == BROWSER_BODY
+    print("  OK")
+
+def test_pipelined():
+    print("\n=== Pipelined Requests ===")
+    parser = RequestParser(bytearray(256))
+    assert feed(parser, b'GET /a HTTP/1.1\r\n\r\nPOST /b HTTP/1.1\r\nContent-Length: 2\r\n\r\nhiGET /c HTTP/1.1\r\n\r\n') == COMPLETE
+    paths = [parser.request.path]
+    while True:
+        parser.reset()
+        if parser.pending() != COMPLETE:
+            break
+        paths.append(parser.request.path)
+        if parser.request.path == '/b':
+            assert bytes(parser.request.body) == b'hi'
+    assert paths == ['/a', '/b', '/c'], paths
+    print("  OK")
+
+def test_too_large():
+    print("\n=== 413 Paths ===")
+    # Headers that never end within the buffer
+    parser = RequestParser(bytearray(128))
+    state = feed(parser, b'GET / HTTP/1.1\r\n')
+    while state == NEED_DATA:
+        space = len(parser.space())
+        state = feed(parser, (b'X-Filler: ' + b'a' * 200)[:space])
+    assert state == TOO_LARGE, state
+    # Headers fit but the declared body does not
+    parser = RequestParser(bytearray(128))
+    assert feed(parser, b'POST /api/schedule HTTP/1.1\r\nContent-Length: 500\r\n\r\n{') == TOO_LARGE
+    print("  OK")
+
+def test_malformed():
+    print("\n=== Malformed Requests ===")
+    for data in (b'GARBAGE\r\n\r\n',
+                 b'\r\n\r\n',
+                 b'GET / HTTP/1.1 extra\r\n\r\n',
+                 b'POST /api/schedule HTTP/1.1\r\nContent-Length: abc\r\n\r\n',
+                 b'POST /api/schedule HTTP/1.1\r\nContent-Length: -5\r\n\r\n',
+                 b'GET /\xff\xfe HTTP/1.1\r\n\r\n'):
+        parser = RequestParser(bytearray(128))
+        assert feed(parser, data) == BAD_REQUEST, data
+    print("  OK")
+
+def test_browser_post_fits():
+    print("\n=== Browser Schedule POST vs Default Buffer ===")
+    data = browser_post()
+    print("  {} bytes ({} headers + {} body), buffer {} bytes".format(
+        len(data), len(data) - len(BROWSER_BODY), len(BROWSER_BODY), http_parser.BUFFER_SIZE))
+    assert len(data) < http_parser.BUFFER_SIZE
+    parser = RequestParser(bytearray(http_parser.BUFFER_SIZE))
+    assert feed(parser, data) == COMPLETE
+    print("  OK")
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("HTTP Request Parser Test Suite")
+    print("=" * 60)
+
+    test_split_reads()
+    test_body_across_reads()
+    test_pipelined()
+    test_too_large()
+    test_malformed()
+    test_browser_post_fits()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
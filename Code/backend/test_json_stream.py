@@ -0,0 +1,168 @@
+"""
+Test and benchmark for streaming JSON responses.
+Checks that send_json produces the same document as json_encode, framed as
+HTTP/1.1 chunks, both over a socket stand-in and through the stream-mode
+writer (api.StreamConnection on a real asyncio connection), and compares
+peak heap while answering /api/events with 100 entries.
+Runs under MicroPython or CPython (no hardware required).
+"""
+
+import gc
+import json_utils
+from json_utils import json_encode
+from http_utils import Request, send_response, send_json
+
+EVENT_COUNT = 100
+
+class NullConn:
+    keep_alive = True
+
+    def __init__(self, keep=False):
+        self.keep = keep
+        self.data = bytearray()
+
+    def send(self, data):
+        if self.keep:
+            self.data += data
+        return len(data)
+
+def make_events(count):
+    return [{'timestamp': '2025-01-01T08:{:02d}:00'.format(i % 60),
+             'event_type': 'FEED_SCHEDULED',
+             'details': 'Scheduled feed #{} completed "ok"'.format(i)} for i in range(count)]
+
+def dechunk(raw):
+    """Split a response into headers and the de-chunked body."""
+    head, _, rest = bytes(raw).partition(b'\r\n\r\n')
+    body = b''
+    while True:
+        line, _, rest = rest.partition(b'\r\n')
+        size = int(line, 16)
+        if size == 0:
+            return head, body
+        body += rest[:size]
+        assert rest[size:size + 2] == b'\r\n'
+        rest = rest[size + 2:]
+
+def test_chunked_output():
+    print("\n=== Testing Chunked Output ===")
+    doc = {'events': make_events(EVENT_COUNT)}
+    conn = NullConn(keep=True)
+    send_json(conn, Request('GET', '/api/events', version='HTTP/1.1'), '200 OK', doc)
+    head, body = dechunk(conn.data)
+    assert b'Transfer-Encoding: chunked' in head
+    assert json_utils.parse_simple_json(body.decode()) == doc
+    print("  chunked: {} bytes OK".format(len(body)))
+
+    # Fallback encoder must match json_encode byte for byte
+    saved = json_utils._encode
+    json_utils._encode = json_encode
+    try:
+        assert ''.join(json_utils.iter_json(doc)) == json_encode(doc)
+    finally:
+        json_utils._encode = saved
+    print("  fallback encoder matches json_encode")
+
+    # HTTP/1.0: no chunk framing, connection closes after the body
+    conn = NullConn(keep=True)
+    send_json(conn, Request('GET', '/api/events'), '200 OK', doc)
+    head, _, body = bytes(conn.data).partition(b'\r\n\r\n')
+    assert b'chunked' not in head and b'Connection: close' in head
+    assert json_utils.parse_simple_json(body.decode()) == doc
+    print("  HTTP/1.0 unframed OK")
+
+async def fetch_streamed(doc):
+    """GET a send_json response through api.StreamConnection. Returns the raw response."""
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    import api
+
+    async def handle(reader, writer):
+        await reader.readline()
+        conn = api.StreamConnection(writer)
+        send_json(conn, Request('GET', '/api/events', version='HTTP/1.1'), '200 OK', doc)
+        await conn.drain()
+        await conn.write_body()
+        await conn.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /api/events HTTP/1.1\r\n')
+    await writer.drain()
+    raw = b''
+    while True:
+        data = await reader.read(1024)
+        if not data:
+            break
+        raw += data
+    writer.close()
+    server.close()
+    return raw
+
+def test_stream_writer():
+    """The writer stream mode really uses, not a stand-in with a send() method."""
+    print("\n=== Testing Stream Mode Writer ===")
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    import http_utils
+    doc = {'events': make_events(EVENT_COUNT), 'cursor': EVENT_COUNT}
+    head, body = dechunk(asyncio.run(fetch_streamed(doc)))
+    assert b'Transfer-Encoding: chunked' in head
+    assert json_utils.parse_simple_json(body.decode()) == doc
+    assert len(http_utils._send_pool) == http_utils.SEND_BUFFERS
+    print("  {} bytes through StreamConnection OK".format(len(body)))
+
+def old_events(conn, req, doc):
+    send_response(conn, '200 OK', 'application/json', json_encode(doc))
+
+def new_events(conn, req, doc):
+    send_json(conn, req, '200 OK', doc)
+
+def measure(fn, doc):
+    """Peak bytes allocated while fn runs.
+    CPython: tracemalloc peak. MicroPython: total allocated with the GC
+    disabled, an upper bound on the peak.
+    """
+    req = Request('GET', '/api/events', version='HTTP/1.1')
+    try:
+        import tracemalloc
+        tracemalloc.start()
+        fn(NullConn(), req, doc)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    except ImportError:
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        fn(NullConn(), req, doc)
+        used = gc.mem_alloc() - start
+        gc.enable()
+        return used
+
+def test_peak_heap():
+    print("\n=== /api/events Peak Heap ({} events) ===".format(EVENT_COUNT))
+    doc = {'events': make_events(EVENT_COUNT)}
+    before = measure(old_events, doc)
+    after = measure(new_events, doc)
+    print("  json_encode + send_response: {:>7} bytes".format(before))
+    print("  send_json (streaming):       {:>7} bytes".format(after))
+    assert after < before
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("JSON Stream Test Suite")
+    print("=" * 60)
+
+    test_chunked_output()
+    test_stream_writer()
+    test_peak_heap()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
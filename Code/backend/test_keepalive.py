@@ -0,0 +1,101 @@
+"""
+Keep-alive benchmark for SimpleServer stream mode.
+Host-only (CPython): runs api.app in a background thread and loads the UI
+home page the way a browser does, with and without persistent connections.
+"""
+
+import http.client
+import threading
+import time
+
+import api
+import boot_trace
+import lib.notification
+
+PORT = 5098
+PAGE_LOADS = 20
+
+notifications = []
+send_ntfy_notification = lib.notification.send_ntfy_notification
+
+# Resources fetched for one UI page load
+PAGE = ['/', '/css/styles.css', '/assets/images/Header.png',
+        '/api/ping', '/api/schedule', '/api/config', '/api/system/uptime']
+
+def setup_module():
+    """Start api.app in a background thread."""
+    # Don't push the startup notification to the real ntfy topic
+    lib.notification.send_ntfy_notification = notifications.append
+    # The server writes its boot profile when it starts listening; keep it out of data/
+    boot_trace.PROFILE_FILE = '/tmp/boot_profile_test.json'
+    boot_trace.PREVIOUS_FILE = '/tmp/boot_profile_test.prev.json'
+    thread = threading.Thread(target=api.app.run, kwargs={'host': '127.0.0.1', 'port': PORT}, daemon=True)
+    thread.start()
+    for _ in range(50):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=2)
+            conn.request('GET', '/api/ping')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+def teardown_module():
+    lib.notification.send_ntfy_notification = send_ntfy_notification
+
+def load_page():
+    """Fetch every resource, reconnecting only when the server closes the connection."""
+    conn = None
+    sent = 0
+    for path in PAGE:
+        if conn is None:
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=5)
+        conn.request('GET', path)
+        response = conn.getresponse()
+        sent += len(response.read())
+        if response.getheader('Connection', '').lower() == 'close':
+            conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+    return sent
+
+def run(label, keep_alive):
+    api.KEEPALIVE = keep_alive
+    server = api.app
+    connections = server.connections_accepted
+    requests = server.requests_served
+    start = time.perf_counter()
+    for _ in range(PAGE_LOADS):
+        load_page()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / PAGE_LOADS
+    # Let the server finish counting the last connection
+    time.sleep(0.05)
+    connections = server.connections_accepted - connections
+    requests = server.requests_served - requests
+    print("  {:<12} {:>7.2f} ms/page  {:>3} connections  {:.1f} requests/connection".format(
+        label, elapsed_ms, connections, requests / connections))
+    return connections
+
+def test_keepalive_benchmark():
+    print("\n=== Page Load Benchmark ({} loads, {} resources each) ===".format(PAGE_LOADS, len(PAGE)))
+    before = run('close', False)
+    after = run('keep-alive', True)
+    assert after < before
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Keep-Alive Test Suite")
+    print("=" * 60)
+
+    setup_module()
+    try:
+        test_keepalive_benchmark()
+    finally:
+        teardown_module()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
@@ -0,0 +1,349 @@
+"""
+Test and benchmark for the notification outbox.
+Host-only (CPython): a local stub ntfy server answers after a delay while a
+ticker task measures how long the event loop is stalled, first with the old
+blocking POST and then with the outbox. Also checks that pushes reuse one
+keep-alive connection, that rejected, repeatedly failing and overflowing
+messages are dropped instead of retried forever, that messages are sent
+synchronously over a reused connection when no event loop is running, that
+pushes carry the Title, Priority and Tags headers, and compares per-push latency
+with a new connection each time.
+"""
+
+import asyncio
+import http.client
+import http.server
+import threading
+import time
+
+import config
+import lib.notification as notification
+from lib import http_client
+
+PORT = 5097
+SERVER_DELAY = 0.3
+TICK = 0.01
+PUSHES = 20
+
+received = []
+fail_next = [0]
+fail_status = [500]
+delay = [SERVER_DELAY]
+connections = set()
+headers = []
+
+class StubNtfy(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        connections.add(self.client_address)
+        headers.append(dict(self.headers))
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(delay[0])
+        if fail_next[0]:
+            fail_next[0] -= 1
+            self.send_response(fail_status[0])
+        else:
+            received.append(body.decode())
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+OUTBOX_FILE = '/tmp/outbox_test.txt'
+stub = []
+
+def setup_module():
+    """Start the stub server and keep the outbox file out of data/.
+    Also run by pytest before any test in this module.
+    """
+    if not stub:
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', PORT), StubNtfy)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stub.append(server)
+    config.NTFY_SERVER = 'http://127.0.0.1:{}'.format(PORT)
+    notification.BATCH_MS = 50
+    notification.RETRY_MIN_MS = 100
+    notification.OUTBOX_FILE = OUTBOX_FILE
+    notification._spilled = None
+    teardown_module()
+
+def teardown_module():
+    import os
+    try:
+        os.remove(OUTBOX_FILE)
+    except OSError:
+        pass
+
+def legacy_send(message):
+    """What send_ntfy_notification used to do: a blocking POST (urequests.post)."""
+    conn = http.client.HTTPConnection('127.0.0.1', PORT)
+    conn.request('POST', '/' + config.NTFY_TOPIC, body=message, headers={'Title': 'Auto Feeder'})
+    conn.getresponse().read()
+    conn.close()
+
+class Ticker:
+    """Records the worst delay of a task that wants to run every TICK seconds."""
+
+    def __init__(self):
+        self.worst = 0
+        self.running = True
+
+    async def run(self):
+        while self.running:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            self.worst = max(self.worst, time.perf_counter() - start - TICK)
+
+async def measure(send, messages, settle):
+    ticker = Ticker()
+    task = asyncio.create_task(ticker.run())
+    await asyncio.sleep(0.05)
+    for message in messages:
+        send(message)
+    await settle()
+    ticker.running = False
+    await task
+    return ticker.worst * 1000
+
+async def drained():
+    while notification.pending() or received == []:
+        await asyncio.sleep(0.05)
+
+async def check_stall_benchmark():
+    print("\n=== Event Loop Stall (stub server replies after {} ms) ===".format(int(SERVER_DELAY * 1000)))
+    messages = ['Food disbursed at 08:00:00. Feed remaining: 5',
+                'Remaining food quantity updated to 9',
+                'Schedule updated']
+
+    received.clear()
+    before = await measure(legacy_send, messages, lambda: asyncio.sleep(0.05))
+    pushes_before = len(received)
+
+    received.clear()
+    after = await measure(notification.send_ntfy_notification, messages, drained)
+    print("  blocking POST: {:>7.1f} ms worst stall, {} pushes".format(before, pushes_before))
+    print("  outbox:        {:>7.1f} ms worst stall, {} push".format(after, len(received)))
+    assert len(received) == 1 and received[0].count('\n') == 2
+    assert after < before
+
+async def check_retry_backoff():
+    print("\n=== Testing Retry Backoff ===")
+    received.clear()
+    fail_next[0] = 2
+    failures = notification.stats['failures']
+    notification.send_ntfy_notification('retry me')
+    await drained()
+    assert received == ['retry me']
+    assert notification.stats['failures'] - failures == 2
+    print("  delivered after 2 failed attempts OK")
+
+async def check_offline_spill():
+    print("\n=== Testing Offline Spill ===")
+    received.clear()
+    online = notification._online
+    notification._online = lambda: False
+    try:
+        notification.send_ntfy_notification('while offline')
+        await asyncio.sleep(0.3)
+        assert notification.pending() == 0 and notification._has_spilled()
+        print("  queued message saved to flash")
+    finally:
+        notification._online = online
+    notification._wake.set()
+    await drained()
+    assert received == ['while offline'] and not notification._has_spilled()
+    print("  delivered once back online OK")
+
+async def check_rejected_dropped():
+    print("\n=== Testing 4xx Replies Are Not Retried ===")
+    received.clear()
+    fail_next[0] = 1
+    fail_status[0] = 400
+    failures = notification.stats['failures']
+    dropped = notification.stats['dropped']
+    try:
+        notification.send_ntfy_notification('bad request')
+        while notification.pending():
+            await asyncio.sleep(0.05)
+    finally:
+        fail_status[0] = 500
+    assert received == [] and notification.stats['failures'] == failures
+    assert notification.stats['dropped'] - dropped == 1
+    print("  dropped after one 400 reply OK")
+
+async def check_retry_limit():
+    print("\n=== Testing Retry Limit ===")
+    received.clear()
+    retries = notification.MAX_RETRIES
+    notification.MAX_RETRIES = 3
+    fail_next[0] = 10
+    failures = notification.stats['failures']
+    try:
+        notification.send_ntfy_notification('never delivered')
+        while notification.pending():
+            await asyncio.sleep(0.05)
+    finally:
+        notification.MAX_RETRIES = retries
+        fail_next[0] = 0
+    assert received == [] and notification.stats['failures'] - failures == 3
+    print("  gave up after 3 attempts OK")
+
+async def check_spill_limit():
+    print("\n=== Testing Outbox File Limit ===")
+    received.clear()
+    online = notification._online
+    notification._online = lambda: False
+    spill_max = notification.SPILL_MAX
+    notification.SPILL_MAX = 5
+    try:
+        for i in range(12):
+            notification.send_ntfy_notification('offline {}'.format(i))
+        await asyncio.sleep(0.3)
+        saved = notification._read_spilled()
+        assert saved == ['offline {}'.format(i) for i in range(7, 12)], saved
+        print("  file kept the newest 5 of 12 messages")
+    finally:
+        notification._online = online
+        notification.SPILL_MAX = spill_max
+    notification._wake.set()
+    await drained()
+    assert received == ['\n'.join(saved)]
+    print("  delivered once back online OK")
+
+async def check_reload_bound():
+    print("\n=== Testing Saved Messages Reload In QUEUE_SIZE Batches ===")
+    received.clear()
+    online = notification._online
+    notification._online = lambda: False
+    queue_size = notification.QUEUE_SIZE
+    notification.QUEUE_SIZE = 3
+    peak = [0]
+
+    async def watch():
+        while True:
+            peak[0] = max(peak[0], notification.pending())
+            await asyncio.sleep(0.001)
+    modes = []
+
+    def counting_open(path, mode='r'):
+        modes.append(mode)
+        return open(path, mode)
+    watcher = asyncio.create_task(watch())
+    try:
+        notification.open = counting_open
+        for i in range(8):
+            notification.send_ntfy_notification('saved {}'.format(i))
+        await asyncio.sleep(0.3)
+        del notification.open
+        assert notification.pending() == 0 and notification._spill_count() == 8
+        assert 'w' not in modes and modes.count('a') == 6, modes
+        notification._online = online
+        notification._wake.set()
+        while len(received) < 3:
+            await asyncio.sleep(0.05)
+    finally:
+        notification._online = online
+        notification.QUEUE_SIZE = queue_size
+        watcher.cancel()
+        if hasattr(notification, 'open'):
+            del notification.open
+    assert received == ['saved 0\nsaved 1\nsaved 2', 'saved 3\nsaved 4\nsaved 5', 'saved 6\nsaved 7'], received
+    assert peak[0] <= 3 and not notification._has_spilled(), peak
+    print("  6 appends, no rewrites while saving")
+    print("  8 saved messages sent as 3 pushes, at most {} in RAM OK".format(peak[0]))
+
+def test_without_loop():
+    print("\n=== Testing Send Without An Event Loop ===")
+    received.clear()
+    connections.clear()
+    notification.send_ntfy_notification('no loop yet')
+    assert received == ['no loop yet'] and notification.pending() == 0
+    assert notification._worker is None
+    print("  sent synchronously OK")
+
+    fail_next[0] = 1
+    notification.send_ntfy_notification('first try fails')
+    assert received == ['no loop yet'] and notification._has_spilled()
+    notification.send_ntfy_notification('second try')
+    assert received[1] == 'first try fails\nsecond try' and not notification._has_spilled()
+    print("  failed message saved and sent with the next one OK")
+    assert len(connections) == 1 and notification._client.sock is not None, connections
+    assert headers[-1]['Priority'] == '3' and headers[-1]['Tags'] == 'fish,food', headers[-1]
+    print("  3 blocking sends over 1 keep-alive connection OK")
+    notification._client.close_blocking()
+
+async def check_connection_reuse():
+    print("\n=== Testing Connection Reuse ===")
+    received.clear()
+    connections.clear()
+    for i in range(3):
+        notification.send_ntfy_notification('push {}'.format(i))
+        await drained()
+        received.clear()
+    assert len(connections) == 1, connections
+    print("  3 separate pushes over 1 connection OK")
+    assert headers[-1]['Priority'] == '3' and headers[-1]['Tags'] == 'fish,food', headers[-1]
+    print("  Title, Priority and Tags headers sent OK")
+
+async def push_latency(client):
+    start = time.perf_counter()
+    for i in range(PUSHES):
+        assert await client.post('latency {}'.format(i)) == 200
+    return (time.perf_counter() - start) * 1000 / PUSHES
+
+async def check_latency_benchmark():
+    print("\n=== Per-Push Latency ({} pushes, no server delay) ===".format(PUSHES))
+    delay[0] = 0
+    url = 'http://localhost:{}/{}'.format(PORT, config.NTFY_TOPIC)
+
+    # Old behaviour: resolve and connect for every push
+    http_client.IDLE_MS = 0
+    http_client._dns.clear()
+    ttl = http_client.DNS_TTL_MS
+    http_client.DNS_TTL_MS = 0
+    fresh = http_client.KeepAliveClient(url, {'Title': 'Auto Feeder'})
+    before = await push_latency(fresh)
+    await fresh.close()
+
+    http_client.IDLE_MS = 30000
+    http_client.DNS_TTL_MS = ttl
+    warm = http_client.KeepAliveClient(url, {'Title': 'Auto Feeder'})
+    after = await push_latency(warm)
+    await warm.close()
+    delay[0] = SERVER_DELAY
+    print("  new connection:  {:>6.2f} ms/push  ({} connects)".format(before, fresh.connects))
+    print("  keep-alive:      {:>6.2f} ms/push  ({} connect)".format(after, warm.connects))
+    assert warm.connects == 1
+
+async def main():
+    await check_stall_benchmark()
+    await check_retry_backoff()
+    await check_offline_spill()
+    await check_rejected_dropped()
+    await check_retry_limit()
+    await check_spill_limit()
+    await check_reload_bound()
+    await check_connection_reuse()
+    await check_latency_benchmark()
+
+def test_outbox():
+    asyncio.run(main())
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Notification Outbox Test Suite")
+    print("=" * 60)
+
+    setup_module()
+    try:
+        test_without_loop()
+        test_outbox()
+    finally:
+        teardown_module()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
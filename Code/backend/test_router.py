@@ -0,0 +1,87 @@
+"""
+Test and benchmark for the table-driven router.
+Runs under MicroPython or CPython (no hardware required).
+"""
+
+import ticks
+from router import Router
+
+ITERATIONS = 20000
+
+# Paths in the order the old if/elif chain in api.handle_request tested them
+LEGACY_CHAIN = [
+    '/api/feednow', '/api/feed', '/api/quantity', '/api/home', '/api/ping', '/api/status',
+    '/api/schedule', '/api/schedules', '/api/calibration/get', '/api/events',
+    '/api/system/memory', '/api/system/uptime', '/api/config', '/api/calibration',
+    '/api/calibration/save', '/api/calibration/adjust_duty', '/api/calibration/adjust_duration',
+    '/api/calibration/test', '/api/calibrate/left', '/api/calibrate/right',
+    '/api/ota/check', '/api/ota/update', '/api/system/reboot', '/', '/index.html',
+]
+
+def legacy_dispatch(path):
+    """Emulate the string-comparison chain, including the /api/schedule/ prefix check."""
+    for candidate in LEGACY_CHAIN:
+        if path == candidate:
+            return candidate
+        if candidate == '/api/schedules' and path.startswith('/api/schedule/'):
+            return candidate
+    return None
+
+def build_router():
+    router = Router()
+    handler = lambda conn, req: None
+    for path in LEGACY_CHAIN[:-2]:
+        router.add(path, ('GET', 'POST'), handler)
+    router.add('/api/schedule/', ('GET', 'POST', 'DELETE'), handler, prefix=True)
+    return router
+
+def test_match():
+    """Test exact, prefix, 405 and miss lookups."""
+    print("\n=== Testing Route Matching ===")
+    router = Router()
+
+    @router.route('/api/ping', '/api/status')
+    def ping(conn, req):
+        return 'ping'
+
+    @router.route('/api/schedule/', methods=('DELETE',), prefix=True)
+    def delete(conn, req):
+        return 'delete'
+
+    assert router.match('GET', '/api/ping')[0] is ping
+    assert router.match('GET', '/api/status')[0] is ping
+    assert router.match('POST', '/api/ping') == (None, ['GET'])
+    assert router.match('DELETE', '/api/schedule/3')[0] is delete
+    assert router.match('GET', '/api/schedule/3') == (None, ['DELETE'])
+    assert router.match('GET', '/css/styles.css') == (None, None)
+    print("  OK")
+
+def bench(label, fn, path, *args):
+    start = ticks.ticks_ms()
+    for _ in range(ITERATIONS):
+        fn(*args)
+    elapsed = ticks.ticks_diff(ticks.ticks_ms(), start)
+    print("  {:<8} {:<22} {:>6} ms  ({:.2f} us/request)".format(label, path, elapsed, elapsed * 1000 / ITERATIONS))
+    return elapsed
+
+def test_dispatch_benchmark():
+    """Compare per-request dispatch cost, focusing on the static-file fallthrough."""
+    print("\n=== Dispatch Benchmark ({} iterations) ===".format(ITERATIONS))
+    router = build_router()
+    for path in ('/api/feednow', '/api/ota/update', '/css/styles.css', '/assets/images/Header.png'):
+        legacy = bench('if/elif', legacy_dispatch, path, path)
+        table = bench('router', router.match, path, 'GET', path)
+        if table:
+            print("  speedup: {:.1f}x".format(legacy / table))
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Router Test Suite")
+    print("=" * 60)
+
+    test_match()
+    test_dispatch_benchmark()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
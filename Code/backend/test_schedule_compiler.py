@@ -0,0 +1,128 @@
+"""
+Test and benchmark for schedule_compiler.
+Checks the bisect lookup against the previous 8-day search loop for many
+schedules and times, then times both on schedules with hundreds of entries.
+Runs under MicroPython or CPython (no hardware required).
+"""
+
+try:
+    import utime as time
+except ImportError:
+    import time
+import ticks
+import state
+import schedule_compiler
+
+# 2025-11-10 00:00:00 (a Monday) in the device's epoch
+BASE = time.mktime((2025, 11, 10, 0, 0, 0, 0, 0, -1))
+
+_seed = 12345
+
+def rand(n):
+    """Small LCG so the test needs no random module."""
+    global _seed
+    _seed = (_seed * 1103515245 + 12345) & 0x7fffffff
+    return (_seed >> 16) % n
+
+def make_schedule(count, days_mask):
+    times = []
+    for _ in range(count):
+        times.append({'hour': rand(12) + 1, 'minute': rand(60), 'ampm': 'PM' if rand(2) else 'AM', 'enabled': rand(8) != 0})
+    days = {}
+    for i, day in enumerate(state.WEEKDAYS):
+        days[day] = bool(days_mask & (1 << i))
+    return {'feeding_times': times, 'days': days}
+
+def legacy_next_feed(schedule, now_secs):
+    """The previous search: 8 days x N times with localtime/mktime per entry."""
+    feeding_times = [t for t in schedule.get('feeding_times', []) if t.get('enabled')]
+    enabled_days = [day for day, enabled in schedule.get('days', {}).items() if enabled]
+    next_feed_secs = None
+    next_feed_tuple = None
+    for day_offset in range(8):
+        check_date = time.localtime(now_secs + 86400 * day_offset)
+        if state.WEEKDAYS[check_date[6]] in enabled_days:
+            for feed_time in feeding_times:
+                hour = feed_time.get('hour', 0)
+                minute = feed_time.get('minute', 0)
+                ampm = feed_time.get('ampm', 'AM')
+                if ampm == 'PM' and hour < 12:
+                    hour += 12
+                if ampm == 'AM' and hour == 12:
+                    hour = 0
+                feed_tuple = (check_date[0], check_date[1], check_date[2], hour, minute, 0, check_date[6], check_date[7], -1)
+                feed_secs = time.mktime(feed_tuple)
+                if feed_secs > now_secs:
+                    if next_feed_secs is None or feed_secs < next_feed_secs:
+                        next_feed_secs = feed_secs
+                        next_feed_tuple = feed_tuple
+            if next_feed_tuple:
+                break
+    return next_feed_secs
+
+def test_matches_legacy():
+    print("\n=== Comparing With The 8-Day Search ===")
+    checked = 0
+    for trial in range(60):
+        schedule = make_schedule(rand(6) + 1, rand(128))
+        table = schedule_compiler.compile(schedule)
+        for _ in range(20):
+            now_secs = BASE + rand(7 * 86400)
+            # Land exactly on feed times too
+            if rand(4) == 0 and len(table):
+                now_secs = BASE + table[rand(len(table))] * 60
+            expected = legacy_next_feed(schedule, now_secs)
+            got = schedule_compiler.next_feed_secs(table, now_secs)
+            assert got == expected, (schedule, now_secs, got, expected)
+            checked += 1
+    assert schedule_compiler.next_feed_secs(schedule_compiler.compile(None)) is None
+    print("  {} lookups match".format(checked))
+
+def test_wrap():
+    print("\n=== Testing Week Wrap-Around ===")
+    # Monday 08:00 only, asked on Monday 09:00 -> next Monday
+    schedule = {'feeding_times': [{'hour': 8, 'minute': 0, 'ampm': 'AM', 'enabled': True}],
+                'days': {'Monday': True}}
+    table = schedule_compiler.compile(schedule)
+    assert list(table) == [480]
+    assert schedule_compiler.next_feed_secs(table, BASE + 9 * 3600) == BASE + 7 * 86400 + 8 * 3600
+    assert schedule_compiler.next_feed_secs(table, BASE + 8 * 3600) == BASE + 7 * 86400 + 8 * 3600
+    assert schedule_compiler.next_feed_secs(table, BASE + 8 * 3600 - 1) == BASE + 8 * 3600
+    print("  OK")
+
+def test_benchmark():
+    print("\n=== Benchmark: schedules with hundreds of entries ===")
+    for count in (100, 300):
+        schedule = make_schedule(count, 0x7f)
+        start = ticks.ticks_ms()
+        for _ in range(10):
+            table = schedule_compiler.compile(schedule)
+        compile_ms = ticks.ticks_diff(ticks.ticks_ms(), start) / 10
+
+        lookups = [BASE + rand(7 * 86400) for _ in range(50)]
+        start = ticks.ticks_ms()
+        for now_secs in lookups:
+            legacy_next_feed(schedule, now_secs)
+        legacy_ms = ticks.ticks_diff(ticks.ticks_ms(), start) / len(lookups)
+
+        start = ticks.ticks_ms()
+        for _ in range(20):
+            for now_secs in lookups:
+                schedule_compiler.next_feed_secs(table, now_secs)
+        bisect_ms = ticks.ticks_diff(ticks.ticks_ms(), start) / (20 * len(lookups))
+
+        print("  {:>3} times, {:>4} entries: compile {:.3f} ms, legacy {:.3f} ms/lookup, bisect {:.4f} ms/lookup".format(
+            count, len(table), compile_ms, legacy_ms, bisect_ms))
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Schedule Compiler Test Suite")
+    print("=" * 60)
+
+    test_matches_legacy()
+    test_wrap()
+    test_benchmark()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
@@ -52,8 +52,7 @@ def test_calculate_next_feed():
     scheduler_service.calculate_and_update_next_feed()
     
     # Read and display result
-    with open(next_feed_service.NEXT_FEED_FILE, 'r') as f:
-        next_feed = f.read().strip()
+    next_feed = next_feed_service.read_next_feed_iso()
     print(f"Next feed time: {next_feed}")
 
 def test_seconds_until_next_feed():
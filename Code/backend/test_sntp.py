@@ -0,0 +1,354 @@
+"""
+Test for the background SNTP client (lib/sntp.py).
+Runs local UDP stand-in NTP servers (one silent, one sending bad replies, one
+answering after a delay) and checks that the first valid reply wins, that
+failures time out, that drift is measured between syncs, that server names
+are resolved only once and that blocking server mode syncs without an event
+loop, also while no requests arrive. Then measures
+time-to-first-request against the old boot sequence (2 s sleep, servers
+tried one by one with 5 s timeouts, another 2 s sleep in main.py).
+Runs on the host under CPython (the legacy comparison answers from a
+thread); no network needed.
+"""
+
+import socket
+import struct
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    import utime as time
+except ImportError:
+    import time
+import ticks
+import lib.sntp as sntp
+
+LEGACY_TIMEOUT_S = 5
+LEGACY_SLEEPS_MS = 4000
+
+def true_ms():
+    """Reference UTC time in ms for the stand-in servers."""
+    if hasattr(time, 'time_ns'):
+        return time.time_ns() // 1000000
+    return int(time.time() * 1000)
+
+class StandIn:
+    """UDP NTP server on 127.0.0.1. mode: 'ok', 'silent' or 'bad'."""
+
+    def __init__(self, mode, delay_ms=0):
+        self.mode = mode
+        self.delay_ms = delay_ms
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        self.requests = 0
+
+    def name(self):
+        return '127.0.0.1:{}'.format(self.port)
+
+    def reply(self, request):
+        ms = true_ms() + sntp.NTP_DELTA * 1000
+        packet = bytearray(48)
+        packet[0] = 0x24  # version 4, mode 4 (server)
+        packet[1] = 2     # stratum
+        packet[24:32] = request[40:48]
+        packet[40:48] = struct.pack('!II', ms // 1000, (ms % 1000 << 32) // 1000)
+        if self.mode == 'bad':
+            packet[24:32] = b'\x00' * 8  # doesn't echo the request
+        return packet
+
+    async def serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(64)
+            except OSError:
+                await asyncio.sleep(0.005)
+                continue
+            self.requests += 1
+            if self.mode != 'silent':
+                asyncio.create_task(self._send_later(self.reply(data), addr))
+
+    async def _send_later(self, packet, addr):
+        await asyncio.sleep(self.delay_ms / 1000)
+        self.sock.sendto(packet, addr)
+
+class FakeClock:
+    """Local clock that drifts skew_ppm from real time; set_clock() corrects it."""
+
+    def __init__(self, offset_ms, skew_ppm):
+        self.base = ticks.ticks_ms()
+        self.offset_ms = offset_ms
+        self.skew_ppm = skew_ppm
+        self.sets = 0
+        self.saved = None
+
+    def now_ms(self):
+        elapsed = ticks.ticks_diff(ticks.ticks_ms(), self.base)
+        return true_ms() + sntp.TZ_OFFSET * 1000 + self.offset_ms + elapsed * self.skew_ppm // 1000000
+
+    def set_clock(self, secs):
+        self.base = ticks.ticks_ms()
+        self.offset_ms = 0
+        self.sets += 1
+
+    def save_rtc(self, secs):
+        self.saved = secs
+
+def install(clock, servers, timeout_ms=1000):
+    sntp.now_ms = clock.now_ms
+    sntp.set_clock = clock.set_clock
+    sntp.save_rtc = clock.save_rtc
+    sntp.SERVERS = [s.name() for s in servers]
+    sntp.TIMEOUT_MS = timeout_ms
+    for key in sntp.stats:
+        sntp.stats[key] = 0 if key in ('syncs', 'failures') else None
+    sntp._last_sync_ticks = None
+
+async def check_first_reply_wins():
+    print("\n=== First Valid Reply Wins ===")
+    servers = [StandIn('silent'), StandIn('bad'), StandIn('ok', 50)]
+    tasks = [asyncio.create_task(s.serve()) for s in servers]
+    clock = FakeClock(-3600000, 0)
+    install(clock, servers)
+    start = ticks.ticks_ms()
+    assert await sntp.sync()
+    elapsed = ticks.ticks_diff(ticks.ticks_ms(), start)
+    assert sntp.stats['server'] == servers[2].name(), sntp.stats
+    assert 40 <= sntp.stats['rtt_ms'] < 500, sntp.stats
+    assert abs(sntp.stats['offset_ms'] + 3600000) < 1500, sntp.stats
+    assert clock.sets == 1 and all(s.requests == 1 for s in servers)
+    assert clock.saved is not None
+    print("  synced from the 50 ms server: rtt {} ms, clock set on the next second after {} ms".format(sntp.stats['rtt_ms'], elapsed))
+    for t in tasks:
+        t.cancel()
+
+async def check_timeout():
+    print("\n=== No Valid Reply ===")
+    servers = [StandIn('silent'), StandIn('bad')]
+    tasks = [asyncio.create_task(s.serve()) for s in servers]
+    clock = FakeClock(0, 0)
+    install(clock, servers, timeout_ms=300)
+    start = ticks.ticks_ms()
+    assert not await sntp.sync()
+    elapsed = ticks.ticks_diff(ticks.ticks_ms(), start)
+    assert sntp.stats['failures'] == 1 and clock.sets == 0
+    assert 300 <= elapsed < 600, elapsed
+    print("  gave up after {} ms".format(elapsed))
+    for t in tasks:
+        t.cancel()
+
+async def check_drift():
+    print("\n=== Drift Between Syncs ===")
+    servers = [StandIn('ok')]
+    tasks = [asyncio.create_task(s.serve()) for s in servers]
+    # Runs 10% fast (exaggerated so one second shows it over the ~10 ms
+    # the 20 ms receive poll adds to the offset)
+    clock = FakeClock(0, 100000)
+    install(clock, servers)
+    lookups = count_lookups()
+    try:
+        assert await sntp.sync()
+        assert sntp.stats['drift_ppm'] is None
+        await asyncio.sleep(1)
+        assert await sntp.sync()
+    finally:
+        socket.getaddrinfo = lookups.getaddrinfo
+    print("  measured drift {} ppm (true 100000)".format(sntp.stats['drift_ppm']))
+    assert abs(sntp.stats['drift_ppm'] - 100000) < 30000, sntp.stats
+    assert lookups.count == 1, lookups.count
+    print("  2 syncs, 1 DNS lookup OK")
+    for t in tasks:
+        t.cancel()
+
+class count_lookups:
+    """Counts socket.getaddrinfo calls until getaddrinfo is put back."""
+
+    def __init__(self):
+        self.count = 0
+        self.getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = self.lookup
+
+    def lookup(self, *args):
+        self.count += 1
+        return self.getaddrinfo(*args)
+
+def test_blocking_mode():
+    """sync_if_due() outside any event loop, as api._run_blocking calls it."""
+    print("\n=== Blocking Server Mode ===")
+    server = StandIn('ok')
+    clock = FakeClock(-5000, 0)
+    install(clock, [server])
+    sntp._next_sync = None
+    responder = LegacyResponder(server)
+    responder.start()
+    try:
+        assert sntp.sync_if_due()
+        assert not sntp.sync_if_due()
+    finally:
+        responder.stop()
+    assert clock.sets == 1 and clock.saved is not None
+    print("  synced once, next sync not due yet OK")
+
+def test_blocking_server_idle():
+    """_run_blocking() checks for a due sync while no client connects."""
+    print("\n=== Blocking Server With No Requests ===")
+    import threading
+    import api
+    import boot_trace
+    import feed_jobs
+    import lib.notification
+    # The server writes its boot profile when it starts listening; keep it out of data/
+    boot_trace.PROFILE_FILE = '/tmp/boot_profile_test.json'
+    boot_trace.PREVIOUS_FILE = '/tmp/boot_profile_test.prev.json'
+    calls = []
+
+    class Stop(BaseException):
+        """Not an Exception, so the server loop doesn't catch it."""
+
+    def sync_if_due():
+        calls.append(ticks.ticks_ms())
+        if len(calls) == 4:
+            raise Stop
+
+    def serve():
+        try:
+            server.run('127.0.0.1', 0, 'blocking')
+        except Stop:
+            pass
+
+    server = api.SimpleServer()
+    server._send_startup_notification = lambda ip, port: None
+    poll_ms = api.BLOCKING_POLL_MS
+    api.BLOCKING_POLL_MS = 50
+    real_sync_if_due = sntp.sync_if_due
+    sntp.sync_if_due = sync_if_due
+    try:
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        thread.join(5)
+        assert not thread.is_alive()
+    finally:
+        sntp.sync_if_due = real_sync_if_due
+        api.BLOCKING_POLL_MS = poll_ms
+        server.socket.close()
+        lib.notification.set_blocking(False)
+        feed_jobs.set_blocking(False)
+    # One check at startup, then one per accept() timeout
+    gaps = [ticks.ticks_diff(b, a) for a, b in zip(calls, calls[1:])]
+    assert all(40 <= gap < 500 for gap in gaps), gaps
+    print("  checked every {} ms while idle OK".format(max(gaps)))
+
+def legacy_sync(servers):
+    """The old boot.py loop: one blocking query per server with a 5 s timeout."""
+    for server in servers:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(LEGACY_TIMEOUT_S)
+        try:
+            sock.sendto(sntp._request(b'\x00' * 8), ('127.0.0.1', server.port))
+            sock.recvfrom(64)
+            return True
+        except OSError:
+            pass
+        finally:
+            sock.close()
+    return False
+
+async def _http_server():
+    async def handle(reader, writer):
+        await reader.readline()
+        writer.write(b'HTTP/1.0 200 OK\r\n\r\n')
+        await writer.drain()
+        writer.close()
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+async def check_time_to_first_request():
+    print("\n=== Time To First Request ===")
+    # Like a network where the first two servers don't answer
+    servers = [StandIn('silent'), StandIn('silent'), StandIn('ok', 30)]
+    tasks = [asyncio.create_task(s.serve()) for s in servers]
+    clock = FakeClock(0, 0)
+    install(clock, servers, timeout_ms=3000)
+
+    # New boot: server up, then sync in the background
+    boot = ticks.ticks_ms()
+    server = await _http_server()
+    sntp._task = None
+    sntp.start()
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET / HTTP/1.0\r\n\r\n')
+    await writer.drain()
+    await reader.readline()
+    first_request = ticks.ticks_diff(ticks.ticks_ms(), boot)
+    writer.close()
+    while not sntp.stats['syncs']:
+        await asyncio.sleep(0.01)
+    first_sync = ticks.ticks_diff(ticks.ticks_ms(), boot)
+    sntp._task.cancel()
+    server.close()
+    for t in tasks:
+        t.cancel()
+
+    # Old boot: blocking serial NTP before main.py starts the server. The
+    # client blocks the event loop, so the good server answers from a thread.
+    start = ticks.ticks_ms()
+    responder = LegacyResponder(servers[2])
+    responder.start()
+    legacy_sync(servers)
+    responder.stop()
+    legacy = LEGACY_SLEEPS_MS + ticks.ticks_diff(ticks.ticks_ms(), start)
+
+    print("  old boot: first request after {:>6} ms (2 s + 2 s sleeps, serial NTP)".format(legacy))
+    print("  new boot: first request after {:>6} ms, clock synced after {} ms".format(first_request, first_sync))
+    assert first_request < 1000 < legacy
+
+class LegacyResponder:
+    """Answers the blocking legacy client from a thread (CPython only)."""
+
+    def __init__(self, standin):
+        self.standin = standin
+        self.running = False
+
+    def start(self):
+        import threading
+        self.running = True
+        self.standin.sock.setblocking(True)
+        self.standin.sock.settimeout(0.1)
+        self.thread = threading.Thread(target=self._loop)
+        self.thread.start()
+
+    def _loop(self):
+        while self.running:
+            try:
+                data, addr = self.standin.sock.recvfrom(64)
+            except OSError:
+                continue
+            self.standin.sock.sendto(self.standin.reply(data), addr)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+async def main():
+    await check_first_reply_wins()
+    await check_timeout()
+    await check_drift()
+    await check_time_to_first_request()
+
+def test_background_sync():
+    asyncio.run(main())
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("SNTP Client Test Suite")
+    print("=" * 60)
+
+    test_background_sync()
+    test_blocking_mode()
+    test_blocking_server_idle()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
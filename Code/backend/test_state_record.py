@@ -0,0 +1,219 @@
+"""
+Test and benchmark for the binary state record.
+Round-trips the record (including disabled feeding times and an empty last
+fed time, which must come back as the text files would), rejects schedules
+with more than MAX_TIMES times, recovers from a torn write, migrates from the text
+files (or keeps them if they can't be encoded), clamps out-of-range values
+and compares flash writes per feed cycle for both STATE_FORMATs.
+Also checks flush_if_due(), the blocking server mode flush.
+Runs under MicroPython or CPython (no hardware required); works on a copy of
+data/ in a scratch directory.
+"""
+
+import os
+import state
+import state_record
+
+SCRATCH = 'state_test'
+TEXT_FILES = ['quantity.txt', 'last_fed.txt', 'next_feed.txt', 'calibration.txt', 'schedule.txt']
+FEEDS = 10
+
+def setup_module():
+    """Work on a copy of data/ (pytest runs this too, so data/ is never written)."""
+    for path in (SCRATCH, SCRATCH + '/data'):
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass
+    for name in TEXT_FILES:
+        with open('data/' + name) as src, open(SCRATCH + '/data/' + name, 'w') as dst:
+            dst.write(src.read())
+    os.chdir(SCRATCH)
+
+def teardown_module():
+    for name in TEXT_FILES + ['state.bin']:
+        try:
+            os.remove('data/' + name)
+        except OSError:
+            pass
+    os.chdir('..')
+    os.rmdir(SCRATCH + '/data')
+    os.rmdir(SCRATCH)
+
+def reset(fmt):
+    state.FORMAT = fmt
+    state._values.clear()
+    del state._dirty[:]
+    state.flushes = state.writes = state.bytes_written = 0
+    state_record._slot = None
+    state_record._seq = 0
+
+def text_values():
+    reset('text')
+    state.load()
+    return dict(state._values)
+
+def test_round_trip():
+    print("\n=== Testing Record Round Trip ===")
+    values = text_values()
+    record = state_record.encode(values, 7)
+    assert len(record) == state_record.SIZE
+    seq, decoded = state_record.decode(record)
+    assert seq == 7 and decoded == values, decoded
+    print("  {} byte record OK".format(len(record)))
+
+def test_round_trip_like_text():
+    print("\n=== Testing Round Trip Matches The Text Format ===")
+    values = text_values()
+    values['last_fed'] = ''
+    values['schedule'] = {
+        'feeding_times': [
+            {'hour': 12, 'minute': 0, 'ampm': 'AM', 'enabled': False},
+            {'hour': 8, 'minute': 30, 'ampm': 'AM', 'enabled': True},
+            {'hour': 7, 'minute': 15, 'ampm': 'PM', 'enabled': True}],
+        'days': values['schedule']['days']}
+    decoded = state_record.decode(state_record.encode(values, 1))[1]
+
+    # What the text files give back for the same values
+    expected = dict(values)
+    expected['schedule'] = state.parse_schedule(state.format_schedule(values['schedule']))
+    assert decoded == expected, decoded
+    assert len(decoded['schedule']['feeding_times']) == 2
+    print("  disabled 12:00 AM slot left out, last_fed '' kept OK")
+
+    values['last_fed'] = None
+    assert state_record.decode(state_record.encode(values, 2))[1]['last_fed'] is None
+
+    values['schedule'] = {
+        'feeding_times': [{'hour': 1 + i, 'minute': 0, 'ampm': 'AM', 'enabled': True}
+                          for i in range(state_record.MAX_TIMES + 1)],
+        'days': values['schedule']['days']}
+    try:
+        state_record.encode(values, 3)
+        assert False, 'encoded {} times'.format(state_record.MAX_TIMES + 1)
+    except ValueError:
+        pass
+    print("  {} feeding times rejected OK".format(state_record.MAX_TIMES + 1))
+
+def test_torn_write():
+    print("\n=== Testing Torn Write Recovery ===")
+    values = text_values()
+    reset('binary')
+    state_record.save(values)
+    newer = dict(values)
+    newer['quantity'] = values['quantity'] + 1
+    state_record.save(newer)
+    assert state_record.load()['quantity'] == newer['quantity']
+
+    # Corrupt the newest slot as if power was lost halfway through the write
+    with open(state_record.RECORD_FILE, 'r+b') as f:
+        f.seek(state_record._slot * state_record.SIZE + 10)
+        f.write(b'\xff\xff\xff')
+    assert state_record.load() == values
+    print("  fell back to the previous record OK")
+    os.remove(state_record.RECORD_FILE)
+
+def test_migration():
+    print("\n=== Testing Migration From Text Files ===")
+    values = text_values()
+    reset('binary')
+    state.load()
+    assert state._values == values
+    reset('binary')
+    assert state_record.load() == values
+    print("  text files migrated to {} OK".format(state_record.RECORD_FILE))
+
+def test_migration_too_many_times():
+    print("\n=== Testing Migration Of An Unencodable Schedule ===")
+    values = text_values()
+    schedule = {
+        'feeding_times': [{'hour': 1 + i, 'minute': 0, 'ampm': 'AM', 'enabled': True}
+                          for i in range(state_record.MAX_TIMES + 1)],
+        'days': values['schedule']['days']}
+    with open('data/schedule.txt') as f:
+        saved = f.read()
+    with open('data/schedule.txt', 'w') as f:
+        f.write(state.format_schedule(schedule))
+    try:
+        os.remove(state_record.RECORD_FILE)
+    except OSError:
+        pass
+    try:
+        reset('binary')
+        state.load()
+        assert state.FORMAT == 'text' and state_record.load() is None
+        assert len(state.get('schedule')['feeding_times']) == state_record.MAX_TIMES + 1
+    finally:
+        with open('data/schedule.txt', 'w') as f:
+            f.write(saved)
+    print("  {} feeding times: booted on the text files OK".format(state_record.MAX_TIMES + 1))
+
+def test_flush_out_of_range():
+    print("\n=== Testing Flush Of Out-Of-Range Values ===")
+    reset('binary')
+    state.load()
+    state.set('calibration', (70000, -5))
+    state.set('quantity', 300)
+    assert state.flush() == 1 and state.dirty() == []
+    values = state_record.load()
+    assert values['calibration'] == (0xffff, 0) and values['quantity'] == 0xff, values
+    print("  clamped and written OK")
+    os.remove(state_record.RECORD_FILE)
+
+def feed_cycle(i):
+    """What a scheduled feed changes: quantity, last fed and next feed time."""
+    import quantity_service
+    state.set('quantity', max(0, quantity_service.read_quantity() - 1))
+    state.set('last_fed', '2025-11-{:02d}T08:00:00'.format(i + 1))
+    state.set('next_feed', '2025-11-{:02d}T20:00:00'.format(i + 1))
+    state.flush()
+
+def test_flush_if_due():
+    print("\n=== Testing Flush Between Requests (blocking mode) ===")
+    import time
+    reset('text')
+    state.load()
+    seconds = state.FLUSH_SECONDS
+    state.FLUSH_SECONDS = 0.2
+    try:
+        assert state.flush_if_due() == 0
+        state.set('quantity', state.get('quantity') + 1)
+        assert state.flush_if_due() == 0 and state.dirty() == ['quantity']
+        time.sleep(0.25)
+        assert state.flush_if_due() == 1 and state.dirty() == []
+    finally:
+        state.FLUSH_SECONDS = seconds
+    print("  dirty field written once FLUSH_SECONDS passed OK")
+
+def test_flash_writes_benchmark():
+    print("\n=== Flash Writes per Feed Cycle ({} feeds) ===".format(FEEDS))
+    for fmt in ('text', 'binary'):
+        reset(fmt)
+        state.load()
+        state.flushes = state.writes = state.bytes_written = 0
+        for i in range(FEEDS):
+            feed_cycle(i)
+        print("  {:<7} {:.1f} file writes/feed  {:.1f} bytes/feed".format(
+            fmt, state.writes / FEEDS, state.bytes_written / FEEDS))
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("State Record Test Suite")
+    print("=" * 60)
+
+    setup_module()
+    try:
+        test_round_trip()
+        test_round_trip_like_text()
+        test_torn_write()
+        test_migration()
+        test_migration_too_many_times()
+        test_flush_out_of_range()
+        test_flush_if_due()
+        test_flash_writes_benchmark()
+    finally:
+        teardown_module()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
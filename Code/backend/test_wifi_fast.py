@@ -0,0 +1,202 @@
+"""
+Fast WiFi reconnect test for WifiManager.
+Host-only (CPython): installs fake network, machine and utime modules driven
+by a simulated clock, then boots the manager repeatedly and compares the
+simulated time to connect with the full scan and with the cached BSSID,
+channel and (optionally) IP lease. Also checks that old wifi.dat files
+still load and that a replaced access point falls back to the scan.
+"""
+
+import os
+import sys
+import tempfile
+import types
+
+# Simulated costs (ms), roughly an ESP8266/ESP32 station on a home network
+SCAN_MS = 2200          # Active scan over all channels
+JOIN_SEARCH_MS = 1200   # connect() has to find the AP's channel first
+JOIN_DIRECT_MS = 250    # Auth, association and 4-way handshake on a known channel
+DHCP_MS = 700
+
+LEASE = ('192.168.1.23', '255.255.255.0', '192.168.1.1', '192.168.1.1')
+
+class Clock:
+    now = 0
+
+class AP:
+    def __init__(self, ssid, password, bssid, channel):
+        self.ssid = ssid
+        self.password = password
+        self.bssid = bssid
+        self.channel = channel
+
+class FakeWLAN:
+    """Just enough of network.WLAN for WifiManager's station side."""
+    aps = []
+    channel_config = True   # ESP32 accepts config(channel=) for the station
+    scans = 0
+
+    def __init__(self, interface):
+        self.channel = None
+        self.static = None
+        self.connected_at = None
+
+    def active(self, value=None):
+        return True
+
+    def disconnect(self):
+        self.connected_at = None
+
+    def isconnected(self):
+        return self.connected_at is not None and Clock.now >= self.connected_at
+
+    def scan(self):
+        FakeWLAN.scans += 1
+        Clock.now += SCAN_MS
+        return [(ap.ssid.encode(), ap.bssid, ap.channel, -60, 3, False) for ap in self.aps]
+
+    def connect(self, ssid, password, bssid=None):
+        self.connected_at = None
+        for ap in self.aps:
+            if ap.ssid == ssid and ap.password == password and (bssid is None or ap.bssid == bssid):
+                cost = JOIN_DIRECT_MS if self.channel == ap.channel else JOIN_SEARCH_MS
+                if self.static is None:
+                    cost += DHCP_MS
+                self.connected_at = Clock.now + cost
+                return
+
+    def config(self, *args, **kwargs):
+        if 'channel' in kwargs:
+            if not self.channel_config:
+                raise ValueError('channel is only for the AP interface')
+            self.channel = kwargs['channel']
+
+    def ifconfig(self, value=None):
+        if value is None:
+            return self.static or LEASE
+        self.static = None if value == 'dhcp' else value
+
+FAKED = ('network', 'machine', 'utime', 'wifi_manager')
+saved = {}
+wifi_manager = None
+
+def install_fakes():
+    network = types.ModuleType('network')
+    network.STA_IF, network.AP_IF = 0, 1
+    network.WLAN = FakeWLAN
+    machine = types.ModuleType('machine')
+    machine.reset = lambda: None
+    utime = types.ModuleType('utime')
+    def sleep_ms(ms):
+        Clock.now += ms
+    utime.sleep_ms = sleep_ms
+    utime.sleep = lambda s: sleep_ms(int(s * 1000))
+    sys.modules.update({'network': network, 'machine': machine, 'utime': utime})
+
+def setup_module():
+    """Install the fakes and import wifi_manager against them. Under pytest
+    this runs just before the module's tests, so other modules never see them.
+    """
+    global wifi_manager
+    for name in FAKED:
+        saved[name] = sys.modules.pop(name, None)
+    install_fakes()
+    import wifi_manager
+
+def teardown_module():
+    for name in FAKED:
+        sys.modules.pop(name, None)
+        if saved.get(name) is not None:
+            sys.modules[name] = saved[name]
+
+DAT = os.path.join(tempfile.mkdtemp(), 'wifi.dat')
+HOME = AP('home', 'secret123', b'\x24\x0a\xc4\x11\x22\x33', 6)
+
+def boot(quiet=True):
+    """One power-up: a new WifiManager connecting with boot.py's retries. Returns simulated ms."""
+    FakeWLAN.scans = 0
+    start = Clock.now
+    wifi = wifi_manager.WifiManager()
+    wifi.wifi_credentials = DAT
+    stdout = sys.stdout
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        wifi.connect(retries=3)
+    finally:
+        if quiet:
+            sys.stdout.close()
+            sys.stdout = stdout
+    assert wifi.is_connected()
+    return Clock.now - start
+
+def fresh(lines):
+    with open(DAT, 'w') as f:
+        f.write(lines)
+    FakeWLAN.aps = [AP('neighbour', 'whatever1', b'\x00\x11\x22\x33\x44\x55', 1), HOME]
+
+def test_old_file():
+    print("\n=== Old wifi.dat Format ===")
+    fresh('office;password1\nhome;secret123\n')
+    wifi_manager.CACHE_IP = False
+    boot()
+    with open(DAT) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 'office;password1', lines
+    assert lines[1] == 'home;secret123;240ac4112233;6', lines
+    print("  first boot scanned and cached:", lines[1])
+
+def test_connect_times():
+    print("\n=== Simulated Connect Times ===")
+    for label, channel_config in (('ESP32 (channel settable)', True), ('ESP8266 (BSSID only)', False)):
+        FakeWLAN.channel_config = channel_config
+        fresh('home;secret123\n')
+        wifi_manager.FAST_CONNECT = False
+        wifi_manager.CACHE_IP = False
+        scan = boot()
+        wifi_manager.FAST_CONNECT = True
+        boot()
+        fast = boot()
+        assert FakeWLAN.scans == 0
+        wifi_manager.CACHE_IP = True
+        boot()
+        cached_ip = boot()
+        assert FakeWLAN.scans == 0
+        print("  {}:".format(label))
+        print("    scan every boot:        {:>5} ms".format(scan))
+        print("    cached BSSID/channel:   {:>5} ms".format(fast))
+        print("    plus cached IP lease:   {:>5} ms".format(cached_ip))
+    FakeWLAN.channel_config = True
+    wifi_manager.CACHE_IP = False
+
+def test_fallback():
+    print("\n=== Replaced Access Point ===")
+    fresh('home;secret123\n')
+    boot()
+    new_router = AP('home', 'secret123', b'\x24\x0a\xc4\x99\x99\x99', 11)
+    FakeWLAN.aps = [new_router]
+    elapsed = boot()
+    assert FakeWLAN.scans == 1
+    with open(DAT) as f:
+        assert f.read() == 'home;secret123;240ac4999999;11\n'
+    print("  timed out on the cached AP, scanned and re-cached: {} ms".format(elapsed))
+    elapsed = boot()
+    assert FakeWLAN.scans == 0
+    print("  next boot uses the new AP directly: {} ms".format(elapsed))
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("WiFi Fast Reconnect Test Suite")
+    print("=" * 60)
+
+    setup_module()
+    try:
+        test_old_file()
+        test_connect_times()
+        test_fallback()
+    finally:
+        teardown_module()
+
+    print("\n" + "=" * 60)
+    print("All tests completed!")
+    print("=" * 60)
@@ -0,0 +1,19 @@
+# Monotonic millisecond ticks
+# Uses utime on MicroPython, falls back to time.monotonic on CPython (Raspberry Pi dev mode)
+
+try:
+    from utime import ticks_ms, ticks_diff, ticks_add, sleep_ms
+except ImportError:
+    import time as _time
+
+    def ticks_ms():
+        return int(_time.monotonic() * 1000)
+
+    def ticks_diff(end, start):
+        return end - start
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+    def sleep_ms(ms):
+        _time.sleep(ms / 1000)
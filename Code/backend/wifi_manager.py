@@ -9,6 +9,16 @@ import socket
 import re
 import utime as time
 
+try:
+    import config
+    FAST_CONNECT = config.WIFI_FAST_CONNECT if hasattr(config, 'WIFI_FAST_CONNECT') else True
+    FAST_TIMEOUT_MS = config.WIFI_FAST_TIMEOUT_MS if hasattr(config, 'WIFI_FAST_TIMEOUT_MS') else 5000
+    CACHE_IP = config.WIFI_CACHE_IP if hasattr(config, 'WIFI_CACHE_IP') else False
+except ImportError:
+    FAST_CONNECT = True
+    FAST_TIMEOUT_MS = 5000
+    CACHE_IP = False
+
 
 class WifiManager:
 
@@ -33,6 +43,8 @@ class WifiManager:
         # The file were the credentials will be stored.
         # There is no encryption, it's just a plain text archive. Be aware of this security problem!
         self.wifi_credentials = 'wifi.dat'
+        # Last access point that worked: ssid -> (bssid, channel, lease or None), see read_credentials()
+        self.cache = {}
         
         # Prevents the device from automatically trying to connect to the last saved network without first going through the steps defined in the code.
         self.wlan_sta.disconnect()
@@ -54,13 +66,16 @@ class WifiManager:
         gc.collect()
         
         profiles = self.read_credentials()
+        if FAST_CONNECT and self.fast_connect(profiles):
+            return
         attempt = 0
         while attempt < retries:
-            for ssid, *_ in self.wlan_sta.scan():
+            for ssid, bssid, channel, *_ in self.wlan_sta.scan():
                 ssid = ssid.decode("utf-8")
                 if ssid in profiles:
                     password = profiles[ssid]
-                    if self.wifi_connect(ssid, password):
+                    if self.wifi_connect(ssid, password, bssid):
+                        self.remember(profiles, ssid, bssid, channel)
                         return
             attempt += 1
             if not self.wlan_sta.isconnected() and attempt < retries:
@@ -68,8 +83,49 @@ class WifiManager:
         if not self.wlan_sta.isconnected():
             print('Could not connect to any WiFi network after {} attempt(s). Starting the configuration portal...'.format(retries))
             self.web_server()
-        
-    
+
+
+    def fast_connect(self, profiles):
+        """Connect straight to the cached access point, skipping the scan.
+        Returns False if there is no cache entry or the access point did not
+        answer within FAST_TIMEOUT_MS; the caller then scans as usual.
+        """
+        for ssid, (bssid, channel, lease) in self.cache.items():
+            if ssid not in profiles:
+                continue
+            try:
+                # ESP32 can pin the station to a channel; ESP8266 only takes it for the AP
+                self.wlan_sta.config(channel=channel)
+            except Exception:
+                pass
+            if CACHE_IP and lease:
+                self.wlan_sta.ifconfig(lease)
+            if self.wifi_connect(ssid, profiles[ssid], bssid, FAST_TIMEOUT_MS // 100):
+                # Picks up a new lease if WIFI_CACHE_IP was just turned on
+                self.remember(profiles, ssid, bssid, channel)
+                return True
+            if CACHE_IP and lease:
+                try:
+                    self.wlan_sta.ifconfig('dhcp')
+                except Exception:
+                    pass
+            print('Cached access point not reachable, scanning...')
+        return False
+
+
+    def remember(self, profiles, ssid, bssid, channel):
+        """Cache the access point that just worked; wifi.dat is only rewritten if it changed."""
+        lease = tuple(self.wlan_sta.ifconfig()) if CACHE_IP else None
+        entry = (bssid, channel, lease)
+        if self.cache.get(ssid) == entry and len(self.cache) == 1:
+            return
+        self.cache = {ssid: entry}
+        try:
+            self.write_credentials(profiles)
+        except OSError as error:
+            print('Could not save WiFi cache:', error)
+
+
     def disconnect(self):
         if self.wlan_sta.isconnected():
             self.wlan_sta.disconnect()
@@ -84,9 +140,17 @@ class WifiManager:
 
 
     def write_credentials(self, profiles):
+        # One line per network: ssid;password, followed for the cached network by
+        # ;bssid (hex);channel and optionally ;ip,netmask,gateway,dns.
         lines = []
         for ssid, password in profiles.items():
-            lines.append('{0};{1}\n'.format(ssid, password))
+            line = '{0};{1}'.format(ssid, password)
+            if ssid in self.cache:
+                bssid, channel, lease = self.cache[ssid]
+                line += ';{0};{1}'.format(''.join('{:02x}'.format(b) for b in bssid), channel)
+                if lease:
+                    line += ';' + ','.join(lease)
+            lines.append(line + '\n')
         with open(self.wifi_credentials, 'w') as file:
             file.write(''.join(lines))
 
@@ -101,21 +165,37 @@ class WifiManager:
                 print(error)
             pass
         profiles = {}
+        self.cache = {}
         for line in lines:
-            ssid, password = line.strip().split(';')
+            # Files from before the cache have just ssid;password
+            fields = line.strip().split(';')
+            if len(fields) < 2:
+                continue
+            ssid, password = fields[0], fields[1]
             profiles[ssid] = password
+            if len(fields) >= 4:
+                try:
+                    bssid = bytes([int(fields[2][i:i + 2], 16) for i in range(0, len(fields[2]), 2)])
+                    lease = tuple(fields[4].split(',')) if len(fields) >= 5 and fields[4] else None
+                    self.cache[ssid] = (bssid, int(fields[3]), lease)
+                except ValueError:
+                    pass
         return profiles
 
 
-    def wifi_connect(self, ssid, password):
+    def wifi_connect(self, ssid, password, bssid=None, tries=100):
         import gc
         
         # Free memory before connection attempt
         gc.collect()
         
         print('Trying to connect to:', ssid)
-        self.wlan_sta.connect(ssid, password)
-        for _ in range(100):
+        if bssid:
+            # Joins that access point directly instead of searching for the SSID
+            self.wlan_sta.connect(ssid, password, bssid=bssid)
+        else:
+            self.wlan_sta.connect(ssid, password)
+        for _ in range(tries):
             if self.wlan_sta.isconnected():
                 print('\nConnected! Network information:', self.wlan_sta.ifconfig())
                 
@@ -155,6 +235,8 @@ class WifiManager:
                 if self.reboot:
                     print('The device will reboot in 5 seconds.')
                     time.sleep(5)
+                    import state
+                    state.flush()
                     machine.reset()
             self.client, addr = server_socket.accept()
             try: